@@ -0,0 +1,121 @@
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from .metrics import increment, register_gauge
+
+load_dotenv()
+
+# Calls looked at when deciding whether a dependency is healthy
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", 60))
+# Fewer calls than this in the window never trip the breaker
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+# The breaker opens when the share of failed calls or the p95 latency reaches these
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+BREAKER_P95_SECONDS = float(os.getenv("BREAKER_P95_SECONDS", 10))
+# Time the breaker stays open before letting one probe call through
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Stops calling a failing or slow dependency. Calls are recorded in a rolling window;
+    when its error rate or p95 latency crosses the limits the breaker opens and callers
+    are turned away at once. After a cooldown a single probe call is let through: success
+    closes the breaker, failure opens it for another cooldown.
+    """
+    __slots__ = ('name', '_calls', '_state', '_opened_at', '_probing')
+
+    def __init__(self, name: str):
+        self.name = name
+        # (finished_at, ok, seconds) of recent calls, oldest first
+        self._calls = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= BREAKER_COOLDOWN_SECONDS:
+            return HALF_OPEN
+        return self._state
+
+    def _prune(self, now: float):
+        """Forget calls older than the window"""
+        while self._calls and now - self._calls[0][0] > BREAKER_WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def error_rate(self) -> float:
+        """Share of failed calls in the window"""
+        self._prune(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok, _ in self._calls if not ok) / len(self._calls)
+
+    def p95_seconds(self) -> float:
+        """95th percentile latency of the calls in the window"""
+        self._prune(time.monotonic())
+        if not self._calls:
+            return 0.0
+        latencies = sorted(seconds for _, _, seconds in self._calls)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; in half-open state only one probe at a time"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            increment(f'breaker.{self.name}.probes')
+            return True
+        increment(f'breaker.{self.name}.rejected')
+        return False
+
+    def available(self) -> bool:
+        """Whether a call would be allowed, without taking the probe slot"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._probing = False
+        increment(f'breaker.{self.name}.opened')
+        print(f"Circuit breaker {self.name} opened (error rate {self.error_rate():.0%}, p95 {self.p95_seconds():.1f}s)")
+
+    def record(self, ok: bool, seconds: float):
+        """Record the outcome of an allowed call"""
+        now = time.monotonic()
+        if self._probing:
+            self._probing = False
+            if ok and seconds < BREAKER_P95_SECONDS:
+                self._state = CLOSED
+                self._calls.clear()
+                print(f"Circuit breaker {self.name} closed")
+            else:
+                self._open(now)
+            return
+
+        self._calls.append((now, ok, seconds))
+        self._prune(now)
+        if self._state == CLOSED and len(self._calls) >= BREAKER_MIN_CALLS and (
+            self.error_rate() >= BREAKER_ERROR_RATE or self.p95_seconds() >= BREAKER_P95_SECONDS
+        ):
+            self._open(now)
+
+# name -> breaker, created on first use
+_breakers = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the breaker of a dependency, registering its metrics the first time"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+        register_gauge(f'breaker.{name}.state', lambda: breaker.state)
+        register_gauge(f'breaker.{name}.error_rate', breaker.error_rate)
+        register_gauge(f'breaker.{name}.p95_seconds', breaker.p95_seconds)
+    return breaker
@@ -1,6 +1,6 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from .state_manager import get_user_state, clear_user_data, set_user_state, AWAITING_OPTION, AWAITING_CLARIFICATION, AWAITING_FIRST_PDF, AWAITING_SECOND_PDF, AWAITING_MULTIPLE_PDFS, AWAITING_PDF_FOR_PAGE_DELETE, AWAITING_PAGE_NUMBERS_DELETE, AWAITING_PDF_FOR_PAGE_EXTRACT, AWAITING_PAGE_NUMBERS_EXTRACT, AWAITING_PDF_FOR_REORDER, AWAITING_PAGE_ORDER, AWAITING_MULTIPLE_FILES_FOR_ZIP, AWAITING_ZIP_TO_EXTRACT, AWAITING_ZIP_TO_LIST, AWAITING_ZIP_FOR_ADD, AWAITING_FILES_TO_ADD, AWAITING_ZIP_FOR_REMOVE, AWAITING_FILENAMES_TO_REMOVE, AWAITING_ZIP_FOR_BULK, AWAITING_BULK_OPERATION, AWAITING_PDF_CONCATENATION_ORDER, AWAITING_ZIP_FOR_IMAGES_TO_PNG, AWAITING_ZIP_FOR_IMAGES_TO_JPEG, AWAITING_ZIP_FOR_PDF_CONCATENATION, AWAITING_IMAGE_TO_PNG, AWAITING_IMAGE_TO_JPEG, AWAITING_DOCX_TO_PDF, AWAITING_PDF_TO_DOCX, AWAITING_CSV_TO_EXCEL, AWAITING_EXCEL_TO_CSV, AWAITING_PPTX_TO_PDF, IDLE, clear_conversation_history
+from .state_manager import load_user_session, get_user_state, clear_user_data, set_user_state, AWAITING_OPTION, AWAITING_CLARIFICATION, AWAITING_FIRST_PDF, AWAITING_SECOND_PDF, AWAITING_MULTIPLE_PDFS, AWAITING_PDF_FOR_PAGE_DELETE, AWAITING_PAGE_NUMBERS_DELETE, AWAITING_PDF_FOR_PAGE_EXTRACT, AWAITING_PAGE_NUMBERS_EXTRACT, AWAITING_PDF_FOR_REORDER, AWAITING_PAGE_ORDER, AWAITING_MULTIPLE_FILES_FOR_ZIP, AWAITING_ZIP_TO_EXTRACT, AWAITING_ZIP_TO_LIST, AWAITING_ZIP_FOR_ADD, AWAITING_FILES_TO_ADD, AWAITING_ZIP_FOR_REMOVE, AWAITING_FILENAMES_TO_REMOVE, AWAITING_ZIP_FOR_BULK, AWAITING_BULK_OPERATION, AWAITING_PDF_CONCATENATION_ORDER, AWAITING_ZIP_FOR_IMAGES_TO_PNG, AWAITING_ZIP_FOR_IMAGES_TO_JPEG, AWAITING_ZIP_FOR_PDF_CONCATENATION, AWAITING_IMAGE_TO_PNG, AWAITING_IMAGE_TO_JPEG, AWAITING_PAGES_FOR_IMAGE_CONVERSION, AWAITING_DOCX_TO_PDF, AWAITING_PDF_TO_DOCX, AWAITING_CSV_TO_EXCEL, AWAITING_EXCEL_TO_CSV, AWAITING_PPTX_TO_PDF, IDLE, clear_conversation_history
 from .utils import is_exit_command
 from .handlers.main_handlers import handle_option_selection, handle_idle_state, handle_clarification_continuation
 from .handlers.pdf_handlers import (
@@ -9,7 +9,7 @@ from .handlers.pdf_handlers import (
     handle_page_order, handle_pdf_concatenation_order
 )
 from .handlers.image_handlers import (
-    handle_generic_image_to_png, handle_generic_image_to_jpeg
+    handle_generic_image_to_png, handle_generic_image_to_jpeg, handle_pages_for_image_conversion
 )
 from .handlers.document_handlers import (
     handle_docx_to_pdf, handle_pdf_to_docx, handle_csv_to_excel,
@@ -23,6 +23,14 @@ from .handlers.zip_handlers import (
 )
 
 
+async def load_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Load the chat's session from the state backend before any other handler runs"""
+    if update.effective_chat and await load_user_session(update.effective_chat.id) and update.effective_message:
+        await update.effective_message.reply_text(
+            "⚠️ Los archivos que enviaste antes ya no están disponibles. "
+            "Por favor, elige de nuevo la acción y vuelve a enviarlos."
+        )
+
 async def conversation_manager(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main conversation manager that handles user messages based on their state"""
     chat_id = update.message.chat_id
@@ -92,6 +100,8 @@ async def conversation_manager(update: Update, context: ContextTypes.DEFAULT_TYP
         await handle_generic_image_to_png(update, chat_id)
     elif current_state == AWAITING_IMAGE_TO_JPEG:
         await handle_generic_image_to_jpeg(update, chat_id)
+    elif current_state == AWAITING_PAGES_FOR_IMAGE_CONVERSION:
+        await handle_pages_for_image_conversion(update, chat_id)
     elif current_state == AWAITING_DOCX_TO_PDF:
         await handle_docx_to_pdf(update, chat_id)
     elif current_state == AWAITING_PDF_TO_DOCX:
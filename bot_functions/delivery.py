@@ -0,0 +1,256 @@
+import os
+import time
+import random
+import asyncio
+import zipfile
+from collections import deque
+from contextlib import asynccontextmanager, ExitStack
+from datetime import timedelta
+from dotenv import load_dotenv
+from telegram import InputMediaDocument
+from telegram.error import RetryAfter, BadRequest, NetworkError
+
+load_dotenv()
+
+# Multi-file results with more files than this are packed into ZIP parts
+ZIP_DELIVERY_THRESHOLD = int(os.getenv("ZIP_DELIVERY_THRESHOLD", 10))
+# Telegram bots can upload up to 50 MB per file; keep each part safely below it
+MAX_ZIP_PART_SIZE = int(os.getenv("MAX_ZIP_PART_SIZE", 45 * 1024 * 1024))
+
+# Outbound rate limits (Telegram allows about 1 message/s per chat and 30 messages/s overall)
+PER_CHAT_SEND_RATE = float(os.getenv("PER_CHAT_SEND_RATE", 1.0))
+PER_CHAT_SEND_BURST = int(os.getenv("PER_CHAT_SEND_BURST", 3))
+GLOBAL_SEND_RATE = float(os.getenv("GLOBAL_SEND_RATE", 30.0))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", 4))
+MAX_SEND_RETRIES = int(os.getenv("MAX_SEND_RETRIES", 5))
+
+# Telegram accepts between 2 and 10 documents per media group
+MEDIA_GROUP_SIZE = 10
+
+# Bytes of ZIP headers written per entry, besides the entry name (local + central directory)
+_ZIP_ENTRY_OVERHEAD = 128
+
+class ZipPartWriter:
+    """
+    Stream files into one or more ZIP parts, starting a new part whenever the next
+    file would push the current one over max_part_size.
+    Files are stored without recompression since rendered PNG/JPEG pages are already compressed.
+    """
+
+    def __init__(self, output_dir: str, base_name: str, max_part_size: int = MAX_ZIP_PART_SIZE):
+        self.output_dir = output_dir
+        self.base_name = base_name
+        self.max_part_size = max_part_size
+        self.part_number = 0
+        self.part_path = None
+        self.part_size = 0
+        self.part_files = 0
+        self._zipf = None
+
+    def _open_part(self):
+        self.part_number += 1
+        self.part_path = os.path.join(self.output_dir, f"{self.base_name}_part{self.part_number}.zip")
+        self._zipf = zipfile.ZipFile(self.part_path, 'w', zipfile.ZIP_STORED)
+        self.part_size = 0
+        self.part_files = 0
+
+    def _close_part(self) -> tuple[str, int, int]:
+        self._zipf.close()
+        finished = (self.part_path, self.part_number, self.part_files)
+        self._zipf = None
+        self.part_path = None
+        return finished
+
+    def add(self, file_path: str, arcname: str):
+        """
+        Add a file to the current part.
+        Returns (part_path, part_number, file_count) of a part that was completed to make room, or None.
+        """
+        entry_size = os.path.getsize(file_path) + _ZIP_ENTRY_OVERHEAD + 2 * len(arcname.encode())
+        finished = None
+        if self._zipf is not None and self.part_files and self.part_size + entry_size > self.max_part_size:
+            finished = self._close_part()
+        if self._zipf is None:
+            self._open_part()
+        self._zipf.write(file_path, arcname)
+        self.part_size += entry_size
+        self.part_files += 1
+        return finished
+
+    def close(self):
+        """Finish the last part. Returns (part_path, part_number, file_count), or None if nothing was written"""
+        if self._zipf is None:
+            return None
+        return self._close_part()
+
+    def discard(self):
+        """Close and delete the part being written, e.g. after an error"""
+        if self._zipf is not None:
+            part_path, _, _ = self._close_part()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most capacity tokens"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+_global_bucket = TokenBucket(GLOBAL_SEND_RATE, int(GLOBAL_SEND_RATE))
+_chat_buckets = {}
+_upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+def _chat_bucket(chat_id) -> TokenBucket:
+    """Get the rate limiter of a chat, forgetting chats that have been quiet"""
+    if chat_id not in _chat_buckets:
+        if len(_chat_buckets) > 1000:
+            for idle_chat in [c for c, bucket in _chat_buckets.items() if bucket.is_full()]:
+                del _chat_buckets[idle_chat]
+        _chat_buckets[chat_id] = TokenBucket(PER_CHAT_SEND_RATE, PER_CHAT_SEND_BURST)
+    return _chat_buckets[chat_id]
+
+async def send_with_retry(chat_id, send):
+    """
+    Await send() under the chat and global rate limits and the upload concurrency cap.
+    Flood-control errors wait the time requested by Telegram; network errors back off
+    exponentially. send is called again on each attempt so files can be reopened.
+    """
+    for attempt in range(MAX_SEND_RETRIES + 1):
+        await _chat_bucket(chat_id).acquire()
+        await _global_bucket.acquire()
+        try:
+            async with _upload_slots:
+                return await send()
+        except RetryAfter as e:
+            if attempt == MAX_SEND_RETRIES:
+                raise
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            print(f"Flood control en chat {chat_id}, reintentando en {delay}s")
+            await asyncio.sleep(delay)
+        except BadRequest:
+            raise
+        except NetworkError:
+            if attempt == MAX_SEND_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt + random.random())
+
+async def send_file(message, file_path: str, filename: str, caption: str = None):
+    """Reply with a single document through the rate-limited pipeline"""
+    async def send():
+        with open(file_path, 'rb') as document:
+            return await message.reply_document(document=document, filename=filename, caption=caption)
+    return await send_with_retry(message.chat_id, send)
+
+async def send_files(message, files: list):
+    """Reply with up to MEDIA_GROUP_SIZE documents (file_path, filename, caption) in a single call"""
+    if len(files) == 1:
+        return await send_file(message, *files[0])
+
+    async def send():
+        with ExitStack() as stack:
+            media = [
+                InputMediaDocument(stack.enter_context(open(file_path, 'rb')), filename=filename, caption=caption)
+                for file_path, filename, caption in files
+            ]
+            return await message.reply_media_group(media=media)
+    return await send_with_retry(message.chat_id, send)
+
+class Outbox:
+    """
+    Ordered outbound queue of documents for one reply.
+    Files are uploaded in the background while more are added; whatever accumulates
+    during an upload is sent in the next call as a media group of up to group_size files.
+    """
+
+    def __init__(self, message, remove_after: bool = True, group_size: int = MEDIA_GROUP_SIZE):
+        self.message = message
+        self.remove_after = remove_after
+        self.group_size = group_size
+        self.pending = deque()
+        self.sent = 0
+        self.failed = []
+        self._sender = None
+
+    def add(self, file_path: str, filename: str, caption: str = None):
+        """Queue a file for upload; it is deleted after sending when remove_after is set"""
+        self.pending.append((file_path, filename, caption))
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while self.pending:
+            batch = [self.pending.popleft() for _ in range(min(self.group_size, len(self.pending)))]
+            try:
+                await send_files(self.message, batch)
+                self.sent += len(batch)
+            except BadRequest:
+                # A single bad file rejects the whole group: send them one by one instead
+                for item in batch:
+                    await self._send_single(item)
+            except Exception as e:
+                self.failed.extend((filename, str(e)) for _, filename, _ in batch)
+            finally:
+                self._cleanup(batch)
+
+    async def _send_single(self, item):
+        try:
+            await send_file(self.message, *item)
+            self.sent += 1
+        except Exception as e:
+            self.failed.append((item[1], str(e)))
+
+    def _cleanup(self, items):
+        if self.remove_after:
+            for file_path, _, _ in items:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    async def flush(self):
+        """Wait until every queued file has been uploaded"""
+        while self._sender is not None and not self._sender.done():
+            await self._sender
+
+    async def discard(self):
+        """Stop uploading and drop the files still queued"""
+        if self._sender is not None and not self._sender.done():
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+        self._cleanup(self.pending)
+        self.pending.clear()
+
+@asynccontextmanager
+async def outbox(message, remove_after: bool = True, group_size: int = MEDIA_GROUP_SIZE):
+    """Collect documents to reply with, waiting for all uploads when the block ends"""
+    box = Outbox(message, remove_after, group_size)
+    try:
+        yield box
+        await box.flush()
+    except BaseException:
+        await box.discard()
+        raise
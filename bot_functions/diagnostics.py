@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import subprocess
+from dotenv import load_dotenv
+from .intent_rules import INTENT_CORPUS_FILE, load_intent_corpus
+
+load_dotenv()
+
+# Cold-start target: time to import everything main.py needs before the bot starts
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 500))
+
+# Modules imported by main.py
+STARTUP_MODULES = [
+    'bot_functions.handlers.command_handlers',
+    'bot_functions.conversation_manager',
+    'bot_functions.state_manager',
+    'bot_functions.update_processor',
+    'bot_functions.executor',
+    'bot_functions.file_processing.office_pool',
+]
+
+# Libraries that must only be loaded when a conversion needs them
+LAZY_MODULES = ['pandas', 'docx', 'pptx', 'PIL', 'cairosvg', 'pdf2image', 'PyPDF2', 'reportlab', 'google.genai']
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{imports}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+def _parse_importtime(stderr: str) -> list:
+    """Parse `python -X importtime` output into (depth, module, self_us, cumulative_us) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def startup_report(top: int = 15) -> int:
+    """
+    Import the startup modules in a fresh interpreter with -X importtime and print the
+    slowest imports, the total against STARTUP_BUDGET_MS and any library that should
+    have been lazy. Returns a process exit code (0 when within budget).
+    """
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = _PROBE.format(imports="\n".join(f"import {module}" for module in STARTUP_MODULES), lazy=LAZY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=project_dir
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Startup probe failed")
+        return 1
+
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = _parse_importtime(result.stderr)
+
+    print("Slowest imports (top-level and their direct children, cumulative):")
+    for depth, name, _, cumulative_us in sorted(
+        (row for row in rows if row[0] <= 1), key=lambda row: row[3], reverse=True
+    )[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    within_budget = summary['ms'] <= STARTUP_BUDGET_MS
+    print(f"\nStartup imports: {summary['ms']:.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms) - "
+          f"{'OK' if within_budget else 'OVER BUDGET'}")
+    if summary['loaded']:
+        print(f"Loaded eagerly but expected to be lazy: {', '.join(summary['loaded'])}")
+    return 0 if within_budget and not summary['loaded'] else 1
+
+# Load report: chats sending updates at once, updates per chat and I/O wait of each update
+LOAD_REPORT_CHATS = int(os.getenv("LOAD_REPORT_CHATS", 50))
+LOAD_REPORT_UPDATES = int(os.getenv("LOAD_REPORT_UPDATES", 10))
+LOAD_REPORT_WORK_MS = float(os.getenv("LOAD_REPORT_WORK_MS", 20))
+
+class _FakeChat:
+    __slots__ = ('id',)
+
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class _FakeUpdate:
+    """The part of a telegram Update the update processors look at"""
+    __slots__ = ('effective_chat', 'sequence')
+
+    def __init__(self, chat_id: int, sequence: int):
+        self.effective_chat = _FakeChat(chat_id)
+        self.sequence = sequence
+
+async def _run_updates(processor, chats: int, updates: int, work_ms: float) -> tuple:
+    """
+    Feed chats x updates fake updates, interleaved across chats as they would arrive, to an
+    update processor. Each update waits work_ms as a handler waiting on Telegram or the LLM.
+    Returns (seconds, handled order of each chat, most updates of one chat running at once).
+    """
+    import asyncio
+
+    handled = {chat_id: [] for chat_id in range(chats)}
+    running = {}
+    overlap = 0
+
+    async def handle(update):
+        nonlocal overlap
+        chat_id = update.effective_chat.id
+        running[chat_id] = running.get(chat_id, 0) + 1
+        overlap = max(overlap, running[chat_id])
+        await asyncio.sleep(work_ms / 1000)
+        handled[chat_id].append(update.sequence)
+        running[chat_id] -= 1
+
+    await processor.initialize()
+    started = time.perf_counter()
+    # Application dispatches every update as its own task and lets the processor decide
+    tasks = [
+        asyncio.create_task(processor.process_update(update, handle(update)))
+        for update in (_FakeUpdate(chat_id, sequence) for sequence in range(updates) for chat_id in range(chats))
+    ]
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - started
+    await processor.shutdown()
+    return seconds, handled, overlap
+
+def _load_report(chats: int, updates: int, work_ms: float) -> list:
+    """Run the load through the default (sequential) processor and ChatOrderedUpdateProcessor"""
+    import asyncio
+    from telegram.ext import SimpleUpdateProcessor
+    from bot_functions.update_processor import ChatOrderedUpdateProcessor
+
+    rows = []
+    for name, processor in (
+        ("default", SimpleUpdateProcessor(1)),
+        ("chat-ordered", ChatOrderedUpdateProcessor()),
+    ):
+        seconds, handled, overlap = asyncio.run(_run_updates(processor, chats, updates, work_ms))
+        in_order = all(sequence == list(range(updates)) for sequence in handled.values())
+        rows.append((name, chats * updates / seconds, seconds, in_order and overlap == 1))
+    return rows
+
+def load_report(chats: int = LOAD_REPORT_CHATS, updates: int = LOAD_REPORT_UPDATES, work_ms: float = LOAD_REPORT_WORK_MS) -> int:
+    """
+    Send LOAD_REPORT_CHATS chats x LOAD_REPORT_UPDATES updates through the default update
+    processor and through ChatOrderedUpdateProcessor and print the throughput of each.
+    Returns a process exit code (0 when every chat kept its order and the new processor is faster).
+    """
+    rows = _load_report(chats, updates, work_ms)
+    print(f"{chats} chats x {updates} updates, {work_ms:.0f} ms of I/O per update")
+    print(f"{'Processor':<14}  {'Updates/s':>9}  {'Seconds':>8}  Per-chat order")
+    for name, throughput, seconds, in_order in rows:
+        print(f"{name:<14}  {throughput:>9.0f}  {seconds:>8.2f}  {'OK' if in_order else 'BROKEN'}")
+    gain = rows[1][1] / rows[0][1]
+    print(f"\nThroughput gain: {gain:.1f}x")
+    return 0 if all(row[3] for row in rows) and gain > 1 else 1
+
+# The rules answer without asking the LLM, so a wrong match is worse than a miss
+INTENT_MIN_PRECISION = float(os.getenv("INTENT_MIN_PRECISION", 0.98))
+
+def intent_report(path: str = INTENT_CORPUS_FILE) -> int:
+    """
+    Run the local intent rules over the labeled corpus and print per-action precision and
+    recall, the share of messages answered without the LLM and every wrong match.
+    Returns a process exit code (0 when precision reaches INTENT_MIN_PRECISION).
+    """
+    from bot_functions.intent_rules import classify_intent
+
+    samples = load_intent_corpus(path)
+    results = [(expected, classify_intent(message), message) for expected, message in samples]
+
+    print(f"{'Acción':>6}  {'Precision':>9}  {'Recall':>6}  {'Ejemplos':>8}")
+    for action in range(1, 21):
+        true_positives = sum(1 for expected, got, _ in results if got == action and expected == action)
+        predicted = sum(1 for _, got, _ in results if got == action)
+        relevant = sum(1 for expected, _, _ in results if expected == action)
+        precision = true_positives / predicted if predicted else 1.0
+        recall = true_positives / relevant if relevant else 1.0
+        print(f"{action:>6}  {precision:>9.0%}  {recall:>6.0%}  {relevant:>8}")
+
+    answered = [(expected, got) for expected, got, _ in results if got is not None]
+    correct = sum(1 for expected, got in answered if expected == got)
+    labeled = sum(1 for expected, _, _ in results if expected)
+    precision = correct / len(answered) if answered else 1.0
+    recall = correct / labeled if labeled else 1.0
+    print(f"\nAnswered locally: {len(answered)}/{len(results)} ({len(answered) / len(results):.0%})")
+    print(f"Precision: {precision:.1%} (minimum {INTENT_MIN_PRECISION:.0%})  Recall: {recall:.1%}")
+
+    errors = [(expected, got, message) for expected, got, message in results if got is not None and got != expected]
+    for expected, got, message in errors:
+        print(f"  wrong: {message!r} -> {got} (expected {expected or 'LLM'})")
+    return 0 if precision >= INTENT_MIN_PRECISION else 1
+
+async def _router_report(samples: list) -> list:
+    """Classify every sample with each model alone and with the cascade"""
+    from bot_functions.intent_router import MODEL_TIERS, build_intent_prompt, classify_with_models
+    from bot_functions.handlers.main_handlers import get_system_prompt
+
+    system_prompt = get_system_prompt()
+    prompts = [(expected, build_intent_prompt(system_prompt, [{'role': "USER", 'message': message}]))
+               for expected, message in samples]
+    runs = [(model, [(model, threshold)]) for model, threshold in MODEL_TIERS]
+    if len(MODEL_TIERS) > 1:
+        runs.append(("cascade", MODEL_TIERS))
+
+    rows = []
+    for name, tiers in runs:
+        correct = 0
+        latencies = []
+        decided_by = {}
+        for expected, prompt in prompts:
+            started = time.perf_counter()
+            try:
+                intent, model = await classify_with_models(prompt, tiers)
+                correct += intent['action'] == expected
+            except Exception as e:
+                model = f"error ({type(e).__name__})"
+            latencies.append((time.perf_counter() - started) * 1000)
+            decided_by[model] = decided_by.get(model, 0) + 1
+        rows.append((name, correct / len(prompts), sum(latencies) / len(latencies), max(latencies), decided_by))
+    return rows
+
+def router_report(path: str = INTENT_CORPUS_FILE) -> int:
+    """
+    Send the labeled actions of the intent corpus to every model of INTENT_MODELS and to
+    the whole cascade, and print accuracy and latency of each. Point GEMINI_BASE_URL at a
+    fake server to try routing settings without using the real API.
+    """
+    import asyncio
+
+    samples = [(expected, message) for expected, message in load_intent_corpus(path) if expected]
+    rows = asyncio.run(_router_report(samples))
+
+    print(f"{'Modelo':<24}  {'Accuracy':>8}  {'Avg ms':>8}  {'Max ms':>8}  Decided by")
+    for name, accuracy, avg_ms, max_ms, decided_by in rows:
+        decided = ", ".join(f"{model}: {count}" for model, count in decided_by.items())
+        print(f"{name:<24}  {accuracy:>8.1%}  {avg_ms:>8.0f}  {max_ms:>8.0f}  {decided}")
+    return 0
@@ -0,0 +1,52 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pool sizes can be tuned from the environment (.env)
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", os.cpu_count() or 2))
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", 8))
+
+# Global executors, created lazily on first use
+_process_pool = None
+_thread_pool = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool used for CPU-bound work"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _process_pool
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Get the shared thread pool used for blocking I/O"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS, thread_name_prefix="bot-io")
+    return _thread_pool
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Run a CPU-bound function (rendering, encoding, PDF writing) in the process pool.
+    The function and its arguments must be picklable (module-level functions only).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O function (disk access, subprocesses) in the thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), partial(func, *args, **kwargs))
+
+def shutdown_executors(wait: bool = True):
+    """Shut down both pools, e.g. when the bot stops"""
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=wait, cancel_futures=True)
+        _thread_pool = None
@@ -1,16 +1,24 @@
 import os
-import tempfile
-import pandas as pd
-from docx import Document
-from pptx import Presentation
+from io import BytesIO
 import subprocess
 import platform
+from ..executor import run_cpu, run_io
+from .office_pool import office_pool
 
-async def convert_docx_to_pdf(docx_path: str, chat_id: int) -> str:
+# pandas, python-docx and python-pptx are imported by the functions that need them;
+# most chats never convert spreadsheets or presentations
+
+# Outputs of the text-extraction fallbacks end with this suffix ("docx_to_pdf_simple.pdf")
+FALLBACK_OUTPUT_SUFFIX = "_simple"
+
+def is_fallback_output(path: str) -> bool:
+    """Whether a conversion output was produced by a degraded text-extraction fallback"""
+    return os.path.splitext(os.path.basename(path))[0].endswith(FALLBACK_OUTPUT_SUFFIX)
+
+def _convert_docx_to_pdf(docx_path: str, output_dir: str) -> str:
     """Convert DOCX file to PDF with formatting preservation"""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"docx_to_pdf_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "docx_to_pdf.pdf")
 
         # Try docx2pdf first for best formatting preservation
         try:
@@ -36,12 +44,12 @@ async def convert_docx_to_pdf(docx_path: str, chat_id: int) -> str:
                 try:
                     subprocess.run([
                         cmd, '--headless', '--convert-to', 'pdf',
-                        '--outdir', temp_dir, docx_path
+                        '--outdir', output_dir, docx_path
                     ], check=True, capture_output=True)
 
                     # LibreOffice creates file with same name but .pdf extension
                     base_name = os.path.splitext(os.path.basename(docx_path))[0]
-                    libreoffice_output = os.path.join(temp_dir, f"{base_name}.pdf")
+                    libreoffice_output = os.path.join(output_dir, f"{base_name}.pdf")
 
                     if os.path.exists(libreoffice_output):
                         os.rename(libreoffice_output, output_path)
@@ -57,20 +65,20 @@ async def convert_docx_to_pdf(docx_path: str, chat_id: int) -> str:
 
         # Final fallback: create simple PDF from text
         print("Using text extraction fallback method")
-        return await _create_simple_pdf_from_docx(docx_path, chat_id)
+        return _create_simple_pdf_from_docx(docx_path, output_dir)
 
     except Exception as e:
         print(f"Error converting DOCX to PDF: {e}")
         return None
 
-async def _create_simple_pdf_from_docx(docx_path: str, chat_id: int) -> str:
+def _create_simple_pdf_from_docx(docx_path: str, output_dir: str) -> str:
     """Fallback method to create PDF from DOCX using text extraction"""
     try:
         from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import letter
+        from docx import Document
 
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"docx_to_pdf_simple_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, f"docx_to_pdf{FALLBACK_OUTPUT_SUFFIX}.pdf")
 
         # Extract text from DOCX
         doc = Document(docx_path)
@@ -113,11 +121,10 @@ async def _create_simple_pdf_from_docx(docx_path: str, chat_id: int) -> str:
         print(f"Error creating simple PDF from DOCX: {e}")
         return None
 
-async def convert_pdf_to_docx(pdf_path: str, chat_id: int) -> str:
+def _convert_pdf_to_docx(pdf_path: str, output_dir: str) -> str:
     """Convert PDF file to DOCX with formatting preservation"""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pdf_to_docx_{chat_id}.docx")
+        output_path = os.path.join(output_dir, "pdf_to_docx.docx")
 
         # Try pdf2docx first for best formatting preservation
         try:
@@ -141,13 +148,13 @@ async def convert_pdf_to_docx(pdf_path: str, chat_id: int) -> str:
 
         # Fallback to PyPDF2 text extraction method
         print("Using PyPDF2 text extraction fallback method")
-        return await _create_simple_docx_from_pdf(pdf_path, chat_id)
+        return _create_simple_docx_from_pdf(pdf_path, output_dir)
 
     except Exception as e:
         print(f"Error converting PDF to DOCX: {e}")
         return None
 
-async def _create_simple_docx_from_pdf(pdf_path: str, chat_id: int) -> str:
+def _create_simple_docx_from_pdf(pdf_path: str, output_dir: str) -> str:
     """Fallback method to create DOCX from PDF using text extraction"""
     try:
         from PyPDF2 import PdfReader
@@ -155,8 +162,7 @@ async def _create_simple_docx_from_pdf(pdf_path: str, chat_id: int) -> str:
         from docx.shared import Inches
         from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pdf_to_docx_simple_{chat_id}.docx")
+        output_path = os.path.join(output_dir, f"pdf_to_docx{FALLBACK_OUTPUT_SUFFIX}.docx")
 
         # Extract text from PDF
         reader = PdfReader(pdf_path)
@@ -219,11 +225,11 @@ async def _create_simple_docx_from_pdf(pdf_path: str, chat_id: int) -> str:
         print(f"Error creating simple DOCX from PDF: {e}")
         return None
 
-async def convert_csv_to_excel(csv_path: str, chat_id: int) -> str:
+def _convert_csv_to_excel(csv_path: str, output_dir: str) -> str:
     """Convert CSV file to Excel"""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"csv_to_excel_{chat_id}.xlsx")
+        import pandas as pd
+        output_path = os.path.join(output_dir, "csv_to_excel.xlsx")
 
         # Read CSV and convert to Excel
         df = pd.read_csv(csv_path)
@@ -234,11 +240,11 @@ async def convert_csv_to_excel(csv_path: str, chat_id: int) -> str:
         print(f"Error converting CSV to Excel: {e}")
         return None
 
-async def convert_excel_to_csv(excel_path: str, chat_id: int) -> str:
+def _convert_excel_to_csv(excel_path: str, output_dir: str) -> str:
     """Convert Excel file to CSV"""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"excel_to_csv_{chat_id}.csv")
+        import pandas as pd
+        output_path = os.path.join(output_dir, "excel_to_csv.csv")
 
         # Read Excel and convert to CSV
         df = pd.read_excel(excel_path, sheet_name=0)  # Read first sheet
@@ -249,11 +255,32 @@ async def convert_excel_to_csv(excel_path: str, chat_id: int) -> str:
         print(f"Error converting Excel to CSV: {e}")
         return None
 
-async def convert_pptx_to_pdf(pptx_path: str, chat_id: int) -> str:
+def _convert_csv_bytes_to_excel(data: bytes) -> bytes:
+    """Convert a small in-memory CSV file to Excel bytes"""
+    try:
+        import pandas as pd
+        output = BytesIO()
+        df = pd.read_csv(BytesIO(data))
+        df.to_excel(output, index=False, engine='openpyxl')
+        return output.getvalue()
+    except Exception as e:
+        print(f"Error converting CSV to Excel: {e}")
+        return None
+
+def _convert_excel_bytes_to_csv(data: bytes) -> bytes:
+    """Convert a small in-memory Excel file to CSV bytes"""
+    try:
+        import pandas as pd
+        df = pd.read_excel(BytesIO(data), sheet_name=0)  # Read first sheet
+        return df.to_csv(index=False).encode('utf-8')
+    except Exception as e:
+        print(f"Error converting Excel to CSV: {e}")
+        return None
+
+def _convert_pptx_to_pdf(pptx_path: str, output_dir: str) -> str:
     """Convert PowerPoint file to PDF with formatting preservation using LibreOffice CLI"""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pptx_to_pdf_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "pptx_to_pdf.pdf")
 
         # Try LibreOffice CLI first (cross-platform, best formatting preservation)
         # Try both command names: 'libreoffice' and 'soffice'
@@ -265,12 +292,12 @@ async def convert_pptx_to_pdf(pptx_path: str, chat_id: int) -> str:
                 # Use LibreOffice headless mode for conversion
                 result = subprocess.run([
                     cmd, '--headless', '--convert-to', 'pdf',
-                    '--outdir', temp_dir, pptx_path
+                    '--outdir', output_dir, pptx_path
                 ], check=True, capture_output=True, text=True, timeout=60)
 
                 # LibreOffice creates file with same name but .pdf extension
                 base_name = os.path.splitext(os.path.basename(pptx_path))[0]
-                libreoffice_output = os.path.join(temp_dir, f"{base_name}.pdf")
+                libreoffice_output = os.path.join(output_dir, f"{base_name}.pdf")
 
                 if os.path.exists(libreoffice_output):
                     # Rename to our desired output path
@@ -320,21 +347,21 @@ async def convert_pptx_to_pdf(pptx_path: str, chat_id: int) -> str:
 
         # Final fallback: create simple PDF from presentation text
         print("Using text extraction fallback method for PowerPoint")
-        return await _create_simple_pdf_from_pptx(pptx_path, chat_id)
+        return _create_simple_pdf_from_pptx(pptx_path, output_dir)
 
     except Exception as e:
         print(f"Error converting PPTX to PDF: {e}")
         return None
 
-async def _create_simple_pdf_from_pptx(pptx_path: str, chat_id: int) -> str:
+def _create_simple_pdf_from_pptx(pptx_path: str, output_dir: str) -> str:
     """Fallback method to create PDF from PPTX using text extraction"""
     try:
         from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import letter
         from reportlab.lib.units import inch
+        from pptx import Presentation
 
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pptx_to_pdf_simple_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, f"pptx_to_pdf{FALLBACK_OUTPUT_SUFFIX}.pdf")
 
         # Extract text from PPTX
         prs = Presentation(pptx_path)
@@ -423,3 +450,52 @@ async def _create_simple_pdf_from_pptx(pptx_path: str, chat_id: int) -> str:
     except Exception as e:
         print(f"Error creating simple PDF from PPTX: {e}")
         return None
+
+def _is_libreoffice_available() -> bool:
+    """Check whether a LibreOffice CLI is installed"""
+    for cmd in ['libreoffice', 'soffice']:
+        try:
+            result = subprocess.run([cmd, '--version'], capture_output=True, text=True, timeout=5)
+            if result.returncode == 0:
+                return True
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            continue
+    return False
+
+async def is_libreoffice_available() -> bool:
+    """Check whether LibreOffice (warm pool or CLI) is installed without blocking the event loop"""
+    return office_pool.available or await run_io(_is_libreoffice_available)
+
+async def convert_docx_to_pdf(docx_path: str, output_dir: str) -> str:
+    """Convert DOCX file to PDF with formatting preservation, using a warm LibreOffice instance when available"""
+    output_path = os.path.join(output_dir, "docx_to_pdf.pdf")
+    if await office_pool.convert(docx_path, output_path):
+        return output_path
+    return await run_io(_convert_docx_to_pdf, docx_path, output_dir)
+
+async def convert_pdf_to_docx(pdf_path: str, output_dir: str) -> str:
+    """Convert PDF file to DOCX with formatting preservation"""
+    return await run_cpu(_convert_pdf_to_docx, pdf_path, output_dir)
+
+async def convert_csv_to_excel(csv_path: str, output_dir: str) -> str:
+    """Convert CSV file to Excel"""
+    return await run_cpu(_convert_csv_to_excel, csv_path, output_dir)
+
+async def convert_excel_to_csv(excel_path: str, output_dir: str) -> str:
+    """Convert Excel file to CSV"""
+    return await run_cpu(_convert_excel_to_csv, excel_path, output_dir)
+
+async def convert_csv_bytes_to_excel(data: bytes) -> bytes:
+    """Convert a small in-memory CSV file to Excel bytes"""
+    return await run_cpu(_convert_csv_bytes_to_excel, data)
+
+async def convert_excel_bytes_to_csv(data: bytes) -> bytes:
+    """Convert a small in-memory Excel file to CSV bytes"""
+    return await run_cpu(_convert_excel_bytes_to_csv, data)
+
+async def convert_pptx_to_pdf(pptx_path: str, output_dir: str) -> str:
+    """Convert PowerPoint file to PDF with formatting preservation, using a warm LibreOffice instance when available"""
+    output_path = os.path.join(output_dir, "pptx_to_pdf.pdf")
+    if await office_pool.convert(pptx_path, output_path):
+        return output_path
+    return await run_io(_convert_pptx_to_pdf, pptx_path, output_dir)
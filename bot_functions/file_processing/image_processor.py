@@ -1,97 +1,223 @@
 import os
-import tempfile
-from PIL import Image
-import cairosvg
-from pdf2image import convert_from_path
+import asyncio
+from collections import deque
+from io import BytesIO
+from dotenv import load_dotenv
+from ..executor import run_cpu
 
-async def transform_to_png(input_path: str, chat_id: int, source_extension: str) -> tuple[str, bool]:
-    """
-    Converts any supported image format to PNG.
-    Returns (output_path, is_multiple_files) where is_multiple_files is True for PDF with multiple pages.
-    """
+load_dotenv()
+
+# Pillow, cairosvg and pdf2image are imported where they are used, so they are only
+# loaded by the processes that actually convert images
+
+# Quality presets for PDF rasterization, selectable by the user
+RENDER_PRESETS = {
+    'baja': {'dpi': 100, 'jpeg_quality': 70},
+    'media': {'dpi': 150, 'jpeg_quality': 85},
+    'alta': {'dpi': 200, 'jpeg_quality': 95},
+    'maxima': {'dpi': 300, 'jpeg_quality': 95},
+}
+DEFAULT_RENDER_PRESET = 'alta'
+
+# Pages rendered per pool task and number of tasks rendering at once for one PDF
+RENDER_CHUNK_SIZE = int(os.getenv("RENDER_CHUNK_SIZE", 4))
+RENDER_PARALLELISM = int(os.getenv("RENDER_PARALLELISM", 2))
+
+def _svg_to_png(source, destination):
+    """Rasterize an SVG (path or file object) into PNG at destination (path or file object)"""
+    import cairosvg
+    if isinstance(source, str):
+        cairosvg.svg2png(url=source, write_to=destination, dpi=300)
+    else:
+        cairosvg.svg2png(file_obj=source, write_to=destination, dpi=300)
+
+def _write_png(source, source_extension: str, destination):
+    """Convert a JPEG or SVG image from source to PNG; both may be paths or file objects"""
+    from PIL import Image
     source_extension = source_extension.lower()
 
     if source_extension in ['jpg', 'jpeg']:
         # JPEG to PNG
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"png_output_{chat_id}.png")
-        with Image.open(input_path) as img:
+        with Image.open(source) as img:
             if img.mode in ('RGBA', 'LA'):
                 background = Image.new('RGB', img.size, (255, 255, 255))
                 background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
                 img = background
-            img.save(output_path, 'PNG')
-        return output_path, False
+            img.save(destination, 'PNG')
     elif source_extension == 'svg':
         # SVG to PNG
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"svg_to_png_{chat_id}.png")
-        cairosvg.svg2png(url=input_path, write_to=output_path, dpi=300)
-        return output_path, False
-    elif source_extension == 'pdf':
-        # PDF to PNG (all pages)
-        temp_dir = tempfile.gettempdir()
-        output_paths = []
-        images = convert_from_path(input_path, dpi=200)
-        for i, image in enumerate(images, 1):
-            output_path = os.path.join(temp_dir, f"pdf_to_png_{chat_id}_page_{i}.png")
-            image.save(output_path, 'PNG')
-            output_paths.append(output_path)
-        return output_paths, True
+        _svg_to_png(source, destination)
     else:
         raise ValueError(f"Extensión no soportada para conversión a PNG: {source_extension}")
 
-async def transform_to_jpeg(input_path: str, chat_id: int, source_extension: str) -> tuple[str, bool]:
-    """
-    Converts any supported image format to JPEG.
-    Returns (output_path, is_multiple_files) where is_multiple_files is True for PDF with multiple pages.
-    """
+def _write_jpeg(source, source_extension: str, destination):
+    """Convert a PNG or SVG image from source to JPEG; both may be paths or file objects"""
+    from PIL import Image
     source_extension = source_extension.lower()
 
     if source_extension == 'png':
         # PNG to JPEG
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"jpeg_output_{chat_id}.jpg")
-        with Image.open(input_path) as img:
+        with Image.open(source) as img:
             if img.mode in ('RGBA', 'LA'):
                 background = Image.new('RGB', img.size, (255, 255, 255))
                 background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
                 img = background
             elif img.mode == 'P':
                 img = img.convert('RGB')
-            img.save(output_path, 'JPEG', quality=95)
-        return output_path, False
+            img.save(destination, 'JPEG', quality=95)
     elif source_extension == 'svg':
-        # SVG to JPEG
-        temp_dir = tempfile.gettempdir()
-        png_path = os.path.join(temp_dir, f"svg_to_png_temp_{chat_id}.png")
-        output_path = os.path.join(temp_dir, f"svg_to_jpeg_{chat_id}.jpg")
-        cairosvg.svg2png(url=input_path, write_to=png_path, dpi=300)
-        with Image.open(png_path) as img:
+        # SVG to JPEG, rasterized through an in-memory PNG
+        png_buffer = BytesIO()
+        _svg_to_png(source, png_buffer)
+        png_buffer.seek(0)
+        with Image.open(png_buffer) as img:
             if img.mode in ('RGBA', 'LA'):
                 background = Image.new('RGB', img.size, (255, 255, 255))
                 background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
                 img = background
-            img.save(output_path, 'JPEG', quality=95)
-        os.remove(png_path)
-        return output_path, False
-    elif source_extension == 'pdf':
-        # PDF to JPEG (all pages)
-        temp_dir = tempfile.gettempdir()
-        # First convert to PNG then to JPEG
-        images = convert_from_path(input_path, dpi=200)
-        jpeg_paths = []
-
-        for i, image in enumerate(images, 1):
-            jpeg_path = os.path.join(temp_dir, f"pdf_to_jpeg_{chat_id}_page_{i}.jpg")
-            # Convert PIL image directly to JPEG
-            if image.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            image.save(jpeg_path, 'JPEG', quality=95)
-            jpeg_paths.append(jpeg_path)
-
-        return jpeg_paths, True
+            img.save(destination, 'JPEG', quality=95)
     else:
         raise ValueError(f"Extensión no soportada para conversión a JPEG: {source_extension}")
+
+def _transform_to_png(input_path: str, output_dir: str, source_extension: str) -> str:
+    """Converts a single-image format (JPEG, SVG) to PNG and returns the output path"""
+    prefix = 'svg_to_png' if source_extension.lower() == 'svg' else 'png_output'
+    output_path = os.path.join(output_dir, f"{prefix}.png")
+    _write_png(input_path, source_extension, output_path)
+    return output_path
+
+def _transform_to_jpeg(input_path: str, output_dir: str, source_extension: str) -> str:
+    """Converts a single-image format (PNG, SVG) to JPEG and returns the output path"""
+    prefix = 'svg_to_jpeg' if source_extension.lower() == 'svg' else 'jpeg_output'
+    output_path = os.path.join(output_dir, f"{prefix}.jpg")
+    _write_jpeg(input_path, source_extension, output_path)
+    return output_path
+
+def _transform_bytes_to_png(data: bytes, source_extension: str) -> bytes:
+    """Convert a small JPEG or SVG image to PNG entirely in memory"""
+    output = BytesIO()
+    _write_png(BytesIO(data), source_extension, output)
+    return output.getvalue()
+
+def _transform_bytes_to_jpeg(data: bytes, source_extension: str) -> bytes:
+    """Convert a small PNG or SVG image to JPEG entirely in memory"""
+    output = BytesIO()
+    _write_jpeg(BytesIO(data), source_extension, output)
+    return output.getvalue()
+
+def _get_pdf_page_count(input_path: str) -> int:
+    """Read the number of pages of a PDF using poppler"""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(input_path)['Pages'])
+
+def _render_pdf_chunk(input_path: str, first_page: int, last_page: int, output_folder: str,
+                      output_file: str, image_format: str, dpi: int, jpeg_quality: int) -> list:
+    """
+    Render a contiguous range of PDF pages straight to PNG or JPEG files with pdftoppm.
+    The images are written by poppler and never decoded into memory here.
+    Returns the output paths in page order.
+    """
+    from pdf2image import convert_from_path
+    is_jpeg = image_format == 'JPEG'
+    return convert_from_path(
+        input_path,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        output_folder=output_folder,
+        output_file=output_file,
+        fmt='jpeg' if is_jpeg else 'png',
+        jpegopt={'quality': jpeg_quality} if is_jpeg else None,
+        paths_only=True,
+    )
+
+def split_page_chunks(pages: list, chunk_size: int) -> list:
+    """Group sorted page numbers into contiguous (first_page, last_page) chunks of at most chunk_size pages"""
+    chunks = []
+    for page in pages:
+        if chunks and page == chunks[-1][1] + 1 and page - chunks[-1][0] < chunk_size:
+            chunks[-1] = (chunks[-1][0], page)
+        else:
+            chunks.append((page, page))
+    return chunks
+
+def _remove_rendered_chunk(task: asyncio.Future):
+    """Delete rendered pages that will never be handed to the consumer"""
+    if not task.cancelled() and task.exception() is None:
+        for output_path in task.result():
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+async def render_pdf_pages(input_path: str, output_dir: str, image_format: str, progress=None,
+                           pages: list = None, preset: str = DEFAULT_RENDER_PRESET):
+    """
+    Render the selected pages of a PDF (all pages by default), yielding
+    (position, total, page_number, output_path) as soon as each page is ready.
+    Pages are split into chunks rendered in parallel by the process pool, and pages
+    are handed out in order so the caller can upload page 1 while the rest render.
+    progress(done, total) is awaited after each rendered page.
+    """
+    prefix = 'pdf_to_jpeg' if image_format == 'JPEG' else 'pdf_to_png'
+    settings = RENDER_PRESETS[preset]
+
+    if pages is None:
+        page_count = await run_cpu(_get_pdf_page_count, input_path)
+        pages = list(range(1, page_count + 1))
+    total = len(pages)
+
+    # Small chunks keep the first page fast; never use fewer chunks than workers
+    chunk_size = max(1, min(RENDER_CHUNK_SIZE, -(-total // RENDER_PARALLELISM)))
+    chunks = deque(split_page_chunks(sorted(pages), chunk_size))
+
+    pending = deque()
+    undelivered = deque()
+    position = 0
+    try:
+        while chunks or pending:
+            # Keep RENDER_PARALLELISM chunks rendering at once
+            while chunks and len(pending) < RENDER_PARALLELISM:
+                first_page, last_page = chunks.popleft()
+                output_file = f"{prefix}_p{first_page}-{last_page}_"
+                task = asyncio.ensure_future(run_cpu(
+                    _render_pdf_chunk, input_path, first_page, last_page, output_dir, output_file,
+                    image_format, settings['dpi'], settings['jpeg_quality']
+                ))
+                pending.append((first_page, task))
+
+            first_page, task = pending.popleft()
+            undelivered.extend(enumerate(await task, first_page))
+            while undelivered:
+                page_number, output_path = undelivered.popleft()
+                position += 1
+                if progress:
+                    await progress(position, total)
+                yield position, total, page_number, output_path
+    finally:
+        # The consumer stopped early: drop pages rendered ahead of it
+        for _, output_path in undelivered:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        for _, task in pending:
+            task.add_done_callback(_remove_rendered_chunk)
+
+async def transform_to_png(input_path: str, output_dir: str, source_extension: str) -> str:
+    """
+    Converts a JPEG or SVG image to PNG and returns the output path.
+    PDF pages are rendered with render_pdf_pages.
+    """
+    return await run_cpu(_transform_to_png, input_path, output_dir, source_extension)
+
+async def transform_to_jpeg(input_path: str, output_dir: str, source_extension: str) -> str:
+    """
+    Converts a PNG or SVG image to JPEG and returns the output path.
+    PDF pages are rendered with render_pdf_pages.
+    """
+    return await run_cpu(_transform_to_jpeg, input_path, output_dir, source_extension)
+
+async def transform_bytes_to_png(data: bytes, source_extension: str) -> bytes:
+    """Convert a small in-memory JPEG or SVG image to PNG bytes"""
+    return await run_cpu(_transform_bytes_to_png, data, source_extension)
+
+async def transform_bytes_to_jpeg(data: bytes, source_extension: str) -> bytes:
+    """Convert a small in-memory PNG or SVG image to JPEG bytes"""
+    return await run_cpu(_transform_bytes_to_jpeg, data, source_extension)
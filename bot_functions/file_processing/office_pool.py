@@ -0,0 +1,241 @@
+import os
+import time
+import shutil
+import socket
+import asyncio
+import tempfile
+import subprocess
+import xmlrpc.client
+from pathlib import Path
+from dotenv import load_dotenv
+from ..executor import run_io
+
+load_dotenv()
+
+# Long-lived headless LibreOffice instances served by unoserver (pip install unoserver)
+OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", 2))
+OFFICE_POOL_BASE_PORT = int(os.getenv("OFFICE_POOL_BASE_PORT", 2003))
+# Restart an instance after this many conversions to keep its memory in check
+OFFICE_MAX_CONVERSIONS = int(os.getenv("OFFICE_MAX_CONVERSIONS", 200))
+OFFICE_CONVERT_TIMEOUT = int(os.getenv("OFFICE_CONVERT_TIMEOUT", 120))
+OFFICE_START_TIMEOUT = int(os.getenv("OFFICE_START_TIMEOUT", 60))
+# Port pairs tried above OFFICE_POOL_BASE_PORT; pairs already bound (another bot process) are skipped
+OFFICE_PORT_SEARCH = int(os.getenv("OFFICE_PORT_SEARCH", 50))
+# Port pairs tried when an instance exits right away, e.g. because another process took its port
+OFFICE_START_ATTEMPTS = 3
+
+def _port_is_free(port: int) -> bool:
+    """Whether nothing is listening on port on the loopback interface"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        try:
+            probe.bind(('127.0.0.1', port))
+            return True
+        except OSError:
+            return False
+
+def _find_free_ports(first_port: int) -> tuple:
+    """First (XML-RPC, UNO) pair of consecutive free ports from first_port, stepping by two"""
+    for port in range(first_port, first_port + 2 * OFFICE_PORT_SEARCH, 2):
+        if _port_is_free(port) and _port_is_free(port + 1):
+            return port, port + 1
+    raise RuntimeError(f"No free port pair for an office worker from port {first_port}")
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport with a socket timeout, so a hung office instance cannot block forever"""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+class OfficeWorker:
+    """One unoserver process with its own LibreOffice user profile"""
+
+    def __init__(self, first_port: int):
+        # Ports are chosen when the instance starts, from first_port up
+        self.first_port = first_port
+        self.port = None
+        self.uno_port = None
+        self.profile_dir = None
+        self.process = None
+        self.process_exited_early = False
+        self.conversions = 0
+
+    def start(self):
+        """Launch the office instance on free ports and wait until it accepts requests"""
+        first_port = self.first_port
+        for _ in range(OFFICE_START_ATTEMPTS):
+            self.port, self.uno_port = _find_free_ports(first_port)
+            if self._launch():
+                print(f"Office worker ready on port {self.port}")
+                return
+            if self.process_exited_early:
+                # Probably lost the ports to another process between the check and the launch
+                first_port = self.port + 2
+                continue
+            break
+        raise RuntimeError(f"Office worker on port {self.port} failed to start")
+
+    def _launch(self) -> bool:
+        """Start unoserver on the chosen ports; False (and everything cleaned up) when it does not come up"""
+        self.profile_dir = tempfile.mkdtemp(prefix=f"office_profile_{self.port}_")
+        self.process = subprocess.Popen([
+            'unoserver', '--interface', '127.0.0.1',
+            '--port', str(self.port), '--uno-port', str(self.uno_port),
+            '--user-installation', Path(self.profile_dir).as_uri()
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.conversions = 0
+        self.process_exited_early = False
+
+        deadline = time.monotonic() + OFFICE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.is_healthy():
+                return True
+            if self.process.poll() is not None:
+                self.process_exited_early = True
+                break
+            time.sleep(0.5)
+        self.stop()
+        return False
+
+    def is_healthy(self) -> bool:
+        """Check that the process is alive and its XML-RPC port answers"""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def convert(self, input_path: str, output_path: str, convert_to: str = 'pdf'):
+        """Convert a document through the running instance"""
+        proxy = xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}", allow_none=True,
+            transport=_TimeoutTransport(OFFICE_CONVERT_TIMEOUT)
+        )
+        proxy.convert(os.path.abspath(input_path), None, os.path.abspath(output_path), convert_to)
+        self.conversions += 1
+
+    def stop(self):
+        """Terminate the instance and delete its profile"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+class OfficePool:
+    """
+    Pool of warm LibreOffice instances for DOCX/PPTX to PDF conversions.
+    Instances are started on first use, health-checked before each conversion and
+    recycled after OFFICE_MAX_CONVERSIONS conversions or when they crash.
+    """
+
+    def __init__(self, size: int, base_port: int):
+        self.workers = [OfficeWorker(base_port + 2 * i) for i in range(size)]
+        self.idle = None
+        self.available = size > 0 and shutil.which('unoserver') is not None
+        self._starting = None
+
+    async def _start(self):
+        self.idle = asyncio.Queue()
+        started = []
+        for worker in self.workers:
+            try:
+                await run_io(worker.start)
+                started.append(worker)
+                self.idle.put_nowait(worker)
+            except Exception as e:
+                print(f"Error starting office worker: {e}")
+        self.workers = started
+        if not started:
+            self.available = False
+
+    async def _restart(self, worker) -> bool:
+        """Restart a worker; False when it did not come back"""
+        try:
+            await run_io(worker.restart)
+            return True
+        except Exception as e:
+            print(f"Error restarting office worker: {e}")
+            return False
+
+    async def _retire(self, worker):
+        """Drop a worker that cannot be restarted; the pool is unavailable once none is left"""
+        self.workers.remove(worker)
+        print(f"Office worker removed from the pool, {len(self.workers)} left")
+        if not self.workers:
+            self.available = False
+            # Wake the conversions waiting for a worker: they fall back
+            self.idle.put_nowait(None)
+        # Stopping waits up to 10 s for the process to exit
+        await run_io(worker.stop)
+
+    async def _ensure_started(self) -> bool:
+        if self.available and self.idle is None:
+            if self._starting is None:
+                self._starting = asyncio.ensure_future(self._start())
+            await asyncio.shield(self._starting)
+        return self.available
+
+    async def convert(self, input_path: str, output_path: str, convert_to: str = 'pdf') -> bool:
+        """
+        Convert a document with a warm instance.
+        Returns False when the pool is unavailable or the conversion failed, so callers can fall back.
+        """
+        if not await self._ensure_started():
+            return False
+
+        worker = await self.idle.get()
+        if worker is None:
+            # The last worker was retired: pass the signal on to the next waiter
+            self.idle.put_nowait(None)
+            return False
+
+        usable = True
+        try:
+            if not worker.is_healthy():
+                print(f"Office worker on port {worker.port} is not responding, restarting")
+                usable = await self._restart(worker)
+                if not usable:
+                    return False
+            try:
+                await run_io(worker.convert, input_path, output_path, convert_to)
+            except Exception as e:
+                print(f"Office worker conversion failed: {e}")
+                usable = await self._restart(worker)
+                return False
+
+            converted = os.path.exists(output_path)
+            if worker.conversions >= OFFICE_MAX_CONVERSIONS:
+                # Recycling must not turn a finished conversion into a failure
+                usable = await self._restart(worker)
+            return converted
+        finally:
+            if usable:
+                self.idle.put_nowait(worker)
+            else:
+                await self._retire(worker)
+
+    def shutdown(self):
+        """Stop every instance, e.g. when the bot stops"""
+        for worker in self.workers:
+            worker.stop()
+
+# Global pool shared by the document conversions
+office_pool = OfficePool(OFFICE_POOL_SIZE, OFFICE_POOL_BASE_PORT)
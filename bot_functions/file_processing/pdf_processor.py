@@ -1,12 +1,13 @@
 import os
-import tempfile
-from PyPDF2 import PdfWriter, PdfReader
+from ..executor import run_cpu
 
-async def concatenate_two_pdfs(first_pdf_path: str, second_pdf_path: str, chat_id: int) -> str:
+# PyPDF2 is imported inside the worker functions, which run in the process pool
+
+def _concatenate_two_pdfs(first_pdf_path: str, second_pdf_path: str, output_dir: str) -> str:
     """Concatenate two PDF files"""
+    from PyPDF2 import PdfWriter, PdfReader
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"concatenated_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "concatenated.pdf")
 
         pdf_writer = PdfWriter()
 
@@ -47,11 +48,11 @@ async def concatenate_two_pdfs(first_pdf_path: str, second_pdf_path: str, chat_i
         print(f"Error concatenating PDFs: {e}")
         return None
 
-async def concatenate_multiple_pdfs(pdf_paths: list, chat_id: int) -> str:
+def _concatenate_multiple_pdfs(pdf_paths: list, output_dir: str) -> str:
     """Concatenate multiple PDF files"""
+    from PyPDF2 import PdfWriter, PdfReader
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"concatenated_multiple_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "concatenated_multiple.pdf")
 
         pdf_writer = PdfWriter()
 
@@ -86,11 +87,11 @@ async def concatenate_multiple_pdfs(pdf_paths: list, chat_id: int) -> str:
         print(f"Error concatenating multiple PDFs: {e}")
         return None
 
-async def delete_pdf_pages(pdf_path: str, pages_to_delete: list, chat_id: int) -> str:
+def _delete_pdf_pages(pdf_path: str, pages_to_delete: list, output_dir: str) -> str:
     """Delete specific pages from PDF"""
+    from PyPDF2 import PdfWriter, PdfReader
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pages_deleted_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "pages_deleted.pdf")
 
         pdf_writer = PdfWriter()
 
@@ -111,11 +112,11 @@ async def delete_pdf_pages(pdf_path: str, pages_to_delete: list, chat_id: int) -
         print(f"Error deleting PDF pages: {e}")
         return None
 
-async def extract_pdf_pages(pdf_path: str, pages_to_extract: list, chat_id: int) -> str:
+def _extract_pdf_pages(pdf_path: str, pages_to_extract: list, output_dir: str) -> str:
     """Extract specific pages from PDF"""
+    from PyPDF2 import PdfWriter, PdfReader
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pages_extracted_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "pages_extracted.pdf")
 
         pdf_writer = PdfWriter()
 
@@ -134,11 +135,11 @@ async def extract_pdf_pages(pdf_path: str, pages_to_extract: list, chat_id: int)
         print(f"Error extracting PDF pages: {e}")
         return None
 
-async def reorder_pdf_pages(pdf_path: str, page_order: list, chat_id: int) -> str:
+def _reorder_pdf_pages(pdf_path: str, page_order: list, output_dir: str) -> str:
     """Reorder pages in PDF according to specified order"""
+    from PyPDF2 import PdfWriter, PdfReader
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, f"pages_reordered_{chat_id}.pdf")
+        output_path = os.path.join(output_dir, "pages_reordered.pdf")
 
         pdf_writer = PdfWriter()
 
@@ -156,3 +157,32 @@ async def reorder_pdf_pages(pdf_path: str, page_order: list, chat_id: int) -> st
     except Exception as e:
         print(f"Error reordering PDF pages: {e}")
         return None
+
+def _get_pdf_page_count(pdf_path: str) -> int:
+    """Return the number of pages of a PDF (raises if the file is not a valid PDF)"""
+    from PyPDF2 import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+async def get_pdf_page_count(pdf_path: str) -> int:
+    """Validate a PDF and return its number of pages"""
+    return await run_cpu(_get_pdf_page_count, pdf_path)
+
+async def concatenate_two_pdfs(first_pdf_path: str, second_pdf_path: str, output_dir: str) -> str:
+    """Concatenate two PDF files"""
+    return await run_cpu(_concatenate_two_pdfs, first_pdf_path, second_pdf_path, output_dir)
+
+async def concatenate_multiple_pdfs(pdf_paths: list, output_dir: str) -> str:
+    """Concatenate multiple PDF files"""
+    return await run_cpu(_concatenate_multiple_pdfs, pdf_paths, output_dir)
+
+async def delete_pdf_pages(pdf_path: str, pages_to_delete: list, output_dir: str) -> str:
+    """Delete specific pages from PDF"""
+    return await run_cpu(_delete_pdf_pages, pdf_path, pages_to_delete, output_dir)
+
+async def extract_pdf_pages(pdf_path: str, pages_to_extract: list, output_dir: str) -> str:
+    """Extract specific pages from PDF"""
+    return await run_cpu(_extract_pdf_pages, pdf_path, pages_to_extract, output_dir)
+
+async def reorder_pdf_pages(pdf_path: str, page_order: list, output_dir: str) -> str:
+    """Reorder pages in PDF according to specified order"""
+    return await run_cpu(_reorder_pdf_pages, pdf_path, page_order, output_dir)
@@ -1,16 +1,15 @@
 import os
-import tempfile
+import asyncio
 import zipfile
 import shutil
-from PIL import Image
-import cairosvg
-from .pdf_processor import concatenate_multiple_pdfs
+from .pdf_processor import _concatenate_multiple_pdfs, concatenate_multiple_pdfs
+from ..executor import run_cpu, run_io, PROCESS_POOL_WORKERS
+from ..utils import filter_valid_files
 
-async def create_zip_from_files(file_paths: list, chat_id: int) -> str:
+def _create_zip_from_files(file_paths: list, output_dir: str) -> str:
     """Create a ZIP file from multiple files"""
     try:
-        temp_dir = tempfile.gettempdir()
-        zip_path = os.path.join(temp_dir, f"created_{chat_id}.zip")
+        zip_path = os.path.join(output_dir, "created.zip")
 
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
             for file_path in file_paths:
@@ -22,11 +21,10 @@ async def create_zip_from_files(file_paths: list, chat_id: int) -> str:
         print(f"Error creating ZIP: {e}")
         return None
 
-async def add_files_to_zip(zip_path: str, files_to_add: list, chat_id: int) -> str:
+def _add_files_to_zip(zip_path: str, files_to_add: list, output_dir: str) -> str:
     """Add files to an existing ZIP"""
     try:
-        temp_dir = tempfile.gettempdir()
-        new_zip_path = os.path.join(temp_dir, f"updated_{chat_id}.zip")
+        new_zip_path = os.path.join(output_dir, "updated.zip")
 
         with zipfile.ZipFile(zip_path, 'r') as original_zip:
             with zipfile.ZipFile(new_zip_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
@@ -45,11 +43,10 @@ async def add_files_to_zip(zip_path: str, files_to_add: list, chat_id: int) -> s
         print(f"Error adding files to ZIP: {e}")
         return None
 
-async def remove_files_from_zip(zip_path: str, files_to_remove: list, chat_id: int) -> str:
+def _remove_files_from_zip(zip_path: str, files_to_remove: list, output_dir: str) -> str:
     """Remove files from an existing ZIP"""
     try:
-        temp_dir = tempfile.gettempdir()
-        new_zip_path = os.path.join(temp_dir, f"filtered_{chat_id}.zip")
+        new_zip_path = os.path.join(output_dir, "filtered.zip")
 
         with zipfile.ZipFile(zip_path, 'r') as original_zip:
             with zipfile.ZipFile(new_zip_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
@@ -63,12 +60,11 @@ async def remove_files_from_zip(zip_path: str, files_to_remove: list, chat_id: i
         print(f"Error removing files from ZIP: {e}")
         return None
 
-async def perform_bulk_operation_with_order(zip_path: str, files: list, operation: int, chat_id: int, ordered_pdf_files: list) -> str:
+def _perform_bulk_operation_with_order(zip_path: str, files: list, operation: int, output_dir: str, ordered_pdf_files: list) -> str:
     """Perform bulk operations on files in ZIP with custom PDF order"""
     try:
-        temp_dir = tempfile.gettempdir()
-        extract_dir = os.path.join(temp_dir, f"bulk_extract_{chat_id}")
-        new_zip_path = os.path.join(temp_dir, f"bulk_processed_{chat_id}.zip")
+        extract_dir = os.path.join(output_dir, "bulk_extract")
+        new_zip_path = os.path.join(output_dir, "bulk_processed.zip")
 
         # Extract ZIP
         os.makedirs(extract_dir, exist_ok=True)
@@ -89,9 +85,9 @@ async def perform_bulk_operation_with_order(zip_path: str, files: list, operatio
                 # Concatenate PDFs in order
                 if len(processed_files) > 1:
                     try:
-                        concatenated_path = await concatenate_multiple_pdfs(processed_files, chat_id)
+                        concatenated_path = _concatenate_multiple_pdfs(processed_files, output_dir)
                         if concatenated_path:
-                            new_zip.write(concatenated_path, f"concatenated_pdfs_{chat_id}.pdf")
+                            new_zip.write(concatenated_path, "concatenated_pdfs.pdf")
                             os.remove(concatenated_path)
                         else:
                             # If concatenation fails, add individual PDFs in order
@@ -123,132 +119,199 @@ async def perform_bulk_operation_with_order(zip_path: str, files: list, operatio
         print(f"Error in bulk operation with order: {e}")
         return None
 
-async def perform_bulk_operation(zip_path: str, files: list, operation: int, chat_id: int) -> str:
-    """Perform bulk operations on files in ZIP"""
-    try:
-        temp_dir = tempfile.gettempdir()
-        extract_dir = os.path.join(temp_dir, f"bulk_extract_{chat_id}")
-        new_zip_path = os.path.join(temp_dir, f"bulk_processed_{chat_id}.zip")
+def _convert_bulk_image(file_path: str, filename: str, extract_dir: str, operation: int) -> str:
+    """
+    Convert one extracted image for a bulk operation (1: to PNG, 2: to JPEG).
+    Returns the new filename inside the ZIP, or None if the file is kept as is.
+    """
+    from PIL import Image
+    import cairosvg
+    file_ext = filename.lower().split('.')[-1]
+
+    if operation == 1:
+        # Convert all images to PNG (JPEG and SVG)
+        if file_ext in ['jpg', 'jpeg']:
+            # JPEG to PNG
+            try:
+                with Image.open(file_path) as img:
+                    if img.mode in ('RGBA', 'LA'):
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                        img = background
+                    new_filename = filename.rsplit('.', 1)[0] + '.png'
+                    img.save(os.path.join(extract_dir, new_filename), 'PNG')
+                    return new_filename
+            except Exception:
+                pass
+
+        elif file_ext == 'svg':
+            # SVG to PNG
+            try:
+                new_filename = filename.rsplit('.', 1)[0] + '.png'
+                cairosvg.svg2png(url=file_path, write_to=os.path.join(extract_dir, new_filename), dpi=300)
+                return new_filename
+            except Exception:
+                pass
+
+    elif operation == 2:
+        # Convert all images to JPEG (PNG and SVG)
+        if file_ext == 'png':
+            # PNG to JPEG
+            try:
+                with Image.open(file_path) as img:
+                    if img.mode in ('RGBA', 'LA'):
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                        img = background
+                    elif img.mode == 'P':
+                        img = img.convert('RGB')
+                    new_filename = filename.rsplit('.', 1)[0] + '.jpg'
+                    img.save(os.path.join(extract_dir, new_filename), 'JPEG', quality=95)
+                    return new_filename
+            except Exception:
+                pass
+
+        elif file_ext == 'svg':
+            # SVG to JPEG
+            try:
+                png_path = os.path.join(extract_dir, f"temp_{filename}.png")
+                new_filename = filename.rsplit('.', 1)[0] + '.jpg'
+
+                cairosvg.svg2png(url=file_path, write_to=png_path, dpi=300)
+                with Image.open(png_path) as img:
+                    if img.mode in ('RGBA', 'LA'):
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                        img = background
+                    img.save(os.path.join(extract_dir, new_filename), 'JPEG', quality=95)
+
+                os.remove(png_path)
+                return new_filename
+            except Exception:
+                pass
+
+    return None
+
+def _write_zip(zip_path: str, entries: list) -> str:
+    """Write (file_path, name_in_zip) entries into a new ZIP"""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
+        for file_path, arcname in entries:
+            new_zip.write(file_path, arcname)
+    return zip_path
+
+def _list_zip_entries(zip_path: str) -> list:
+    """Return (filename, size_in_bytes) for every valid file inside a ZIP"""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        valid_files = filter_valid_files(zip_ref.namelist())
+        return [(file_name, zip_ref.getinfo(file_name).file_size) for file_name in valid_files]
+
+def _extract_zip(zip_path: str, extract_dir: str) -> str:
+    """Extract a ZIP into the given directory"""
+    os.makedirs(extract_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(extract_dir)
+    return extract_dir
+
+async def list_zip_entries(zip_path: str) -> list:
+    """List the valid files inside a ZIP with their uncompressed sizes"""
+    return await run_io(_list_zip_entries, zip_path)
+
+async def list_zip_files(zip_path: str) -> list:
+    """List the valid file names inside a ZIP"""
+    return [file_name for file_name, _ in await list_zip_entries(zip_path)]
+
+async def extract_zip(zip_path: str, extract_dir: str) -> str:
+    """Extract a ZIP into the given directory"""
+    return await run_cpu(_extract_zip, zip_path, extract_dir)
+
+async def create_zip_from_files(file_paths: list, output_dir: str) -> str:
+    """Create a ZIP file from multiple files"""
+    return await run_cpu(_create_zip_from_files, file_paths, output_dir)
 
-        # Extract ZIP
-        os.makedirs(extract_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+async def add_files_to_zip(zip_path: str, files_to_add: list, output_dir: str) -> str:
+    """Add files to an existing ZIP"""
+    return await run_cpu(_add_files_to_zip, zip_path, files_to_add, output_dir)
 
-        # Process files based on operation
-        processed_files = []
+async def remove_files_from_zip(zip_path: str, files_to_remove: list, output_dir: str) -> str:
+    """Remove files from an existing ZIP"""
+    return await run_cpu(_remove_files_from_zip, zip_path, files_to_remove, output_dir)
 
-        with zipfile.ZipFile(new_zip_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
-            for filename in files:
-                # Skip macOS metadata files
-                if filename.startswith('__MACOSX/') or filename.startswith('._') or '/__MACOSX/' in filename or '/._' in filename:
-                    continue
-
-                file_path = os.path.join(extract_dir, filename)
-
-                if not os.path.exists(file_path):
-                    continue
-
-                processed = False
-
-                if operation == 1:
-                    # Convert all images to PNG (JPEG and SVG)
-                    file_ext = filename.lower().split('.')[-1]
-
-                    if file_ext in ['jpg', 'jpeg']:
-                        # JPEG to PNG
-                        try:
-                            with Image.open(file_path) as img:
-                                if img.mode in ('RGBA', 'LA'):
-                                    background = Image.new('RGB', img.size, (255, 255, 255))
-                                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                                    img = background
-                                new_filename = filename.rsplit('.', 1)[0] + '.png'
-                                new_file_path = os.path.join(extract_dir, new_filename)
-                                img.save(new_file_path, 'PNG')
-                                new_zip.write(new_file_path, new_filename)
-                                processed = True
-                        except Exception:
-                            pass
-
-                    elif file_ext == 'svg':
-                        # SVG to PNG
-                        try:
-                            new_filename = filename.rsplit('.', 1)[0] + '.png'
-                            new_file_path = os.path.join(extract_dir, new_filename)
-                            cairosvg.svg2png(url=file_path, write_to=new_file_path, dpi=300)
-                            new_zip.write(new_file_path, new_filename)
-                            processed = True
-                        except Exception:
-                            pass
-
-                elif operation == 2:
-                    # Convert all images to JPEG (PNG and SVG)
-                    file_ext = filename.lower().split('.')[-1]
-
-                    if file_ext == 'png':
-                        # PNG to JPEG
-                        try:
-                            with Image.open(file_path) as img:
-                                if img.mode in ('RGBA', 'LA'):
-                                    background = Image.new('RGB', img.size, (255, 255, 255))
-                                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                                    img = background
-                                elif img.mode == 'P':
-                                    img = img.convert('RGB')
-                                new_filename = filename.rsplit('.', 1)[0] + '.jpg'
-                                new_file_path = os.path.join(extract_dir, new_filename)
-                                img.save(new_file_path, 'JPEG', quality=95)
-                                new_zip.write(new_file_path, new_filename)
-                                processed = True
-                        except Exception:
-                            pass
-
-                    elif file_ext == 'svg':
-                        # SVG to JPEG
-                        try:
-                            png_path = os.path.join(extract_dir, f"temp_{filename}.png")
-                            new_filename = filename.rsplit('.', 1)[0] + '.jpg'
-                            new_file_path = os.path.join(extract_dir, new_filename)
-
-                            cairosvg.svg2png(url=file_path, write_to=png_path, dpi=300)
-                            with Image.open(png_path) as img:
-                                if img.mode in ('RGBA', 'LA'):
-                                    background = Image.new('RGB', img.size, (255, 255, 255))
-                                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                                    img = background
-                                img.save(new_file_path, 'JPEG', quality=95)
-
-                            new_zip.write(new_file_path, new_filename)
-                            os.remove(png_path)
-                            processed = True
-                        except Exception:
-                            pass
-
-                elif operation == 3 and filename.lower().endswith('.pdf'):
-                    # Collect PDFs for concatenation (renumbered from 5 to 3)
-                    processed_files.append(file_path)
-                    continue
-
-                # If not processed, keep original file
-                if not processed:
-                    new_zip.write(file_path, filename)
+async def perform_bulk_operation_with_order(zip_path: str, files: list, operation: int, output_dir: str, ordered_pdf_files: list) -> str:
+    """Perform bulk operations on files in ZIP with custom PDF order"""
+    return await run_cpu(_perform_bulk_operation_with_order, zip_path, files, operation, output_dir, ordered_pdf_files)
+
+async def perform_bulk_operation(zip_path: str, files: list, operation: int, output_dir: str, progress=None) -> str:
+    """
+    Perform bulk operations on files in ZIP.
+    Entries are converted in parallel, at most one per process pool worker, and
+    progress(done, total) is awaited as each one finishes. The ZIP keeps the original order.
+    """
+    try:
+        extract_dir = os.path.join(output_dir, "bulk_extract")
+        new_zip_path = os.path.join(output_dir, "bulk_processed.zip")
 
-            # Handle PDF concatenation if operation 3
-            if operation == 3 and len(processed_files) > 1:
-                try:
-                    concatenated_path = await concatenate_multiple_pdfs(processed_files, chat_id)
-                    if concatenated_path:
-                        new_zip.write(concatenated_path, f"concatenated_pdfs_{chat_id}.pdf")
-                        os.remove(concatenated_path)
-                except Exception:
-                    # If concatenation fails, add individual PDFs
-                    for pdf_path in processed_files:
-                        filename = os.path.basename(pdf_path)
-                        new_zip.write(pdf_path, filename)
+        # Extract ZIP
+        await extract_zip(zip_path, extract_dir)
+
+        # Skip macOS metadata files and entries that were not extracted
+        valid_files = [
+            filename for filename in filter_valid_files(files)
+            if os.path.exists(os.path.join(extract_dir, filename))
+        ]
+
+        # One bulk job must not take every worker of the shared pool for its whole length
+        semaphore = asyncio.Semaphore(PROCESS_POOL_WORKERS)
+
+        async def process(filename: str) -> tuple:
+            """(filename, (path, name in the ZIP)), or (filename, None) for a PDF to concatenate"""
+            file_path = os.path.join(extract_dir, filename)
+            if operation == 3 and filename.lower().endswith('.pdf'):
+                # Collect PDFs for concatenation (renumbered from 5 to 3)
+                return filename, None
+
+            new_filename = None
+            if operation in (1, 2):
+                async with semaphore:
+                    new_filename = await run_cpu(_convert_bulk_image, file_path, filename, extract_dir, operation)
+
+            # If not processed, keep original file
+            if new_filename:
+                return filename, (os.path.join(extract_dir, new_filename), new_filename)
+            return filename, (file_path, filename)
+
+        results = {}
+        tasks = [asyncio.ensure_future(process(filename)) for filename in valid_files]
+        try:
+            for index, finished in enumerate(asyncio.as_completed(tasks), 1):
+                filename, entry = await finished
+                results[filename] = entry
+                if progress:
+                    await progress(index, len(valid_files))
+        finally:
+            # A failed entry or a cancelled job stops the conversions still waiting
+            for task in tasks:
+                task.cancel()
+
+        zip_entries = [results[filename] for filename in valid_files if results[filename]]
+        processed_files = [os.path.join(extract_dir, filename) for filename in valid_files if results[filename] is None]
+
+        # Handle PDF concatenation if operation 3
+        concatenated_path = None
+        if len(processed_files) > 1:
+            concatenated_path = await concatenate_multiple_pdfs(processed_files, output_dir)
+        if concatenated_path:
+            zip_entries.append((concatenated_path, "concatenated_pdfs.pdf"))
+        else:
+            # A single PDF or a failed concatenation: keep the individual PDFs
+            for pdf_path in processed_files:
+                zip_entries.append((pdf_path, os.path.relpath(pdf_path, extract_dir)))
+
+        await run_cpu(_write_zip, new_zip_path, zip_entries)
 
         # Clean up extraction directory
-        shutil.rmtree(extract_dir)
+        if concatenated_path:
+            os.remove(concatenated_path)
+        await run_io(shutil.rmtree, extract_dir)
 
         return new_zip_path
     except Exception as e:
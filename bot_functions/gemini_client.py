@@ -1,32 +1,163 @@
 import os
-from google import genai
+import time
+import random
+import asyncio
+import importlib
 from dotenv import load_dotenv
+from .metrics import increment
+from .executor import run_io
+from .circuit_breaker import get_breaker
 
-# Configure the Gemini API client
-try:
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
-except KeyError:
-    # Handle the case where the API key is not set
-    client = None
-
-async def generate_text(prompt: str, system_prompt: str = None) -> str:
-    """Generate text using the Gemini model"""
-    if not client:
-        return "El servicio de Gemini no está configurado. Por favor, contacta al administrador del bot."
-    try:
-        # If system_prompt is provided, combine it with the user prompt
-        if system_prompt:
-            full_prompt = f"{system_prompt}\n\nUsuario: {prompt}"
-        else:
-            full_prompt = prompt
-
-        response = client.models.generate_content(
-            model="gemma-3-27b-it",
-            contents=full_prompt
+load_dotenv()
+
+# Default model; the intent router may try cheaper ones first
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemma-3-27b-it")
+# Alternative API endpoint, e.g. a proxy or a local fake server for load tests
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+# Time allowed for one request, and attempts per call when it fails or times out
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 20))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", 3))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", 0.5))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", 8))
+# Requests in flight at once; also the size of the HTTP connection pool
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", 16))
+
+# HTTP statuses worth another attempt: rate limits and server-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# The Gemini client is created on first use: importing the SDK takes a noticeable
+# part of the startup time and many sessions never reach the LLM
+_client = None
+_http_client = None
+_semaphore = None
+
+def get_client():
+    """Get the shared Gemini client, or None when GEMINI_API_KEY is not set"""
+    global _client, _http_client
+    if _client is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return None
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        # One keep-alive connection pool shared by every call instead of a TLS handshake per request.
+        # The transport timeout is only a backstop: the deadline of a call is the wait_for in
+        # _generate_content, so a slow request always ends with the same (retryable) TimeoutError
+        transport_timeout = GEMINI_TIMEOUT_SECONDS + 5
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=GEMINI_MAX_CONCURRENT, max_keepalive_connections=GEMINI_MAX_CONCURRENT),
+            timeout=transport_timeout
         )
-        return response.text
+        http_options = types.HttpOptions(
+            base_url=GEMINI_BASE_URL,
+            timeout=int(transport_timeout * 1000),
+            httpx_async_client=_http_client
+        )
+        _client = genai.Client(api_key=api_key, http_options=http_options)
+    return _client
+
+async def warm_up_client():
+    """Import the SDK in a worker thread so the first request does not stall the event loop"""
+    if os.getenv("GEMINI_API_KEY"):
+        try:
+            await run_io(importlib.import_module, 'google.genai')
+        except Exception as e:
+            print(f"Error importing the Gemini SDK: {e}")
+
+async def close_client():
+    """Close the HTTP connections of the Gemini client"""
+    global _client, _http_client
+    if _client is None:
+        return
+    try:
+        await _client.aio.aclose()
+        # The SDK leaves a caller-supplied HTTP client open
+        await _http_client.aclose()
+    except Exception as e:
+        print(f"Error closing the Gemini client: {e}")
+    _client = None
+    _http_client = None
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    # Connection resets, DNS failures and other transport errors
+    import httpx
+    return isinstance(error, httpx.TransportError)
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retries of many users do not arrive together"""
+    return random.uniform(0, min(GEMINI_RETRY_MAX_DELAY, GEMINI_RETRY_BASE_DELAY * 2 ** attempt))
+
+async def _generate_content(client, contents: str, model: str, max_output_tokens: int = None) -> str:
+    """Call the model with a timeout, retrying transient failures"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENT)
+
+    config = None
+    if max_output_tokens:
+        from google.genai import types
+        config = types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+
+    for attempt in range(GEMINI_MAX_ATTEMPTS):
+        try:
+            async with _semaphore:
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(model=model, contents=contents, config=config),
+                    GEMINI_TIMEOUT_SECONDS
+                )
+            increment('gemini.requests')
+            return response.text
+        except Exception as e:
+            increment('gemini.errors')
+            if attempt + 1 >= GEMINI_MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            increment('gemini.retries')
+            delay = _retry_delay(attempt)
+            print(f"Gemini request failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+class LLMUnavailableError(Exception):
+    """The model cannot be called right now: no API key, or its circuit breaker is open"""
+
+def model_available(model: str = None) -> bool:
+    """Whether a call to model would be attempted right now"""
+    try:
+        client = get_client()
+    except Exception:
+        return False
+    return client is not None and get_breaker(f"gemini.{model or GEMINI_MODEL}").available()
+
+async def complete(prompt: str, model: str = None, max_output_tokens: int = None) -> str:
+    """
+    Generate text with a model, raising instead of answering with an apology: LLMUnavailableError
+    when it cannot be called, or the error of the last attempt. Every call feeds the model's
+    circuit breaker, so a failing or slow model is skipped until it recovers.
+    """
+    try:
+        client = get_client()
     except Exception as e:
-        print(f"Error generating text with Gemini: {e}")
-        return "Lo siento, ha ocurrido un error al procesar tu solicitud con Gemini."
+        raise LLMUnavailableError(f"Error creating the Gemini client: {e}")
+    if not client:
+        raise LLMUnavailableError("GEMINI_API_KEY is not set")
+
+    model = model or GEMINI_MODEL
+    breaker = get_breaker(f"gemini.{model}")
+    if not breaker.allow():
+        raise LLMUnavailableError(f"Circuit breaker of {model} is {breaker.state}")
+
+    started = time.perf_counter()
+    ok = False
+    try:
+        text = await _generate_content(client, prompt, model, max_output_tokens)
+        ok = True
+        return text
+    finally:
+        breaker.record(ok, time.perf_counter() - started)
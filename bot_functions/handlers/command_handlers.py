@@ -2,6 +2,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from ..state_manager import set_user_state, IDLE, AWAITING_OPTION, clear_conversation_history
 from ..utils import get_exit_info_message
+from ..metrics import ADMIN_CHAT_IDS, format_metrics
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - welcome user and set state to IDLE"""
@@ -107,4 +108,8 @@ async def manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"20. Presentación PowerPoint (PPTX/PPT) → PDF\n\n{exit_info}"
     )
 
-
+async def metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /metrics command - show runtime counters to the chats in ADMIN_CHAT_IDS"""
+    if update.message.chat_id not in ADMIN_CHAT_IDS:
+        return
+    await update.message.reply_text(format_metrics())
@@ -1,12 +1,17 @@
 from telegram import Update
 from ..state_manager import set_user_state, IDLE
-from ..utils import validate_file, send_processing_and_ad_message
+from ..utils import validate_file, processing_job, download_small_document
+from ..scheduler import JOB_COSTS
+from ..result_cache import cache_key, cache_result, send_cached_result
+from ..workspace import job_workspace, download_document
 from ..file_processing.document_processor import (
     convert_docx_to_pdf, convert_pdf_to_docx,
     convert_csv_to_excel, convert_excel_to_csv,
-    convert_pptx_to_pdf
+    convert_csv_bytes_to_excel, convert_excel_bytes_to_csv,
+    convert_pptx_to_pdf, is_libreoffice_available, is_fallback_output
 )
 import os
+from io import BytesIO
 
 async def handle_docx_to_pdf(update: Update, chat_id: int):
     """Handle DOCX to PDF conversion"""
@@ -18,57 +23,56 @@ async def handle_docx_to_pdf(update: Update, chat_id: int):
 
     try:
         document = update.message.document
-        file = await update.get_bot().get_file(document.file_id)
 
-        # Download file
-        temp_input_path = f"temp_docx_{chat_id}.docx"
-        await file.download_to_drive(temp_input_path)
-
-        # Send processing message
-        await send_processing_and_ad_message(
-            update,
-            "🔄 Convirtiendo documento Word a PDF con preservación de formato...",
-            2.0
-        )
-
-        # Convert DOCX to PDF
-        output_path = await convert_docx_to_pdf(temp_input_path, chat_id)
-
-        if output_path and os.path.exists(output_path):
-            # Determine which method was used for appropriate caption
-            caption = "✅ **Conversión completada**\n\n"
-
-            # Check if docx2pdf is available to determine the method used
-            try:
-                from docx2pdf import convert
-                caption += ("📄 Documento Word convertido a PDF con **formato preservado** usando docx2pdf.\n\n"
-                           "✨ Esta conversión mantiene el formato original, incluyendo fuentes, estilos e imágenes.")
-            except ImportError:
-                caption += ("📄 Documento Word convertido a PDF usando método alternativo.\n\n"
-                           "⚠️ **Nota**: Para una mejor preservación del formato, "
-                           "instala la biblioteca docx2pdf: `pip install docx2pdf`")
-
-            # Send the converted file
-            with open(output_path, 'rb') as pdf_file:
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"{document.file_name.rsplit('.', 1)[0]}.pdf",
-                    caption=caption
+        # Same file converted before: answer from the result cache
+        result_key = cache_key(document.file_unique_id, 'docx_to_pdf')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            return
+        async with job_workspace() as workspace:
+            # Download file
+            input_path = await download_document(update, workspace)
+
+            # Send processing message and convert DOCX to PDF
+            async with processing_job(
+                update,
+                "🔄 Convirtiendo documento Word a PDF con preservación de formato...",
+                JOB_COSTS['document']
+            ):
+                output_path = await convert_docx_to_pdf(input_path, workspace)
+
+            if output_path and os.path.exists(output_path):
+                # Determine which method was used for appropriate caption
+                caption = "✅ **Conversión completada**\n\n"
+
+                # Check if docx2pdf is available to determine the method used
+                try:
+                    from docx2pdf import convert
+                    caption += ("📄 Documento Word convertido a PDF con **formato preservado** usando docx2pdf.\n\n"
+                               "✨ Esta conversión mantiene el formato original, incluyendo fuentes, estilos e imágenes.")
+                except ImportError:
+                    caption += ("📄 Documento Word convertido a PDF usando método alternativo.\n\n"
+                               "⚠️ **Nota**: Para una mejor preservación del formato, "
+                               "instala la biblioteca docx2pdf: `pip install docx2pdf`")
+
+                # Send the converted file
+                result_filename = f"{document.file_name.rsplit('.', 1)[0]}.pdf"
+                with open(output_path, 'rb') as pdf_file:
+                    sent = await update.message.reply_document(
+                        document=pdf_file,
+                        filename=result_filename,
+                        caption=caption
+                    )
+                # A degraded fallback output must not be served again once the real converter works
+                if not is_fallback_output(output_path):
+                    await cache_result(result_key, output_path, result_filename, caption, sent)
+            else:
+                await update.message.reply_text(
+                    "❌ **Error en la conversión**\n\n"
+                    "No se pudo convertir el documento Word a PDF. "
+                    "Asegúrate de que el archivo no esté corrupto."
                 )
 
-            # Clean up
-            os.remove(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error en la conversión**\n\n"
-                "No se pudo convertir el documento Word a PDF. "
-                "Asegúrate de que el archivo no esté corrupto."
-            )
-
-        # Clean up input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-
     except Exception as e:
         await update.message.reply_text(
             f"❌ **Error inesperado**\n\n"
@@ -88,59 +92,58 @@ async def handle_pdf_to_docx(update: Update, chat_id: int):
 
     try:
         document = update.message.document
-        file = await update.get_bot().get_file(document.file_id)
 
-        # Download file
-        temp_input_path = f"temp_pdf_{chat_id}.pdf"
-        await file.download_to_drive(temp_input_path)
-
-        # Send processing message
-        await send_processing_and_ad_message(
-            update,
-            "🔄 Convirtiendo PDF a documento Word con preservación de formato...",
-            2.0
-        )
-
-        # Convert PDF to DOCX
-        output_path = await convert_pdf_to_docx(temp_input_path, chat_id)
-
-        if output_path and os.path.exists(output_path):
-            # Determine appropriate caption based on conversion method
-            caption = "✅ **Conversión completada**\n\n"
-
-            # Check if pdf2docx is available to determine the method used
-            try:
-                from pdf2docx import Converter
-                caption += ("📄 PDF convertido a documento Word con **formato preservado** usando pdf2docx.\n\n"
-                           "✨ Esta conversión mantiene el formato original, incluyendo texto, tablas, imágenes y estilos. "
-                           "La calidad de la conversión depende de la complejidad del PDF original.")
-            except ImportError:
-                caption += ("📄 PDF convertido a documento Word usando extracción de texto mejorada.\n\n"
-                           "⚠️ **Nota**: Para una mejor preservación del formato con tablas e imágenes, "
-                           "instala la biblioteca pdf2docx: `pip install pdf2docx`\n\n"
-                           "⚠️ **Limitación actual**: Esta conversión extrae solo el texto del PDF.")
-
-            # Send the converted file
-            with open(output_path, 'rb') as docx_file:
-                await update.message.reply_document(
-                    document=docx_file,
-                    filename=f"{document.file_name.rsplit('.', 1)[0]}.docx",
-                    caption=caption
+        # Same file converted before: answer from the result cache
+        result_key = cache_key(document.file_unique_id, 'pdf_to_docx')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            return
+        async with job_workspace() as workspace:
+            # Download file
+            input_path = await download_document(update, workspace)
+
+            # Send processing message and convert PDF to DOCX
+            async with processing_job(
+                update,
+                "🔄 Convirtiendo PDF a documento Word con preservación de formato...",
+                JOB_COSTS['document']
+            ):
+                output_path = await convert_pdf_to_docx(input_path, workspace)
+
+            if output_path and os.path.exists(output_path):
+                # Determine appropriate caption based on conversion method
+                caption = "✅ **Conversión completada**\n\n"
+
+                # Check if pdf2docx is available to determine the method used
+                try:
+                    from pdf2docx import Converter
+                    caption += ("📄 PDF convertido a documento Word con **formato preservado** usando pdf2docx.\n\n"
+                               "✨ Esta conversión mantiene el formato original, incluyendo texto, tablas, imágenes y estilos. "
+                               "La calidad de la conversión depende de la complejidad del PDF original.")
+                except ImportError:
+                    caption += ("📄 PDF convertido a documento Word usando extracción de texto mejorada.\n\n"
+                               "⚠️ **Nota**: Para una mejor preservación del formato con tablas e imágenes, "
+                               "instala la biblioteca pdf2docx: `pip install pdf2docx`\n\n"
+                               "⚠️ **Limitación actual**: Esta conversión extrae solo el texto del PDF.")
+
+                # Send the converted file
+                result_filename = f"{document.file_name.rsplit('.', 1)[0]}.docx"
+                with open(output_path, 'rb') as docx_file:
+                    sent = await update.message.reply_document(
+                        document=docx_file,
+                        filename=result_filename,
+                        caption=caption
+                    )
+                # A degraded fallback output must not be served again once the real converter works
+                if not is_fallback_output(output_path):
+                    await cache_result(result_key, output_path, result_filename, caption, sent)
+            else:
+                await update.message.reply_text(
+                    "❌ **Error en la conversión**\n\n"
+                    "No se pudo convertir el PDF a documento Word. "
+                    "Asegúrate de que el PDF contenga texto extraíble."
                 )
 
-            # Clean up
-            os.remove(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error en la conversión**\n\n"
-                "No se pudo convertir el PDF a documento Word. "
-                "Asegúrate de que el PDF contenga texto extraíble."
-            )
-
-        # Clean up input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-
     except Exception as e:
         await update.message.reply_text(
             f"❌ **Error inesperado**\n\n"
@@ -160,44 +163,51 @@ async def handle_csv_to_excel(update: Update, chat_id: int):
 
     try:
         document = update.message.document
-        file = await update.get_bot().get_file(document.file_id)
-
-        # Download file
-        temp_input_path = f"temp_csv_{chat_id}.csv"
-        await file.download_to_drive(temp_input_path)
-
-        # Send processing message
-        await send_processing_and_ad_message(
-            update,
-            "🔄 Convirtiendo CSV a Excel...",
-            1.5
-        )
-
-        # Convert CSV to Excel
-        output_path = await convert_csv_to_excel(temp_input_path, chat_id)
 
-        if output_path and os.path.exists(output_path):
-            # Send the converted file
-            with open(output_path, 'rb') as excel_file:
-                await update.message.reply_document(
-                    document=excel_file,
-                    filename=f"{document.file_name.rsplit('.', 1)[0]}.xlsx",
-                    caption="✅ **Conversión completada**\n\nArchivo CSV convertido a Excel."
+        # Same file converted before: answer from the result cache
+        result_key = cache_key(document.file_unique_id, 'csv_to_excel')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            return
+
+        # Small files are converted in memory, without temp files
+        data = await download_small_document(update)
+        async with job_workspace() as workspace:
+            if data is None:
+                # Download file
+                input_path = await download_document(update, workspace)
+
+            # Send processing message and convert CSV to Excel
+            async with processing_job(
+                update,
+                "🔄 Convirtiendo CSV a Excel...",
+                JOB_COSTS['spreadsheet']
+            ):
+                if data is not None:
+                    output_data = await convert_csv_bytes_to_excel(data)
+                    output_path = None
+                else:
+                    output_data = None
+                    output_path = await convert_csv_to_excel(input_path, workspace)
+
+            if output_data or (output_path and os.path.exists(output_path)):
+                # Send the converted file
+                result_filename = f"{document.file_name.rsplit('.', 1)[0]}.xlsx"
+                caption = "✅ **Conversión completada**\n\nArchivo CSV convertido a Excel."
+                with (BytesIO(output_data) if output_data else open(output_path, 'rb')) as excel_file:
+                    sent = await update.message.reply_document(
+                        document=excel_file,
+                        filename=result_filename,
+                        caption=caption
+                    )
+                await cache_result(result_key, output_data or output_path, result_filename, caption, sent)
+            else:
+                await update.message.reply_text(
+                    "❌ **Error en la conversión**\n\n"
+                    "No se pudo convertir el archivo CSV a Excel. "
+                    "Verifica que el archivo CSV tenga el formato correcto."
                 )
 
-            # Clean up
-            os.remove(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error en la conversión**\n\n"
-                "No se pudo convertir el archivo CSV a Excel. "
-                "Verifica que el archivo CSV tenga el formato correcto."
-            )
-
-        # Clean up input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-
     except Exception as e:
         await update.message.reply_text(
             f"❌ **Error inesperado**\n\n"
@@ -217,45 +227,52 @@ async def handle_excel_to_csv(update: Update, chat_id: int):
 
     try:
         document = update.message.document
-        file = await update.get_bot().get_file(document.file_id)
-
-        # Download file
-        temp_input_path = f"temp_excel_{chat_id}.{document.file_name.split('.')[-1]}"
-        await file.download_to_drive(temp_input_path)
 
-        # Send processing message
-        await send_processing_and_ad_message(
-            update,
-            "🔄 Convirtiendo Excel a CSV...",
-            1.5
-        )
-
-        # Convert Excel to CSV
-        output_path = await convert_excel_to_csv(temp_input_path, chat_id)
-
-        if output_path and os.path.exists(output_path):
-            # Send the converted file
-            with open(output_path, 'rb') as csv_file:
-                await update.message.reply_document(
-                    document=csv_file,
-                    filename=f"{document.file_name.rsplit('.', 1)[0]}.csv",
-                    caption="✅ **Conversión completada**\n\nArchivo Excel convertido a CSV.\n\n"
-                           "⚠️ **Nota:** Solo se convierte la primera hoja del archivo Excel."
+        # Same file converted before: answer from the result cache
+        result_key = cache_key(document.file_unique_id, 'excel_to_csv')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            return
+
+        # Small files are converted in memory, without temp files
+        data = await download_small_document(update)
+        async with job_workspace() as workspace:
+            if data is None:
+                # Download file
+                input_path = await download_document(update, workspace)
+
+            # Send processing message and convert Excel to CSV
+            async with processing_job(
+                update,
+                "🔄 Convirtiendo Excel a CSV...",
+                JOB_COSTS['spreadsheet']
+            ):
+                if data is not None:
+                    output_data = await convert_excel_bytes_to_csv(data)
+                    output_path = None
+                else:
+                    output_data = None
+                    output_path = await convert_excel_to_csv(input_path, workspace)
+
+            if output_data or (output_path and os.path.exists(output_path)):
+                # Send the converted file
+                result_filename = f"{document.file_name.rsplit('.', 1)[0]}.csv"
+                caption = ("✅ **Conversión completada**\n\nArchivo Excel convertido a CSV.\n\n"
+                           "⚠️ **Nota:** Solo se convierte la primera hoja del archivo Excel.")
+                with (BytesIO(output_data) if output_data else open(output_path, 'rb')) as csv_file:
+                    sent = await update.message.reply_document(
+                        document=csv_file,
+                        filename=result_filename,
+                        caption=caption
+                    )
+                await cache_result(result_key, output_data or output_path, result_filename, caption, sent)
+            else:
+                await update.message.reply_text(
+                    "❌ **Error en la conversión**\n\n"
+                    "No se pudo convertir el archivo Excel a CSV. "
+                    "Verifica que el archivo Excel no esté corrupto."
                 )
 
-            # Clean up
-            os.remove(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error en la conversión**\n\n"
-                "No se pudo convertir el archivo Excel a CSV. "
-                "Verifica que el archivo Excel no esté corrupto."
-            )
-
-        # Clean up input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
-
     except Exception as e:
         await update.message.reply_text(
             f"❌ **Error inesperado**\n\n"
@@ -275,72 +292,61 @@ async def handle_pptx_to_pdf(update: Update, chat_id: int):
 
     try:
         document = update.message.document
-        file = await update.get_bot().get_file(document.file_id)
-
-        # Download file
-        temp_input_path = f"temp_pptx_{chat_id}.{document.file_name.split('.')[-1]}"
-        await file.download_to_drive(temp_input_path)
-
-        # Send processing message
-        await send_processing_and_ad_message(
-            update,
-            "🔄 Convirtiendo presentación PowerPoint a PDF con preservación de formato...",
-            3.0
-        )
 
-        # Convert PPTX to PDF
-        output_path = await convert_pptx_to_pdf(temp_input_path, chat_id)
-
-        if output_path and os.path.exists(output_path):
-            # Determine appropriate caption based on conversion method
-            caption = "✅ **Conversión completada**\n\n"
-
-            # Check if LibreOffice is available
-            import subprocess
-            libreoffice_available = False
-            try:
-                # Try both common LibreOffice command names
-                for cmd in ['libreoffice', 'soffice']:
-                    try:
-                        result = subprocess.run([cmd, '--version'], capture_output=True, text=True, timeout=5)
-                        if result.returncode == 0:
-                            libreoffice_available = True
-                            break
-                    except FileNotFoundError:
-                        continue
-
-                if libreoffice_available:
-                    caption += ("📄 Presentación PowerPoint convertida a PDF con **formato preservado** usando LibreOffice CLI.\n\n"
-                               "✨ Esta conversión mantiene el diseño original, incluyendo slides, imágenes y formato.")
-                else:
+        # Same file converted before: answer from the result cache
+        result_key = cache_key(document.file_unique_id, 'pptx_to_pdf')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            return
+        async with job_workspace() as workspace:
+            # Download file
+            input_path = await download_document(update, workspace)
+
+            # Send processing message and convert PPTX to PDF
+            async with processing_job(
+                update,
+                "🔄 Convirtiendo presentación PowerPoint a PDF con preservación de formato...",
+                JOB_COSTS['document']
+            ):
+                output_path = await convert_pptx_to_pdf(input_path, workspace)
+
+            if output_path and os.path.exists(output_path):
+                # Determine appropriate caption based on conversion method
+                caption = "✅ **Conversión completada**\n\n"
+
+                # Check if LibreOffice is available
+                try:
+                    libreoffice_available = await is_libreoffice_available()
+
+                    if libreoffice_available:
+                        caption += ("📄 Presentación PowerPoint convertida a PDF con **formato preservado** usando LibreOffice CLI.\n\n"
+                                   "✨ Esta conversión mantiene el diseño original, incluyendo slides, imágenes y formato.")
+                    else:
+                        caption += ("📄 Presentación PowerPoint convertida a PDF usando método alternativo.\n\n"
+                                   "⚠️ **Nota**: Para una mejor preservación del formato, "
+                                   "instala LibreOffice: `apt-get install libreoffice` o `brew install --cask libreoffice`")
+                except Exception:
                     caption += ("📄 Presentación PowerPoint convertida a PDF usando método alternativo.\n\n"
                                "⚠️ **Nota**: Para una mejor preservación del formato, "
                                "instala LibreOffice: `apt-get install libreoffice` o `brew install --cask libreoffice`")
-            except (subprocess.TimeoutExpired, Exception):
-                caption += ("📄 Presentación PowerPoint convertida a PDF usando método alternativo.\n\n"
-                           "⚠️ **Nota**: Para una mejor preservación del formato, "
-                           "instala LibreOffice: `apt-get install libreoffice` o `brew install --cask libreoffice`")
-
-            # Send the converted file
-            with open(output_path, 'rb') as pdf_file:
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"{document.file_name.rsplit('.', 1)[0]}.pdf",
-                    caption=caption
-                )
 
-            # Clean up
-            os.remove(output_path)
-        else:
-            await update.message.reply_text(
-                "❌ **Error en la conversión**\n\n"
-                "No se pudo convertir la presentación PowerPoint a PDF. "
-                "Asegúrate de que el archivo no esté corrupto."
-            )
-
-        # Clean up input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
+                # Send the converted file
+                result_filename = f"{document.file_name.rsplit('.', 1)[0]}.pdf"
+                with open(output_path, 'rb') as pdf_file:
+                    sent = await update.message.reply_document(
+                        document=pdf_file,
+                        filename=result_filename,
+                        caption=caption
+                    )
+                # A degraded fallback output must not be served again once the real converter works
+                if not is_fallback_output(output_path):
+                    await cache_result(result_key, output_path, result_filename, caption, sent)
+            else:
+                await update.message.reply_text(
+                    "❌ **Error en la conversión**\n\n"
+                    "No se pudo convertir la presentación PowerPoint a PDF. "
+                    "Asegúrate de que el archivo no esté corrupto."
+                )
 
     except Exception as e:
         await update.message.reply_text(
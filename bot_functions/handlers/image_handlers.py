@@ -1,12 +1,163 @@
 import os
-import tempfile
+from io import BytesIO
+from contextlib import aclosing
 from telegram import Update
-from ..state_manager import set_user_state, AWAITING_OPTION, IDLE
-from ..utils import validate_file, send_processing_and_ad_message
+from ..state_manager import (
+    set_user_state, get_user_data, clear_user_data, AWAITING_PAGES_FOR_IMAGE_CONVERSION, IDLE
+)
+from ..utils import (
+    validate_file, processing_job, parse_render_options, get_exit_info_message, download_small_document
+)
+from ..scheduler import JOB_COSTS
+from ..executor import run_io
+from ..delivery import ZipPartWriter, ZIP_DELIVERY_THRESHOLD, outbox
+from ..result_cache import cache_key, cache_result, send_cached_result
+from ..workspace import job_workspace, session_workspace, download_document
+from ..file_processing.pdf_processor import get_pdf_page_count
 from ..file_processing.image_processor import (
-    transform_to_png, transform_to_jpeg
+    transform_to_png, transform_to_jpeg, transform_bytes_to_png, transform_bytes_to_jpeg,
+    render_pdf_pages, RENDER_PRESETS, DEFAULT_RENDER_PRESET
 )
 
+async def send_pdf_pages(update: Update, chat_id: int, input_path: str, file_name: str, image_format: str,
+                         extension: str, pages: list = None, preset: str = DEFAULT_RENDER_PRESET):
+    """
+    Render the selected PDF pages and upload them while later pages render.
+    Up to ZIP_DELIVERY_THRESHOLD pages are sent as documents (grouped when they pile up);
+    larger selections are streamed into size-capped ZIP parts.
+    """
+    base_name = file_name.rsplit('.', 1)[0]
+    zip_writer = None
+    async with job_workspace("render") as workspace, \
+            outbox(update.message) as pages_box, outbox(update.message, group_size=1) as parts_box:
+        async with processing_job(update, f"🔄 Convirtiendo PDF a {image_format} (calidad {preset})...", JOB_COSTS['render']) as progress:
+            async with aclosing(render_pdf_pages(input_path, workspace, image_format, progress, pages, preset)) as rendered:
+                async for position, total, page_number, output_path in rendered:
+                    page_file_name = f"page_{page_number}_{base_name}.{extension}"
+                    if position == 1 and total > 1:
+                        await update.message.reply_text(f"📄 Procesando {total} páginas...")
+                        if total > ZIP_DELIVERY_THRESHOLD:
+                            zip_writer = ZipPartWriter(workspace, f"pages_{extension}")
+
+                    if zip_writer:
+                        finished_part = await run_io(zip_writer.add, output_path, page_file_name)
+                        os.remove(output_path)
+                    else:
+                        pages_box.add(output_path, page_file_name, f"✅ Página {page_number} ({position} de {total})")
+                        finished_part = None
+
+                    if finished_part:
+                        part_path, part_number, file_count = finished_part
+                        parts_box.add(part_path, f"{base_name}_parte{part_number}.zip", f"📦 Parte {part_number}: {file_count} páginas")
+
+        if zip_writer:
+            last_part = await run_io(zip_writer.close)
+            if last_part:
+                part_path, part_number, file_count = last_part
+                parts_box.add(part_path, f"{base_name}_parte{part_number}.zip", f"📦 Parte {part_number}: {file_count} páginas")
+
+    failed = pages_box.failed + parts_box.failed
+    if failed:
+        await update.message.reply_text(
+            "❌ No se pudieron enviar algunos archivos:\n" + "\n".join(f"• {name}: {error}" for name, error in failed)
+        )
+
+def _requested_preset(chat_id: int) -> str:
+    """Quality preset given in the request, or the default one"""
+    return get_user_data(chat_id, 'requested_quality') or DEFAULT_RENDER_PRESET
+
+async def ask_pdf_pages_for_image(update: Update, chat_id: int, input_path: str, file_name: str,
+                                  image_format: str, extension: str) -> bool:
+    """
+    Ask which pages and quality to render when a multi-page PDF is uploaded.
+    Returns False when the PDF has a single page and can be converted right away.
+    """
+    try:
+        page_count = await get_pdf_page_count(input_path)
+    except Exception:
+        raise ValueError("El archivo no es un PDF válido.")
+
+    if page_count == 1:
+        return False
+
+    set_user_state(
+        chat_id, AWAITING_PAGES_FOR_IMAGE_CONVERSION,
+        pdf_path=input_path, page_count=page_count, file_name=file_name,
+        image_format=image_format, extension=extension
+    )
+
+    # Pages (and quality) already given in the request: convert without asking
+    requested_pages = get_user_data(chat_id, 'requested_pages')
+    if requested_pages:
+        render_options = f"{requested_pages} {get_user_data(chat_id, 'requested_quality') or ''}"
+        try:
+            parse_render_options(render_options, page_count, RENDER_PRESETS)
+        except ValueError:
+            pass
+        else:
+            await handle_pages_for_image_conversion(update, chat_id, render_options)
+            return True
+
+    await update.message.reply_text(
+        f"✅ PDF recibido: {file_name} ({page_count} páginas)\n\n"
+        f"¿Qué páginas quieres convertir a {image_format}? Puedes usar:\n"
+        f"• Todas las páginas: todas\n"
+        f"• Números individuales: 1,3,5\n"
+        f"• Rangos: 3-5\n\n"
+        f"Opcionalmente añade la calidad: {', '.join(RENDER_PRESETS)} (por defecto {DEFAULT_RENDER_PRESET}).\n"
+        f"Por ejemplo: 3-5 media\n\n"
+        f"Páginas disponibles: 1-{page_count}\n\n{get_exit_info_message()}"
+    )
+    return True
+
+async def handle_pages_for_image_conversion(update: Update, chat_id: int, render_options: str = None):
+    """Handle the page selection and quality preset for a PDF to PNG/JPEG conversion"""
+    render_options = render_options or update.message.text
+    if not render_options:
+        await update.message.reply_text("Por favor, especifica las páginas a convertir o escribe 'todas'.")
+        return
+
+    try:
+        page_count = get_user_data(chat_id, 'page_count')
+        pages, preset = parse_render_options(render_options, page_count, RENDER_PRESETS)
+
+        await send_pdf_pages(
+            update, chat_id, get_user_data(chat_id, 'pdf_path'), get_user_data(chat_id, 'file_name'),
+            get_user_data(chat_id, 'image_format'), get_user_data(chat_id, 'extension'),
+            pages, preset or _requested_preset(chat_id)
+        )
+
+        clear_user_data(chat_id)
+        set_user_state(chat_id, IDLE)
+        await update.message.reply_text("¿En qué más puedo ayudarte?")
+
+    except ValueError as e:
+        await update.message.reply_text(f"Error en el formato de páginas: {str(e)}")
+    except Exception as e:
+        await update.message.reply_text(f"Error al convertir la imagen: {str(e)}")
+        clear_user_data(chat_id)
+        set_user_state(chat_id, IDLE)
+
+async def convert_small_image(update: Update, file_extension: str, image_format: str, extension: str, result_key: str) -> bool:
+    """
+    Convert a small JPEG, PNG or SVG image in memory and reply with the result.
+    Returns False when the file is above IN_MEMORY_THRESHOLD and must go through disk.
+    """
+    data = await download_small_document(update)
+    if data is None:
+        return False
+
+    transform = transform_bytes_to_png if image_format == 'PNG' else transform_bytes_to_jpeg
+    async with processing_job(update, f"🔄 Convirtiendo {file_extension.upper()} a {image_format}...", JOB_COSTS['image']):
+        output_data = await transform(data, file_extension)
+
+    file_name = update.message.document.file_name
+    result_filename = f"converted_{file_name.rsplit('.', 1)[0]}.{extension}"
+    caption = f"✅ {file_extension.upper()} convertido a {image_format} exitosamente!"
+    sent = await update.message.reply_document(document=BytesIO(output_data), filename=result_filename, caption=caption)
+    await cache_result(result_key, output_data, result_filename, caption, sent)
+    return True
+
 async def handle_generic_image_to_png(update: Update, chat_id: int):
     """Handle generic image conversion to PNG with automatic format detection"""
     # Support JPEG, SVG, and PDF files
@@ -16,52 +167,54 @@ async def handle_generic_image_to_png(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        input_path = os.path.join(temp_dir, f"input_{chat_id}_{file_name}")
-
-        await file.download_to_drive(input_path)
-
-        # Get file extension
         file_extension = file_name.lower().split('.')[-1]
 
-        await send_processing_and_ad_message(update, f"🔄 Convirtiendo {file_extension.upper()} a PNG...")
+        # Same image converted before: answer from the result cache.
+        # Otherwise small images are converted in memory, without temp files
+        result_key = cache_key(update.message.document.file_unique_id, 'image_to_png')
+        if file_extension != 'pdf' and (
+            await send_cached_result(update.message, result_key)
+            or await convert_small_image(update, file_extension, 'PNG', 'png', result_key)
+        ):
+            set_user_state(chat_id, IDLE)
+            await update.message.reply_text("¿En qué más puedo ayudarte?")
+            return
 
-        result, is_multiple = await transform_to_png(input_path, chat_id, file_extension)
-
-        if is_multiple:
-            # Multiple files (PDF pages)
-            output_paths = result
-            await update.message.reply_text(f"📄 Procesando {len(output_paths)} páginas...")
-            for i, output_path in enumerate(output_paths, 1):
+        if file_extension == 'pdf':
+            # The PDF stays in the session workspace while the user picks pages
+            input_path = await download_document(update, session_workspace(chat_id))
+            # Multi-page PDFs ask for a page selection first
+            if await ask_pdf_pages_for_image(update, chat_id, input_path, file_name, 'PNG', 'png'):
+                return
+            await send_pdf_pages(update, chat_id, input_path, file_name, 'PNG', 'png', [1], _requested_preset(chat_id))
+            clear_user_data(chat_id)
+        else:
+            # Single file
+            async with job_workspace() as workspace:
+                input_path = await download_document(update, workspace)
+                async with processing_job(update, f"🔄 Convirtiendo {file_extension.upper()} a PNG...", JOB_COSTS['image']):
+                    output_path = await transform_to_png(input_path, workspace, file_extension)
+                result_filename = f"converted_{file_name.rsplit('.', 1)[0]}.png"
+                caption = f"✅ {file_extension.upper()} convertido a PNG exitosamente!"
                 with open(output_path, 'rb') as output_file:
-                    await update.message.reply_document(
+                    sent = await update.message.reply_document(
                         document=output_file,
-                        filename=f"page_{i}_{file_name.rsplit('.', 1)[0]}.png",
-                        caption=f"✅ Página {i} de {len(output_paths)}"
+                        filename=result_filename,
+                        caption=caption
                     )
-                os.remove(output_path)
-        else:
-            # Single file
-            output_path = result
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"converted_{file_name.rsplit('.', 1)[0]}.png",
-                    caption=f"✅ {file_extension.upper()} convertido a PNG exitosamente!"
-                )
-            os.remove(output_path)
-
-        os.remove(input_path)
+                await cache_result(result_key, output_path, result_filename, caption, sent)
+
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
 
     except ValueError as e:
         await update.message.reply_text(f"❌ {str(e)}")
+        clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
     except Exception as e:
         await update.message.reply_text(f"Error al convertir la imagen: {str(e)}")
+        clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
 
 async def handle_generic_image_to_jpeg(update: Update, chat_id: int):
@@ -73,50 +226,52 @@ async def handle_generic_image_to_jpeg(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        input_path = os.path.join(temp_dir, f"input_{chat_id}_{file_name}")
-
-        await file.download_to_drive(input_path)
-
-        # Get file extension
         file_extension = file_name.lower().split('.')[-1]
 
-        await send_processing_and_ad_message(update, f"🔄 Convirtiendo {file_extension.upper()} a JPEG...")
-
-        result, is_multiple = await transform_to_jpeg(input_path, chat_id, file_extension)
+        # Same image converted before: answer from the result cache.
+        # Otherwise small images are converted in memory, without temp files
+        result_key = cache_key(update.message.document.file_unique_id, 'image_to_jpg')
+        if file_extension != 'pdf' and (
+            await send_cached_result(update.message, result_key)
+            or await convert_small_image(update, file_extension, 'JPEG', 'jpg', result_key)
+        ):
+            set_user_state(chat_id, IDLE)
+            await update.message.reply_text("¿En qué más puedo ayudarte?")
+            return
 
-        if is_multiple:
-            # Multiple files (PDF pages)
-            output_paths = result
-            await update.message.reply_text(f"📄 Procesando {len(output_paths)} páginas...")
-            for i, output_path in enumerate(output_paths, 1):
+        if file_extension == 'pdf':
+            # The PDF stays in the session workspace while the user picks pages
+            input_path = await download_document(update, session_workspace(chat_id))
+            # Multi-page PDFs ask for a page selection first
+            if await ask_pdf_pages_for_image(update, chat_id, input_path, file_name, 'JPEG', 'jpg'):
+                return
+            await send_pdf_pages(update, chat_id, input_path, file_name, 'JPEG', 'jpg', [1], _requested_preset(chat_id))
+            clear_user_data(chat_id)
+        else:
+            # Single file
+            async with job_workspace() as workspace:
+                input_path = await download_document(update, workspace)
+                async with processing_job(update, f"🔄 Convirtiendo {file_extension.upper()} a JPEG...", JOB_COSTS['image']):
+                    output_path = await transform_to_jpeg(input_path, workspace, file_extension)
+                result_filename = f"converted_{file_name.rsplit('.', 1)[0]}.jpg"
+                caption = f"✅ {file_extension.upper()} convertido a JPEG exitosamente!"
                 with open(output_path, 'rb') as output_file:
-                    await update.message.reply_document(
+                    sent = await update.message.reply_document(
                         document=output_file,
-                        filename=f"page_{i}_{file_name.rsplit('.', 1)[0]}.jpg",
-                        caption=f"✅ Página {i} de {len(output_paths)}"
+                        filename=result_filename,
+                        caption=caption
                     )
-                os.remove(output_path)
-        else:
-            # Single file
-            output_path = result
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"converted_{file_name.rsplit('.', 1)[0]}.jpg",
-                    caption=f"✅ {file_extension.upper()} convertido a JPEG exitosamente!"
-                )
-            os.remove(output_path)
-
-        os.remove(input_path)
+                await cache_result(result_key, output_path, result_filename, caption, sent)
+
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
 
     except ValueError as e:
         await update.message.reply_text(f"❌ {str(e)}")
+        clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
     except Exception as e:
         await update.message.reply_text(f"Error al convertir la imagen: {str(e)}")
+        clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -10,20 +10,37 @@ from ..state_manager import (
     AWAITING_EXCEL_TO_CSV, AWAITING_PPTX_TO_PDF, AWAITING_CLARIFICATION,
     add_to_conversation_history, get_conversation_history, clear_conversation_history
 )
-from ..gemini_client import generate_text
+from ..intent_rules import classify_intent, extract_parameters
+from ..intent_model import predict_intent, log_intent_example
+from ..intent_cache import cached_classify, intent_cache_key
+from ..gemini_client import LLMUnavailableError
+from .command_handlers import manual
+from ..intent_schema import intent_to_json, is_consistent, INTENT_MIN_CONFIDENCE
+from ..metrics import increment
 from ..utils import get_exit_info_message
 import os
-import re
 
 SYSTEM_PROMPT_FILE = "prompts/system_prompt.txt"
 
+UNAVAILABLE_MESSAGE = "Esa acción no está disponible. Por favor, inténtalo de nuevo o utiliza el comando /help para ver todas las opciones disponibles."
+CLARIFICATION_MESSAGE = "No estoy seguro de qué necesitas. ¿Podrías darme más detalles? También puedes usar /manual para elegir la acción directamente."
+
+# Prompt text and the modification time of the file it was read from
+_system_prompt = {'mtime': None, 'text': ""}
+
 def get_system_prompt():
-    """Reads the system prompt from the file for intent classification."""
+    """Get the system prompt for intent classification, re-reading the file only when it changes"""
     try:
-        with open(SYSTEM_PROMPT_FILE, "r", encoding="utf-8") as f:
-            return f.read()
+        mtime = os.stat(SYSTEM_PROMPT_FILE).st_mtime_ns
     except FileNotFoundError:
         return ""
+    if mtime != _system_prompt['mtime']:
+        with open(SYSTEM_PROMPT_FILE, "r", encoding="utf-8") as f:
+            _system_prompt['text'] = f.read()
+        _system_prompt['mtime'] = mtime
+    return _system_prompt['text']
+
+get_system_prompt()
 
 async def handle_option_selection(update: Update, user_message: str, chat_id: int):
     """Handle user option selection (either direct number or natural language)"""
@@ -33,9 +50,23 @@ async def handle_option_selection(update: Update, user_message: str, chat_id: in
     else:
         await handle_intent_classification(update, chat_id)
 
-async def execute_action(update: Update, chat_id: int, option: int):
-    """Execute the specified action"""
-    exit_info = get_exit_info_message()
+def _requested_details(params: dict) -> str:
+    """Describe the page selection and quality the user already gave, if any"""
+    details = []
+    if params.get('pages'):
+        details.append(f"páginas {params['pages']}")
+    if params.get('quality'):
+        details.append(f"calidad {params['quality']}")
+    return f"📌 Usaré: {', '.join(details)}\n\n" if details else ""
+
+async def execute_action(update: Update, chat_id: int, option: int, params: dict = None):
+    """
+    Execute the specified action. params holds details already given in the request
+    (pages, quality); the steps that would ask for them are skipped.
+    """
+    params = params or {}
+    exit_info = f"{_requested_details(params)}{get_exit_info_message()}"
+    requested = {'requested_pages': params.get('pages'), 'requested_quality': params.get('quality')}
 
     if option == 1:
         set_user_state(chat_id, AWAITING_FIRST_PDF, selected_option=1)
@@ -47,13 +78,13 @@ async def execute_action(update: Update, chat_id: int, option: int):
             f"Envíame los archivos PDF uno por uno. Cuando hayas enviado todos los archivos, escribe 'listo' para concatenarlos.\n\n{exit_info}"
         )
     elif option == 3:
-        set_user_state(chat_id, AWAITING_PDF_FOR_PAGE_DELETE, selected_option=3)
+        set_user_state(chat_id, AWAITING_PDF_FOR_PAGE_DELETE, selected_option=3, **requested)
         await update.message.reply_text(f"📄 **Eliminar páginas de PDF**\n\nEnvíame el archivo PDF del cual quieres eliminar páginas.\n\n{exit_info}")
     elif option == 4:
-        set_user_state(chat_id, AWAITING_PDF_FOR_PAGE_EXTRACT, selected_option=4)
+        set_user_state(chat_id, AWAITING_PDF_FOR_PAGE_EXTRACT, selected_option=4, **requested)
         await update.message.reply_text(f"📄 **Extraer páginas de PDF**\n\nEnvíame el archivo PDF del cual quieres extraer páginas.\n\n{exit_info}")
     elif option == 5:
-        set_user_state(chat_id, AWAITING_PDF_FOR_REORDER, selected_option=5)
+        set_user_state(chat_id, AWAITING_PDF_FOR_REORDER, selected_option=5, **requested)
         await update.message.reply_text(f"📄 **Reordenar páginas de PDF**\n\nEnvíame el archivo PDF cuyas páginas quieres reordenar.\n\n{exit_info}")
     elif option == 6:
         set_user_state(chat_id, AWAITING_MULTIPLE_FILES_FOR_ZIP, selected_option=6)
@@ -80,10 +111,10 @@ async def execute_action(update: Update, chat_id: int, option: int):
         set_user_state(chat_id, AWAITING_ZIP_FOR_PDF_CONCATENATION, selected_option=13)
         await update.message.reply_text(f"🗜️ **Concatenar todos los PDFs dentro de un ZIP**\n\nEnvíame el archivo ZIP que contiene los archivos PDF que quieres concatenar.\n\n{exit_info}")
     elif option == 14:
-        set_user_state(chat_id, AWAITING_IMAGE_TO_PNG, selected_option=14)
+        set_user_state(chat_id, AWAITING_IMAGE_TO_PNG, selected_option=14, **requested)
         await update.message.reply_text(f"🖼️ **Imagen → PNG**\n\nEnvíame la imagen que quieres convertir a PNG (detectaré automáticamente el formato: JPEG, SVG, PDF).\n\n{exit_info}")
     elif option == 15:
-        set_user_state(chat_id, AWAITING_IMAGE_TO_JPEG, selected_option=15)
+        set_user_state(chat_id, AWAITING_IMAGE_TO_JPEG, selected_option=15, **requested)
         await update.message.reply_text(f"🖼️ **Imagen → JPEG**\n\nEnvíame la imagen que quieres convertir a JPEG (detectaré automáticamente el formato: PNG, SVG, PDF).\n\n{exit_info}")
     elif option == 16:
         set_user_state(chat_id, AWAITING_DOCX_TO_PDF, selected_option=16)
@@ -104,46 +135,61 @@ async def execute_action(update: Update, chat_id: int, option: int):
         await update.message.reply_text("Opción no válida. Por favor, elige un número del 1 al 20 o usa /manual para ver todas las opciones.")
 
 async def handle_intent_classification(update: Update, chat_id: int):
-    """Use Gemini to classify user intent and execute corresponding action"""
+    """Classify user intent with the local rules or Gemini and execute corresponding action"""
     user_message = update.message.text
     system_prompt = get_system_prompt()
 
     # Add user message to conversation history
     add_to_conversation_history(chat_id, "USER", user_message)
 
-    # Build conversation history for the prompt
     conversation_history = get_conversation_history(chat_id)
-    conversation_text = ""
-    for msg in conversation_history:
-        conversation_text += f"<{msg['role']}>\n{msg['message']}\n\n"
 
-    # Prepare the prompt for Gemini with conversation history
-    prompt = f"{system_prompt}\n\n{conversation_text}<ASSISTANT>"
+    # Clear requests are answered by the local rules without waiting for Gemini. The rules
+    # see every user message of the conversation so clarifications keep their context.
+    user_text = " ".join(msg['message'] for msg in conversation_history if msg['role'] == "USER")
+    action_number = classify_intent(user_text)
+    if action_number:
+        increment('intent.rules')
+        clear_conversation_history(chat_id)
+        await execute_action(update, chat_id, action_number, extract_parameters(user_text))
+        return
+
+    # Next the local model distilled from earlier LLM answers, when one has been trained
+    action_number = predict_intent(user_text)
+    if action_number:
+        increment('intent.local_model')
+        clear_conversation_history(chat_id)
+        await execute_action(update, chat_id, action_number, extract_parameters(user_text))
+        return
 
     try:
-        response = await generate_text(prompt)
+        # Ask the models with the conversation history
+        increment('intent.llm')
+        intent = await cached_classify(intent_cache_key(conversation_history, system_prompt), system_prompt, conversation_history)
 
         # Add assistant response to conversation history
-        add_to_conversation_history(chat_id, "ASSISTANT", response)
-
-        # Extract action number from response
-        action_match = re.search(r"Acción:\s*(\d+)", response)
-        if action_match:
-            action_number = int(action_match.group(1))
-            if 1 <= action_number <= 20:
-                # Execute the identified action and clear conversation history
-                clear_conversation_history(chat_id)
-                await execute_action(update, chat_id, action_number)
-            else:
-                await update.message.reply_text("No pude identificar una acción válida. Usa /manual para ver todas las opciones disponibles.")
-        elif "no está disponible" in response.lower() or "no encuentras una opción" in response.lower():
-            # Action not available response - clear conversation history and send response
+        add_to_conversation_history(chat_id, "ASSISTANT", intent_to_json(intent))
+
+        action_number = intent['action']
+        if action_number and intent['confidence'] >= INTENT_MIN_CONFIDENCE and is_consistent(intent):
+            # Execute the identified action with the details already given and clear conversation history
+            clear_conversation_history(chat_id)
+            await log_intent_example(user_text, action_number)
+            await execute_action(update, chat_id, action_number, intent)
+        elif action_number == 0:
+            # Action not available - clear conversation history and send response
             clear_conversation_history(chat_id)
-            await update.message.reply_text(response)
+            await log_intent_example(user_text, 0)
+            await update.message.reply_text(intent['message'] or UNAVAILABLE_MESSAGE)
         else:
-            # Clarification needed - set state to continue conversation
+            # Clarification needed (or an unsure answer) - set state to continue conversation
             set_user_state(chat_id, AWAITING_CLARIFICATION)
-            await update.message.reply_text(response)
+            await update.message.reply_text(intent['message'] or CLARIFICATION_MESSAGE)
+    except LLMUnavailableError:
+        # Degraded mode: the models are failing or slow, offer the numbered menu right away
+        increment('intent.degraded')
+        await update.message.reply_text("⚠️ El asistente inteligente no está disponible en este momento, pero puedes elegir la acción por su número.")
+        await manual(update, None)
     except Exception as e:
         await update.message.reply_text(f"Error al procesar tu solicitud. Intenta de nuevo o usa /manual para seleccionar directamente.")
 
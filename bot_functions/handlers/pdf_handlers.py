@@ -1,12 +1,12 @@
 import os
-import tempfile
 from telegram import Update
-from PyPDF2 import PdfReader
 from ..state_manager import set_user_state, get_user_data, clear_user_data, AWAITING_SECOND_PDF, AWAITING_MULTIPLE_PDFS, AWAITING_PAGE_NUMBERS_DELETE, AWAITING_PAGE_NUMBERS_EXTRACT, AWAITING_PAGE_ORDER, AWAITING_OPTION, AWAITING_PDF_CONCATENATION_ORDER, IDLE
-from ..utils import validate_file, send_processing_and_ad_message, parse_page_numbers, get_exit_info_message
+from ..utils import validate_file, processing_job, parse_page_numbers, get_exit_info_message
+from ..scheduler import JOB_COSTS
+from ..workspace import job_workspace, session_workspace, download_document
 from ..file_processing.pdf_processor import (
     concatenate_two_pdfs, concatenate_multiple_pdfs, delete_pdf_pages,
-    extract_pdf_pages, reorder_pdf_pages
+    extract_pdf_pages, reorder_pdf_pages, get_pdf_page_count
 )
 from ..file_processing.zip_processor import perform_bulk_operation_with_order
 
@@ -18,17 +18,12 @@ async def handle_first_pdf_upload(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        first_pdf_path = os.path.join(temp_dir, f"first_pdf_{chat_id}_{file_name}")
-
-        await file.download_to_drive(first_pdf_path)
+        first_pdf_path = await download_document(update, session_workspace(chat_id), f"first_pdf_{file_name}")
 
         # Validate PDF
         try:
-            reader = PdfReader(first_pdf_path)
-            page_count = len(reader.pages)
+            page_count = await get_pdf_page_count(first_pdf_path)
         except Exception:
             os.remove(first_pdf_path)
             await update.message.reply_text("El archivo no es un PDF válido.")
@@ -52,17 +47,12 @@ async def handle_second_pdf_upload(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        second_pdf_path = os.path.join(temp_dir, f"second_pdf_{chat_id}_{file_name}")
-
-        await file.download_to_drive(second_pdf_path)
+        second_pdf_path = await download_document(update, session_workspace(chat_id), f"second_pdf_{file_name}")
 
         # Validate PDF
         try:
-            reader = PdfReader(second_pdf_path)
-            page_count = len(reader.pages)
+            page_count = await get_pdf_page_count(second_pdf_path)
         except Exception:
             os.remove(second_pdf_path)
             await update.message.reply_text("El archivo no es un PDF válido.")
@@ -70,26 +60,23 @@ async def handle_second_pdf_upload(update: Update, chat_id: int):
 
         await update.message.reply_text(f"✅ Segundo PDF recibido: {file_name} ({page_count} páginas)")
 
-        # Send processing message and advertisement
-        await send_processing_and_ad_message(update, "🔄 Concatenando dos archivos PDF...")
-
-        # Concatenate PDFs
+        # Send processing message and advertisement, then concatenate PDFs
         first_pdf_path = get_user_data(chat_id, 'first_pdf_path')
-        output_path = await concatenate_two_pdfs(first_pdf_path, second_pdf_path, chat_id)
-
-        if output_path:
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"concatenated_{chat_id}.pdf",
-                    caption="✅ PDFs concatenados exitosamente!"
-                )
-            os.remove(output_path)
-        else:
-            await update.message.reply_text("❌ Error al concatenar los PDFs.")
-
-        # Clean up
-        os.remove(second_pdf_path)
+        async with job_workspace() as workspace:
+            async with processing_job(update, "🔄 Concatenando dos archivos PDF...", JOB_COSTS['pdf']):
+                output_path = await concatenate_two_pdfs(first_pdf_path, second_pdf_path, workspace)
+
+            if output_path:
+                with open(output_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"concatenated_{chat_id}.pdf",
+                        caption="✅ PDFs concatenados exitosamente!"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al concatenar los PDFs.")
+
+        # Clean up (the session workspace holds both PDFs)
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
@@ -108,19 +95,18 @@ async def handle_multiple_pdfs_upload(update: Update, chat_id: int):
             return
 
         # Send processing message and advertisement
-        await send_processing_and_ad_message(update, f"🔄 Concatenando {len(pdf_paths)} archivos PDF en el orden especificado...")
-
-        output_path = await concatenate_multiple_pdfs(pdf_paths, chat_id)
-        if output_path:
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"concatenated_multiple_{chat_id}.pdf",
-                    caption=f"✅ {len(pdf_paths)} PDFs concatenados exitosamente!"
-                )
-            os.remove(output_path)
-        else:
-            await update.message.reply_text("❌ Error al concatenar los PDFs.")
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Concatenando {len(pdf_paths)} archivos PDF en el orden especificado...", JOB_COSTS['pdf']):
+                output_path = await concatenate_multiple_pdfs(pdf_paths, workspace)
+            if output_path:
+                with open(output_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"concatenated_multiple_{chat_id}.pdf",
+                        caption=f"✅ {len(pdf_paths)} PDFs concatenados exitosamente!"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al concatenar los PDFs.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -133,17 +119,12 @@ async def handle_multiple_pdfs_upload(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        pdf_path = os.path.join(temp_dir, f"multi_pdf_{chat_id}_{len(get_user_data(chat_id, 'pdf_paths', []))}_{file_name}")
-
-        await file.download_to_drive(pdf_path)
+        pdf_path = await download_document(update, session_workspace(chat_id), f"multi_pdf_{len(get_user_data(chat_id, 'pdf_paths', []))}_{file_name}")
 
         # Validate PDF
         try:
-            reader = PdfReader(pdf_path)
-            page_count = len(reader.pages)
+            page_count = await get_pdf_page_count(pdf_path)
         except Exception:
             os.remove(pdf_path)
             await update.message.reply_text("El archivo no es un PDF válido.")
@@ -164,6 +145,15 @@ async def handle_multiple_pdfs_upload(update: Update, chat_id: int):
     except Exception as e:
         await update.message.reply_text(f"Error al procesar el archivo: {str(e)}")
 
+def _valid_page_selection(operation: str, page_spec: str, page_count: int) -> bool:
+    """Whether a page selection given in advance can be applied to a PDF with page_count pages"""
+    try:
+        if operation == "reorder":
+            return sorted(int(x) for x in page_spec.split(',')) == list(range(1, page_count + 1))
+        return bool(parse_page_numbers(page_spec, page_count))
+    except ValueError:
+        return False
+
 async def handle_pdf_for_page_operation(update: Update, chat_id: int, operation: str):
     """Handle PDF upload for page operations (delete, extract, reorder)"""
     is_valid, message = await validate_file(update, ['pdf'])
@@ -172,23 +162,27 @@ async def handle_pdf_for_page_operation(update: Update, chat_id: int, operation:
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        pdf_path = os.path.join(temp_dir, f"{operation}_pdf_{chat_id}_{file_name}")
-
-        await file.download_to_drive(pdf_path)
+        pdf_path = await download_document(update, session_workspace(chat_id), f"{operation}_pdf_{file_name}")
 
         # Validate PDF and get page count
         try:
-            reader = PdfReader(pdf_path)
-            page_count = len(reader.pages)
+            page_count = await get_pdf_page_count(pdf_path)
         except Exception:
             os.remove(pdf_path)
             await update.message.reply_text("El archivo no es un PDF válido.")
             return
 
         set_user_state(chat_id, f"AWAITING_PAGE_NUMBERS_{operation.upper()}", pdf_path=pdf_path, page_count=page_count)
+
+        # Pages already given in the request: skip the question when they fit this PDF
+        requested_pages = get_user_data(chat_id, 'requested_pages')
+        if requested_pages and _valid_page_selection(operation, requested_pages, page_count):
+            if operation == "reorder":
+                set_user_state(chat_id, AWAITING_PAGE_ORDER)
+            await PAGE_SELECTION_HANDLERS[operation](update, chat_id, requested_pages)
+            return
+
         exit_info = get_exit_info_message()
 
         if operation == "delete":
@@ -222,32 +216,32 @@ async def handle_pdf_for_page_operation(update: Update, chat_id: int, operation:
     except Exception as e:
         await update.message.reply_text(f"Error al procesar el archivo: {str(e)}")
 
-async def handle_page_numbers_delete(update: Update, chat_id: int):
+async def handle_page_numbers_delete(update: Update, chat_id: int, page_spec: str = None):
     """Handle page number specification for deletion"""
-    if not update.message.text:
+    page_spec = page_spec or update.message.text
+    if not page_spec:
         await update.message.reply_text("Por favor, especifica los números de página.")
         return
 
     try:
         page_count = get_user_data(chat_id, 'page_count')
-        pages_to_delete = parse_page_numbers(update.message.text, page_count)
+        pages_to_delete = parse_page_numbers(page_spec, page_count)
 
         # Send processing message and advertisement
-        await send_processing_and_ad_message(update, f"🔄 Eliminando páginas {', '.join(map(str, pages_to_delete))}...")
-
         pdf_path = get_user_data(chat_id, 'pdf_path')
-        output_path = await delete_pdf_pages(pdf_path, pages_to_delete, chat_id)
-
-        if output_path:
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"pages_deleted_{chat_id}.pdf",
-                    caption=f"✅ Páginas eliminadas: {', '.join(map(str, pages_to_delete))}"
-                )
-            os.remove(output_path)
-        else:
-            await update.message.reply_text("❌ Error al eliminar las páginas.")
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Eliminando páginas {', '.join(map(str, pages_to_delete))}...", JOB_COSTS['pdf']):
+                output_path = await delete_pdf_pages(pdf_path, pages_to_delete, workspace)
+
+            if output_path:
+                with open(output_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"pages_deleted_{chat_id}.pdf",
+                        caption=f"✅ Páginas eliminadas: {', '.join(map(str, pages_to_delete))}"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al eliminar las páginas.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -260,32 +254,32 @@ async def handle_page_numbers_delete(update: Update, chat_id: int):
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
 
-async def handle_page_numbers_extract(update: Update, chat_id: int):
+async def handle_page_numbers_extract(update: Update, chat_id: int, page_spec: str = None):
     """Handle page number specification for extraction"""
-    if not update.message.text:
+    page_spec = page_spec or update.message.text
+    if not page_spec:
         await update.message.reply_text("Por favor, especifica los números de página.")
         return
 
     try:
         page_count = get_user_data(chat_id, 'page_count')
-        pages_to_extract = parse_page_numbers(update.message.text, page_count)
+        pages_to_extract = parse_page_numbers(page_spec, page_count)
 
         # Send processing message and advertisement
-        await send_processing_and_ad_message(update, f"🔄 Extrayendo páginas {', '.join(map(str, pages_to_extract))}...")
-
         pdf_path = get_user_data(chat_id, 'pdf_path')
-        output_path = await extract_pdf_pages(pdf_path, pages_to_extract, chat_id)
-
-        if output_path:
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"pages_extracted_{chat_id}.pdf",
-                    caption=f"✅ Páginas extraídas: {', '.join(map(str, pages_to_extract))}"
-                )
-            os.remove(output_path)
-        else:
-            await update.message.reply_text("❌ Error al extraer las páginas.")
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Extrayendo páginas {', '.join(map(str, pages_to_extract))}...", JOB_COSTS['pdf']):
+                output_path = await extract_pdf_pages(pdf_path, pages_to_extract, workspace)
+
+            if output_path:
+                with open(output_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"pages_extracted_{chat_id}.pdf",
+                        caption=f"✅ Páginas extraídas: {', '.join(map(str, pages_to_extract))}"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al extraer las páginas.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -298,15 +292,16 @@ async def handle_page_numbers_extract(update: Update, chat_id: int):
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
 
-async def handle_page_order(update: Update, chat_id: int):
+async def handle_page_order(update: Update, chat_id: int, page_spec: str = None):
     """Handle page order specification for reordering"""
-    if not update.message.text:
+    page_spec = page_spec or update.message.text
+    if not page_spec:
         await update.message.reply_text("Por favor, especifica el orden de las páginas.")
         return
 
     try:
         page_count = get_user_data(chat_id, 'page_count')
-        order_parts = [int(x.strip()) for x in update.message.text.split(',')]
+        order_parts = [int(x.strip()) for x in page_spec.split(',')]
 
         # Validate that all pages are included exactly once
         if sorted(order_parts) != list(range(1, page_count + 1)):
@@ -316,21 +311,20 @@ async def handle_page_order(update: Update, chat_id: int):
             return
 
         # Send processing message and advertisement
-        await send_processing_and_ad_message(update, f"🔄 Reordenando páginas según: {', '.join(map(str, order_parts))}...")
-
         pdf_path = get_user_data(chat_id, 'pdf_path')
-        output_path = await reorder_pdf_pages(pdf_path, order_parts, chat_id)
-
-        if output_path:
-            with open(output_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"pages_reordered_{chat_id}.pdf",
-                    caption=f"✅ Páginas reordenadas: {', '.join(map(str, order_parts))}"
-                )
-            os.remove(output_path)
-        else:
-            await update.message.reply_text("❌ Error al reordenar las páginas.")
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Reordenando páginas según: {', '.join(map(str, order_parts))}...", JOB_COSTS['pdf']):
+                output_path = await reorder_pdf_pages(pdf_path, order_parts, workspace)
+
+            if output_path:
+                with open(output_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"pages_reordered_{chat_id}.pdf",
+                        caption=f"✅ Páginas reordenadas: {', '.join(map(str, order_parts))}"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al reordenar las páginas.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -343,6 +337,13 @@ async def handle_page_order(update: Update, chat_id: int):
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
 
+# Handlers that apply a page selection, by page operation
+PAGE_SELECTION_HANDLERS = {
+    "delete": handle_page_numbers_delete,
+    "extract": handle_page_numbers_extract,
+    "reorder": handle_page_order,
+}
+
 async def handle_pdf_concatenation_order(update: Update, chat_id: int):
     """Handle PDF concatenation order specification in bulk operations"""
     if not update.message.text:
@@ -391,22 +392,21 @@ async def handle_pdf_concatenation_order(update: Update, chat_id: int):
             f"🔄 Concatenando PDFs en el orden especificado:\n" +
             "\n".join([f"{i+1}. {pdf}" for i, pdf in enumerate(ordered_pdf_files)])
         )
-        await send_processing_and_ad_message(update, processing_message)
-
-        # Perform the bulk operation with ordered PDFs
-        new_zip_path = await perform_bulk_operation_with_order(zip_path, current_files, operation, chat_id, ordered_pdf_files)
-
-        # Send result
-        if new_zip_path:
-            with open(new_zip_path, 'rb') as new_zip_file:
-                await update.message.reply_document(
-                    document=new_zip_file,
-                    filename=f"zip_procesado_{chat_id}.zip",
-                    caption="✅ PDFs concatenados en el orden especificado!"
-                )
-            os.remove(new_zip_path)
-        else:
-            await update.message.reply_text("❌ Error al concatenar los PDFs.")
+        async with job_workspace() as workspace:
+            async with processing_job(update, processing_message, JOB_COSTS['bulk']):
+                # Perform the bulk operation with ordered PDFs
+                new_zip_path = await perform_bulk_operation_with_order(zip_path, current_files, operation, workspace, ordered_pdf_files)
+
+            # Send result
+            if new_zip_path:
+                with open(new_zip_path, 'rb') as new_zip_file:
+                    await update.message.reply_document(
+                        document=new_zip_file,
+                        filename=f"zip_procesado_{chat_id}.zip",
+                        caption="✅ PDFs concatenados en el orden especificado!"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al concatenar los PDFs.")
 
         # Clean up
         if os.path.exists(zip_path):
@@ -1,7 +1,4 @@
 import os
-import tempfile
-import zipfile
-import shutil
 from telegram import Update
 from ..state_manager import (
     set_user_state, get_user_data, clear_user_data,
@@ -9,10 +6,14 @@ from ..state_manager import (
     AWAITING_FILENAMES_TO_REMOVE, AWAITING_BULK_OPERATION, AWAITING_PDF_CONCATENATION_ORDER, IDLE,
     AWAITING_ZIP_FOR_IMAGES_TO_PNG, AWAITING_ZIP_FOR_IMAGES_TO_JPEG, AWAITING_ZIP_FOR_PDF_CONCATENATION
 )
-from ..utils import validate_file, send_processing_and_ad_message, filter_valid_files, get_exit_info_message
+from ..utils import validate_file, processing_job, get_exit_info_message
+from ..scheduler import JOB_COSTS
+from ..delivery import outbox
+from ..result_cache import cache_key, cache_text, send_cached_result
+from ..workspace import job_workspace, session_workspace, download_document
 from ..file_processing.zip_processor import (
     create_zip_from_files, add_files_to_zip, remove_files_from_zip,
-    perform_bulk_operation
+    perform_bulk_operation, list_zip_files, list_zip_entries, extract_zip
 )
 from ..file_processing.zip_processor import perform_bulk_operation_with_order as pb_with_order
 
@@ -24,27 +25,23 @@ async def handle_multiple_files_for_zip(update: Update, chat_id: int):
             await update.message.reply_text("Necesitas enviar al menos 2 archivos para crear un ZIP.")
             return
 
-        await send_processing_and_ad_message(update, f"🔄 Creando ZIP con {len(file_paths)} archivos...")
-
         try:
-            zip_path = await create_zip_from_files(file_paths, chat_id)
-            if zip_path:
-                with open(zip_path, 'rb') as zip_file:
-                    await update.message.reply_document(
-                        document=zip_file,
-                        filename=f"archivos_combinados_{chat_id}.zip",
-                        caption="✅ ZIP creado exitosamente!"
-                    )
-                os.remove(zip_path)
-            else:
-                await update.message.reply_text("❌ Error al crear el ZIP.")
+            async with job_workspace() as workspace:
+                async with processing_job(update, f"🔄 Creando ZIP con {len(file_paths)} archivos...", JOB_COSTS['zip']):
+                    zip_path = await create_zip_from_files(file_paths, workspace)
+                if zip_path:
+                    with open(zip_path, 'rb') as zip_file:
+                        await update.message.reply_document(
+                            document=zip_file,
+                            filename=f"archivos_combinados_{chat_id}.zip",
+                            caption="✅ ZIP creado exitosamente!"
+                        )
+                else:
+                    await update.message.reply_text("❌ Error al crear el ZIP.")
         except Exception as e:
             await update.message.reply_text(f"❌ Error al crear el ZIP: {str(e)}")
 
-        for file_path in file_paths:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
+        # Also removes the uploaded files, kept in the session workspace
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
@@ -60,12 +57,10 @@ async def handle_multiple_files_for_zip(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        file_path = os.path.join(temp_dir, f"zip_file_{chat_id}_{len(get_user_data(chat_id, 'file_paths', []))}_{file_name}")
-
-        await file.download_to_drive(file_path)
+        file_path = await download_document(
+            update, session_workspace(chat_id), f"{len(get_user_data(chat_id, 'file_paths', []))}_{file_name}"
+        )
 
         file_paths = get_user_data(chat_id, 'file_paths', [])
         file_paths.append(file_path)
@@ -85,43 +80,26 @@ async def handle_zip_extraction(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
-        file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_to_extract_{chat_id}_{file_name}")
-
-        await file.download_to_drive(zip_path)
-
-        await send_processing_and_ad_message(update, "🔄 Extrayendo archivos del ZIP...")
-
-        extract_dir = os.path.join(temp_dir, f"extracted_{chat_id}")
-        os.makedirs(extract_dir, exist_ok=True)
+        async with job_workspace("extract") as workspace:
+            zip_path = await download_document(update, workspace)
 
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+            extract_dir = os.path.join(workspace, "extracted")
+            async with processing_job(update, "🔄 Extrayendo archivos del ZIP...", JOB_COSTS['zip']):
+                await extract_zip(zip_path, extract_dir)
 
-        files_sent = 0
-        for root, dirs, files in os.walk(extract_dir):
-            for file in files:
-                if file.startswith('._') or '__MACOSX' in root:
-                    continue
+            async with outbox(update.message, remove_after=False) as extracted_box:
+                for root, dirs, files in os.walk(extract_dir):
+                    for file in files:
+                        if file.startswith('._') or '__MACOSX' in root:
+                            continue
+                        extracted_box.add(os.path.join(root, file), file, f"📄 Archivo extraído: {file}")
+        files_sent = extracted_box.sent
 
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'rb') as extracted_file:
-                        await update.message.reply_document(
-                            document=extracted_file,
-                            filename=file,
-                            caption=f"📄 Archivo extraído: {file}"
-                        )
-                    files_sent += 1
-                except Exception as e:
-                    await update.message.reply_text(f"❌ No se pudo enviar {file}: {str(e)}")
+        for file, error in extracted_box.failed:
+            await update.message.reply_text(f"❌ No se pudo enviar {file}: {error}")
 
         await update.message.reply_text(f"✅ Extracción completada. {files_sent} archivos enviados.")
 
-        os.remove(zip_path)
-        shutil.rmtree(extract_dir)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
 
@@ -137,22 +115,22 @@ async def handle_zip_listing(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
-        file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_to_list_{chat_id}_{file_name}")
-
-        await file.download_to_drive(zip_path)
+        # Same ZIP listed before: answer from the result cache
+        result_key = cache_key(update.message.document.file_unique_id, 'zip_listing')
+        if await send_cached_result(update.message, result_key):
+            set_user_state(chat_id, IDLE)
+            await update.message.reply_text("¿En qué más puedo ayudarte?")
+            return
 
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            valid_files = filter_valid_files(all_files)
-            info_list = []
+        async with job_workspace("list") as workspace:
+            zip_path = await download_document(update, workspace)
+            entries = await list_zip_entries(zip_path)
+        valid_files = [file_name for file_name, _ in entries]
+        info_list = []
 
-            for file_name in valid_files:
-                info = zip_ref.getinfo(file_name)
-                size_mb = info.file_size / (1024 * 1024)
-                info_list.append(f"📄 {file_name} ({size_mb:.2f} MB)")
+        for file_name, file_size in entries:
+            size_mb = file_size / (1024 * 1024)
+            info_list.append(f"📄 {file_name} ({size_mb:.2f} MB)")
 
         if info_list:
             content_text = "📋 **Contenido del ZIP:**\n\n" + "\n".join(info_list)
@@ -161,8 +139,8 @@ async def handle_zip_listing(update: Update, chat_id: int):
             content_text = "📋 El archivo ZIP no contiene archivos válidos."
 
         await update.message.reply_text(content_text)
+        await cache_text(result_key, content_text)
 
-        os.remove(zip_path)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
 
@@ -178,16 +156,9 @@ async def handle_zip_for_add(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
-        file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_for_add_{chat_id}_{file_name}")
-
-        await file.download_to_drive(zip_path)
+        zip_path = await download_document(update, session_workspace(chat_id))
 
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            current_files = filter_valid_files(all_files)
+        current_files = await list_zip_files(zip_path)
 
         set_user_state(chat_id, AWAITING_FILES_TO_ADD, zip_path=zip_path, files_to_add=[])
         exit_info = get_exit_info_message()
@@ -211,29 +182,23 @@ async def handle_files_to_add(update: Update, chat_id: int):
 
         zip_path = get_user_data(chat_id, 'zip_path')
 
-        await send_processing_and_ad_message(update, f"🔄 Agregando {len(files_to_add)} archivos al ZIP...")
-
         try:
-            new_zip_path = await add_files_to_zip(zip_path, files_to_add, chat_id)
-            if new_zip_path:
-                with open(new_zip_path, 'rb') as new_zip_file:
-                    await update.message.reply_document(
-                        document=new_zip_file,
-                        filename=f"zip_actualizado_{chat_id}.zip",
-                        caption=f"✅ ZIP actualizado con {len(files_to_add)} archivos nuevos!"
-                    )
-                os.remove(new_zip_path)
-            else:
-                await update.message.reply_text("❌ Error al agregar archivos al ZIP.")
+            async with job_workspace() as workspace:
+                async with processing_job(update, f"🔄 Agregando {len(files_to_add)} archivos al ZIP...", JOB_COSTS['zip']):
+                    new_zip_path = await add_files_to_zip(zip_path, files_to_add, workspace)
+                if new_zip_path:
+                    with open(new_zip_path, 'rb') as new_zip_file:
+                        await update.message.reply_document(
+                            document=new_zip_file,
+                            filename=f"zip_actualizado_{chat_id}.zip",
+                            caption=f"✅ ZIP actualizado con {len(files_to_add)} archivos nuevos!"
+                        )
+                else:
+                    await update.message.reply_text("❌ Error al agregar archivos al ZIP.")
         except Exception as e:
             await update.message.reply_text(f"❌ Error al agregar archivos: {str(e)}")
 
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-        for file_path in files_to_add:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
+        # Also removes the ZIP and the uploaded files, kept in the session workspace
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
@@ -249,12 +214,10 @@ async def handle_files_to_add(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        file_path = os.path.join(temp_dir, f"add_file_{chat_id}_{len(get_user_data(chat_id, 'files_to_add', []))}_{file_name}")
-
-        await file.download_to_drive(file_path)
+        file_path = await download_document(
+            update, session_workspace(chat_id), f"add_{len(get_user_data(chat_id, 'files_to_add', []))}_{file_name}"
+        )
 
         files_to_add = get_user_data(chat_id, 'files_to_add', [])
         files_to_add.append(file_path)
@@ -274,20 +237,13 @@ async def handle_zip_for_remove(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
-        file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_for_remove_{chat_id}_{file_name}")
+        zip_path = await download_document(update, session_workspace(chat_id))
 
-        await file.download_to_drive(zip_path)
-
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            current_files = filter_valid_files(all_files)
+        current_files = await list_zip_files(zip_path)
 
         if not current_files:
             await update.message.reply_text("❌ El ZIP está vacío.")
-            os.remove(zip_path)
+            clear_user_data(chat_id)
             set_user_state(chat_id, IDLE)
             return
 
@@ -333,22 +289,18 @@ async def handle_filenames_to_remove(update: Update, chat_id: int):
             await update.message.reply_text("❌ No se encontraron archivos válidos para eliminar.")
             return
 
-        await send_processing_and_ad_message(update, f"🔄 Eliminando {len(files_to_remove)} archivos del ZIP...")
-
-        new_zip_path = await remove_files_from_zip(zip_path, files_to_remove, chat_id)
-        if new_zip_path:
-            with open(new_zip_path, 'rb') as new_zip_file:
-                await update.message.reply_document(
-                    document=new_zip_file,
-                    filename=f"zip_actualizado_{chat_id}.zip",
-                    caption=f"✅ ZIP actualizado. Eliminados {len(files_to_remove)} archivos."
-                )
-            os.remove(new_zip_path)
-        else:
-            await update.message.reply_text("❌ Error al eliminar archivos del ZIP.")
-
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Eliminando {len(files_to_remove)} archivos del ZIP...", JOB_COSTS['zip']):
+                new_zip_path = await remove_files_from_zip(zip_path, files_to_remove, workspace)
+            if new_zip_path:
+                with open(new_zip_path, 'rb') as new_zip_file:
+                    await update.message.reply_document(
+                        document=new_zip_file,
+                        filename=f"zip_actualizado_{chat_id}.zip",
+                        caption=f"✅ ZIP actualizado. Eliminados {len(files_to_remove)} archivos."
+                    )
+            else:
+                await update.message.reply_text("❌ Error al eliminar archivos del ZIP.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -366,20 +318,13 @@ async def handle_zip_for_bulk(update: Update, chat_id: int):
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
-        file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_for_bulk_{chat_id}_{file_name}")
-
-        await file.download_to_drive(zip_path)
+        zip_path = await download_document(update, session_workspace(chat_id))
 
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            current_files = filter_valid_files(all_files)
+        current_files = await list_zip_files(zip_path)
 
         if not current_files:
             await update.message.reply_text("❌ El ZIP no contiene archivos válidos.")
-            os.remove(zip_path)
+            clear_user_data(chat_id)
             set_user_state(chat_id, IDLE)
             return
 
@@ -422,48 +367,45 @@ async def handle_bulk_operation(update: Update, chat_id: int):
         zip_path = get_user_data(chat_id, 'zip_path')
         current_files = get_user_data(chat_id, 'current_files', [])
 
-        if operation == 5:
-            pdf_files = [f for f in current_files if f.lower().endswith('.pdf')]
-
-            if len(pdf_files) < 2:
-                await update.message.reply_text("❌ Se necesitan al menos 2 archivos PDF para concatenar.")
-                return
-            elif len(pdf_files) == 2:
-                await send_processing_and_ad_message(update, "🔄 Concatenando 2 archivos PDF...")
-                new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, chat_id)
+        async with job_workspace() as workspace:
+            if operation == 5:
+                pdf_files = [f for f in current_files if f.lower().endswith('.pdf')]
+
+                if len(pdf_files) < 2:
+                    await update.message.reply_text("❌ Se necesitan al menos 2 archivos PDF para concatenar.")
+                    return
+                elif len(pdf_files) == 2:
+                    async with processing_job(update, "🔄 Concatenando 2 archivos PDF...", JOB_COSTS['bulk']) as progress:
+                        new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, workspace, progress)
+                else:
+                    pdf_list = "\n".join([f"{i+1}. {pdf}" for i, pdf in enumerate(pdf_files)])
+
+                    set_user_state(chat_id, AWAITING_PDF_CONCATENATION_ORDER,
+                                 zip_path=zip_path,
+                                 current_files=current_files,
+                                 pdf_files=pdf_files,
+                                 operation=operation)
+
+                    await update.message.reply_text(
+                        f"📋 **Se encontraron {len(pdf_files)} archivos PDF:**\n\n{pdf_list}\n\n"
+                        f"📝 **Especifica el orden para concatenar los PDFs**\n"
+                        f"Envía los números separados por comas (ejemplo: 2,1,3)\n"
+                        f"Esto concatenará el archivo 2 primero, luego el 1, luego el 3."
+                    )
+                    return
             else:
-                pdf_list = "\n".join([f"{i+1}. {pdf}" for i, pdf in enumerate(pdf_files)])
-
-                set_user_state(chat_id, AWAITING_PDF_CONCATENATION_ORDER,
-                             zip_path=zip_path,
-                             current_files=current_files,
-                             pdf_files=pdf_files,
-                             operation=operation)
-
-                await update.message.reply_text(
-                    f"📋 **Se encontraron {len(pdf_files)} archivos PDF:**\n\n{pdf_list}\n\n"
-                    f"📝 **Especifica el orden para concatenar los PDFs**\n"
-                    f"Envía los números separados por comas (ejemplo: 2,1,3)\n"
-                    f"Esto concatenará el archivo 2 primero, luego el 1, luego el 3."
-                )
-                return
-        else:
-            await send_processing_and_ad_message(update, "🔄 Realizando operación en masa...")
-            new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, chat_id)
-
-        if new_zip_path:
-            with open(new_zip_path, 'rb') as new_zip_file:
-                await update.message.reply_document(
-                    document=new_zip_file,
-                    filename=f"zip_procesado_{chat_id}.zip",
-                    caption="✅ Operación en masa completada!"
-                )
-            os.remove(new_zip_path)
-        else:
-            await update.message.reply_text("❌ Error al realizar la operación en masa.")
+                async with processing_job(update, "🔄 Realizando operación en masa...", JOB_COSTS['bulk']) as progress:
+                    new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, workspace, progress)
 
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
+            if new_zip_path:
+                with open(new_zip_path, 'rb') as new_zip_file:
+                    await update.message.reply_document(
+                        document=new_zip_file,
+                        filename=f"zip_procesado_{chat_id}.zip",
+                        caption="✅ Operación en masa completada!"
+                    )
+            else:
+                await update.message.reply_text("❌ Error al realizar la operación en masa.")
 
         clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
@@ -495,20 +437,14 @@ async def handle_specific_bulk_operation(update: Update, chat_id: int, operation
         return
 
     try:
-        file = await update.message.document.get_file()
-        temp_dir = tempfile.gettempdir()
         file_name = update.message.document.file_name
-        zip_path = os.path.join(temp_dir, f"zip_for_bulk_{operation}_{chat_id}_{file_name}")
+        zip_path = await download_document(update, session_workspace(chat_id))
 
-        await file.download_to_drive(zip_path)
-
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            all_files = zip_ref.namelist()
-            current_files = filter_valid_files(all_files)
+        current_files = await list_zip_files(zip_path)
 
         if not current_files:
             await update.message.reply_text("❌ El ZIP no contiene archivos válidos.")
-            os.remove(zip_path)
+            clear_user_data(chat_id)
             set_user_state(chat_id, IDLE)
             return
 
@@ -524,7 +460,7 @@ async def handle_specific_bulk_operation(update: Update, chat_id: int, operation
         if not applicable_files:
             file_types = {1: "JPEG/SVG", 2: "PNG/SVG", 3: "PDF"}
             await update.message.reply_text(f"❌ El ZIP no contiene archivos {file_types[operation]} para procesar.")
-            os.remove(zip_path)
+            clear_user_data(chat_id)
             set_user_state(chat_id, IDLE)
             return
 
@@ -547,26 +483,25 @@ async def handle_specific_bulk_operation(update: Update, chat_id: int, operation
             return
 
         # Execute the operation directly
-        await send_processing_and_ad_message(update, f"🔄 Realizando operación: {operation_name}...")
+        async with job_workspace() as workspace:
+            async with processing_job(update, f"🔄 Realizando operación: {operation_name}...", JOB_COSTS['bulk']) as progress:
+                if operation == 3:
+                    # Use the ordered function for PDF concatenation
+                    new_zip_path = await pb_with_order(zip_path, current_files, operation, workspace, applicable_files)
+                else:
+                    new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, workspace, progress)
 
-        if operation == 3:
-            # Use the ordered function for PDF concatenation
-            new_zip_path = await pb_with_order(zip_path, current_files, operation, chat_id, applicable_files)
-        else:
-            new_zip_path = await perform_bulk_operation(zip_path, current_files, operation, chat_id)
-
-        if new_zip_path:
-            with open(new_zip_path, 'rb') as output_file:
-                await update.message.reply_document(
-                    document=output_file,
-                    filename=f"processed_{operation_name.lower().replace(' ', '_').replace('→', 'to')}_{file_name}",
-                    caption=f"✅ Operación completada: {operation_name}"
-                )
-            os.remove(new_zip_path)
-        else:
-            await update.message.reply_text("❌ Error procesando el archivo ZIP.")
+            if new_zip_path:
+                with open(new_zip_path, 'rb') as output_file:
+                    await update.message.reply_document(
+                        document=output_file,
+                        filename=f"processed_{operation_name.lower().replace(' ', '_').replace('→', 'to')}_{file_name}",
+                        caption=f"✅ Operación completada: {operation_name}"
+                    )
+            else:
+                await update.message.reply_text("❌ Error procesando el archivo ZIP.")
 
-        os.remove(zip_path)
+        clear_user_data(chat_id)
         set_user_state(chat_id, IDLE)
         await update.message.reply_text("¿En qué más puedo ayudarte?")
 
@@ -0,0 +1,96 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from .intent_router import build_intent_prompt, classify_with_models, classify_batch_with_models
+from .metrics import increment, observe
+
+load_dotenv()
+
+# Classifications requested within this many milliseconds share one LLM request (0 disables batching)
+INTENT_BATCH_WINDOW_MS = float(os.getenv("INTENT_BATCH_WINDOW_MS", 0))
+# Conversations per request; a full batch is sent without waiting for the window to close
+INTENT_BATCH_MAX_SIZE = int(os.getenv("INTENT_BATCH_MAX_SIZE", 8))
+
+# (system_prompt, conversation, future) waiting for the current window to close
+_pending = []
+_flush_timer = None
+# Batches being classified, referenced until they finish
+_batches = set()
+
+async def classify_conversation(system_prompt: str, conversation: list) -> dict:
+    """
+    Classify a conversation with the model cascade. With batching enabled, conversations
+    of different chats arriving within INTENT_BATCH_WINDOW_MS are sent together, so the
+    system prompt is paid once per batch instead of once per user.
+    """
+    global _flush_timer
+    if INTENT_BATCH_WINDOW_MS <= 0 or INTENT_BATCH_MAX_SIZE < 2:
+        intent, _ = await classify_with_models(build_intent_prompt(system_prompt, conversation))
+        return intent
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    # The turns are read when the window closes: keep them as they are now
+    _pending.append((system_prompt, list(conversation), future))
+    if len(_pending) >= INTENT_BATCH_MAX_SIZE:
+        _flush()
+    elif _flush_timer is None:
+        _flush_timer = loop.call_later(INTENT_BATCH_WINDOW_MS / 1000, _flush)
+    return await future
+
+def _flush():
+    """Close the window and start classifying what it collected"""
+    global _flush_timer
+    if _flush_timer is not None:
+        _flush_timer.cancel()
+        _flush_timer = None
+    # Callers that went away are not classified
+    items = [item for item in _pending if not item[2].done()]
+    _pending.clear()
+
+    # Conversations for different prompts (the prompt file was edited) cannot share a request
+    groups = {}
+    for item in items:
+        groups.setdefault(item[0], []).append(item)
+    for system_prompt, group in groups.items():
+        task = asyncio.ensure_future(_classify_batch(system_prompt, group))
+        _batches.add(task)
+        task.add_done_callback(_batches.discard)
+
+async def _classify_single(system_prompt: str, conversation: list, future):
+    """Classify one conversation on its own and hand the result to its caller"""
+    try:
+        intent, _ = await classify_with_models(build_intent_prompt(system_prompt, conversation))
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+        return
+    if not future.done():
+        future.set_result(intent)
+
+async def _classify_batch(system_prompt: str, items: list):
+    """Classify a batch in one request per model tier and fan the intents out to the callers"""
+    if len(items) == 1:
+        await _classify_single(*items[0])
+        return
+
+    increment('intent_batch.batches')
+    observe('intent_batch.size', len(items))
+    try:
+        results = await classify_batch_with_models(system_prompt, [conversation for _, conversation, _ in items])
+    except Exception as e:
+        for _, _, future in items:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    # Conversations the model left out of its answer are asked again one by one
+    missing = []
+    for item, result in zip(items, results):
+        if result is None:
+            missing.append(item)
+        elif not item[2].done():
+            item[2].set_result(result[0])
+    if missing:
+        increment('intent_batch.fallbacks', len(missing))
+        await asyncio.gather(*(_classify_single(*item) for item in missing))
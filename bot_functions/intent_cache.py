@@ -0,0 +1,90 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dotenv import load_dotenv
+from .intent_batcher import classify_conversation
+from .intent_rules import strip_accents
+from .intent_schema import is_consistent, INTENT_MIN_CONFIDENCE
+from .metrics import increment, get_counter, register_gauge, hit_rate
+
+load_dotenv()
+
+# Classifications of identical conversations, so repeated first messages skip the LLM
+INTENT_CACHE_TTL_SECONDS = float(os.getenv("INTENT_CACHE_TTL_SECONDS", 3600))
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", 10000))
+
+# key -> (expires_at, intent), least recently used first
+_entries = OrderedDict()
+# key -> task of the classification currently answering that conversation
+_inflight = {}
+
+def intent_cache_key(conversation: list, system_prompt: str) -> str:
+    """
+    Key of a conversation: its normalized turns plus the system prompt, so editing the
+    prompt never serves classifications made with the previous one.
+    """
+    # Case, accents and punctuation do not matter, page separators ("2-5" vs "2,5") do
+    turns = "\n".join(
+        f"{msg['role']}:{re.sub(r'[^a-z0-9,-]+', ' ', strip_accents(msg['message'])).strip()}"
+        for msg in conversation
+    )
+    payload = f"{system_prompt}\0{turns}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _get(key: str):
+    """Cached intent for key, dropping it when expired"""
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    expires_at, intent = entry
+    if expires_at < time.monotonic():
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return intent
+
+def _store(key: str, intent: dict):
+    """Remember an intent and drop the least recently used ones over INTENT_CACHE_SIZE"""
+    _entries[key] = (time.monotonic() + INTENT_CACHE_TTL_SECONDS, intent)
+    _entries.move_to_end(key)
+    while len(_entries) > INTENT_CACHE_SIZE:
+        _entries.popitem(last=False)
+        increment('intent_cache.evictions')
+
+async def _classify_and_store(key: str, system_prompt: str, conversation: list) -> dict:
+    """Ask the model cascade and cache the intent when it is a confident, consistent action selection"""
+    intent = await classify_conversation(system_prompt, conversation)
+    if intent['action'] and intent['confidence'] >= INTENT_MIN_CONFIDENCE and is_consistent(intent):
+        _store(key, intent)
+    return intent
+
+async def cached_classify(key: str, system_prompt: str, conversation: list) -> dict:
+    """
+    Classify a conversation with the model cascade behind the intent cache. Only action selections
+    are cached: clarification questions and errors always go back to the models. Concurrent
+    calls with the same key share a single in-flight request.
+    """
+    intent = _get(key)
+    if intent is not None:
+        increment('intent_cache.hits')
+        return dict(intent)
+
+    task = _inflight.get(key)
+    if task is not None:
+        increment('intent_cache.coalesced')
+    else:
+        increment('intent_cache.misses')
+        task = asyncio.ensure_future(_classify_and_store(key, system_prompt, conversation))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: a caller that goes away must not cancel the request the others wait for
+    return dict(await asyncio.shield(task))
+
+register_gauge('intent_cache.size', lambda: len(_entries))
+register_gauge('intent_cache.hit_rate', lambda: hit_rate(
+    get_counter('intent_cache.hits') + get_counter('intent_cache.coalesced'),
+    get_counter('intent_cache.misses')
+))
@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+from dotenv import load_dotenv
+from .intent_rules import normalize, load_intent_corpus, INTENT_CORPUS_FILE
+from .executor import run_io
+
+load_dotenv()
+
+# Opt-in: JSON lines of anonymized (text, action) pairs decided by the LLM. Empty disables logging.
+INTENT_LOG_FILE = os.getenv("INTENT_LOG_FILE", "")
+# Local classifier trained from that log with `python main.py --train-intent-model`
+INTENT_MODEL_FILE = os.getenv("INTENT_MODEL_FILE", "models/intent_model.json")
+# Probability the local model needs to answer without the LLM
+INTENT_MODEL_MIN_CONFIDENCE = float(os.getenv("INTENT_MODEL_MIN_CONFIDENCE", 0.9))
+# Accuracy gate: a trained model is only written when its answers are at least this precise
+INTENT_MODEL_MIN_PRECISION = float(os.getenv("INTENT_MODEL_MIN_PRECISION", 0.97))
+# Distinct logged messages needed before training
+INTENT_MODEL_MIN_EXAMPLES = int(os.getenv("INTENT_MODEL_MIN_EXAMPLES", 200))
+
+MODEL_VERSION = 1
+# Class 0 means "leave it to the LLM" (unsupported or ambiguous requests)
+CLASSES = list(range(21))
+MAX_LOGGED_LENGTH = 300
+
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_EMAIL = re.compile(r"\S+@\S+")
+_LONG_NUMBER = re.compile(r"\d{5,}")
+
+# Loaded model: {'weights': {feature: [weight per class]}, 'bias': [...]}, or None
+_model = None
+
+def anonymize(text: str) -> str:
+    """Drop URLs, e-mail addresses and long numbers (phones, ids) and normalize the text"""
+    text = _URL.sub(" url ", text)
+    text = _EMAIL.sub(" email ", text)
+    text = _LONG_NUMBER.sub(" numero ", text)
+    return normalize(text)[:MAX_LOGGED_LENGTH]
+
+def _append_line(path: str, line: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + "\n")
+
+async def log_intent_example(text: str, action: int):
+    """Append an anonymized (text, action) pair to INTENT_LOG_FILE when logging is enabled"""
+    if not INTENT_LOG_FILE:
+        return
+    try:
+        line = json.dumps({'text': anonymize(text), 'action': action, 'day': time.strftime('%Y-%m-%d')}, ensure_ascii=False)
+        await run_io(_append_line, INTENT_LOG_FILE, line)
+    except Exception as e:
+        print(f"Error logging intent example: {e}")
+
+def features(text: str) -> set:
+    """Words and character 3-5-grams of the normalized text"""
+    text = normalize(text)
+    found = {f"w:{word}" for word in text.split()}
+    padded = f" {text} "
+    for n in (3, 4, 5):
+        found.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return found
+
+def _probabilities(model: dict, feature_set: set) -> list:
+    """Softmax over the classes for a set of features"""
+    scores = list(model['bias'])
+    weights = model['weights']
+    for feature in feature_set:
+        row = weights.get(feature)
+        if row:
+            for index, weight in enumerate(row):
+                scores[index] += weight
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+def _predict(model: dict, text: str) -> tuple:
+    """Most likely class and its probability"""
+    probabilities = _probabilities(model, features(text))
+    best = max(range(len(probabilities)), key=probabilities.__getitem__)
+    return CLASSES[best], probabilities[best]
+
+def predict_intent(text: str):
+    """
+    Action (1-20) predicted by the local model when it is confident enough, or None when
+    there is no model, it is unsure, or it thinks the LLM should decide.
+    """
+    if _model is None or not text:
+        return None
+    action, probability = _predict(_model, text)
+    if action and probability >= INTENT_MODEL_MIN_CONFIDENCE:
+        return action
+    return None
+
+def _read_model(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        model = json.load(f)
+    if model.get('version') != MODEL_VERSION or model.get('classes') != CLASSES:
+        raise ValueError(f"unsupported model format in {path}")
+    return model
+
+async def load_intent_model():
+    """Load INTENT_MODEL_FILE if it exists; the bot works without it"""
+    global _model
+    if not os.path.exists(INTENT_MODEL_FILE):
+        return
+    try:
+        _model = await run_io(_read_model, INTENT_MODEL_FILE)
+        print(f"Loaded local intent model ({len(_model['weights'])} features, trained {_model.get('trained_at')})")
+    except Exception as e:
+        print(f"Error loading the local intent model: {e}")
+
+def _train(examples: list, epochs: int = 30, learning_rate: float = 0.5, l2: float = 1e-4) -> dict:
+    """Multinomial logistic regression on sparse binary features, trained with SGD"""
+    weights = {}
+    bias = [0.0] * len(CLASSES)
+    samples = [(features(text), CLASSES.index(label)) for text, label in examples]
+    rng = random.Random(0)
+    model = {'weights': weights, 'bias': bias}
+    for epoch in range(epochs):
+        rng.shuffle(samples)
+        rate = learning_rate / (1 + epoch)
+        for feature_set, label in samples:
+            probabilities = _probabilities(model, feature_set)
+            gradient = [p - (1.0 if index == label else 0.0) for index, p in enumerate(probabilities)]
+            for index, value in enumerate(gradient):
+                bias[index] -= rate * value
+            for feature in feature_set:
+                row = weights.get(feature)
+                if row is None:
+                    row = weights[feature] = [0.0] * len(CLASSES)
+                for index, value in enumerate(gradient):
+                    row[index] -= rate * (value + l2 * row[index])
+    # Small weights barely change predictions: drop them to keep the file and lookups small
+    model['weights'] = {
+        feature: [round(weight, 4) for weight in row]
+        for feature, row in weights.items() if max(abs(weight) for weight in row) >= 0.01
+    }
+    model['bias'] = [round(value, 4) for value in bias]
+    return model
+
+def _evaluate(model: dict, examples: list) -> tuple:
+    """Precision of the confident action answers and the share of examples answered"""
+    answered = correct = 0
+    for text, label in examples:
+        action, probability = _predict(model, text)
+        if action and probability >= INTENT_MODEL_MIN_CONFIDENCE:
+            answered += 1
+            correct += action == label
+    precision = correct / answered if answered else 0.0
+    return precision, answered / len(examples) if examples else 0.0
+
+def _load_logged_examples(path: str) -> list:
+    """Distinct logged texts with their most frequent action"""
+    votes = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                text, action = entry['text'], int(entry['action'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if text and action in CLASSES:
+                counts = votes.setdefault(text, {})
+                counts[action] = counts.get(action, 0) + 1
+    return [(text, max(counts, key=counts.get)) for text, counts in votes.items()]
+
+def train_intent_model(corpus_path: str = INTENT_CORPUS_FILE) -> int:
+    """
+    Train the local model from INTENT_LOG_FILE, check it on a held-out fifth of the log and
+    on the hand-labeled corpus, and write INTENT_MODEL_FILE only when both reach
+    INTENT_MODEL_MIN_PRECISION. Returns a process exit code.
+    """
+    if not INTENT_LOG_FILE or not os.path.exists(INTENT_LOG_FILE):
+        print("INTENT_LOG_FILE is not set or does not exist yet: enable logging and let the bot collect examples")
+        return 1
+    examples = _load_logged_examples(INTENT_LOG_FILE)
+    if len(examples) < INTENT_MODEL_MIN_EXAMPLES:
+        print(f"Only {len(examples)} distinct examples logged, {INTENT_MODEL_MIN_EXAMPLES} needed")
+        return 1
+
+    # Stable split: the same text always lands on the same side
+    held_out, training = [], []
+    for example in examples:
+        bucket = int(hashlib.md5(example[0].encode('utf-8')).hexdigest(), 16) % 5
+        (held_out if bucket == 0 else training).append(example)
+    corpus = [(normalize(message), label) for label, message in load_intent_corpus(corpus_path)]
+
+    started = time.perf_counter()
+    model = _train(training)
+    print(f"Trained on {len(training)} examples in {time.perf_counter() - started:.1f}s, {len(model['weights'])} features")
+
+    passed = True
+    for name, evaluation in (("held-out log", held_out), ("labeled corpus", corpus)):
+        precision, coverage = _evaluate(model, evaluation)
+        ok = precision >= INTENT_MODEL_MIN_PRECISION and coverage > 0
+        passed = passed and ok
+        print(f"{name}: precision {precision:.1%} answering {coverage:.0%} of {len(evaluation)} - {'OK' if ok else 'FAILED'}")
+
+    if not passed:
+        print(f"Model not written: precision must reach {INTENT_MODEL_MIN_PRECISION:.0%} on both sets")
+        return 1
+
+    # Final model uses every logged example
+    model = _train(examples)
+    model.update({'version': MODEL_VERSION, 'classes': CLASSES, 'trained_at': time.strftime('%Y-%m-%d %H:%M'), 'examples': len(examples)})
+    directory = os.path.dirname(INTENT_MODEL_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{INTENT_MODEL_FILE}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(model, f, separators=(',', ':'))
+    os.replace(temp_path, INTENT_MODEL_FILE)
+    print(f"Model written to {INTENT_MODEL_FILE}")
+    return 0
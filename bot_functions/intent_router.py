@@ -0,0 +1,168 @@
+import os
+import re
+import time
+from dotenv import load_dotenv
+from .gemini_client import complete, model_available, LLMUnavailableError, GEMINI_MODEL
+from .intent_schema import parse_intent_response, parse_batch_response, is_consistent
+from .metrics import increment, observe
+
+load_dotenv()
+
+# Models tried in order, cheapest and fastest first, each with the confidence its answer
+# needs to be accepted: "gemma-3-4b-it:0.9,gemma-3-12b-it:0.8,gemma-3-27b-it".
+# The last model always has the final word, so its threshold is ignored.
+INTENT_MODELS = os.getenv("INTENT_MODELS", GEMINI_MODEL)
+# The classifier answers with one short JSON object; longer answers are cut
+INTENT_MAX_OUTPUT_TOKENS = int(os.getenv("INTENT_MAX_OUTPUT_TOKENS", 150))
+# Threshold of the models listed without one
+DEFAULT_TIER_CONFIDENCE = 0.85
+
+def parse_model_tiers(spec: str) -> list:
+    """Parse INTENT_MODELS into a list of (model, min_confidence)"""
+    tiers = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        model, _, threshold = item.partition(':')
+        tiers.append((model.strip(), float(threshold) if threshold else DEFAULT_TIER_CONFIDENCE))
+    return tiers or [(GEMINI_MODEL, DEFAULT_TIER_CONFIDENCE)]
+
+MODEL_TIERS = parse_model_tiers(INTENT_MODELS)
+
+def build_intent_prompt(system_prompt: str, conversation: list) -> str:
+    """Prompt with the system instructions and the conversation turns, ending at the model's turn"""
+    conversation_text = ""
+    for msg in conversation:
+        conversation_text += f"<{msg['role']}>\n{msg['message']}\n\n"
+    return f"{system_prompt}\n\n{conversation_text}<ASSISTANT>"
+
+# Instructions appended to the system prompt when several conversations share one request
+BATCH_INSTRUCTIONS = """<BATCH>
+Esta vez recibirás varias conversaciones independientes de distintos usuarios, cada una entre <CONVERSATION id="N"> y </CONVERSATION>.
+Clasifica cada conversación por separado, sin usar información de las demás, y responde con un único array JSON en una sola línea, sin texto adicional, con un objeto por conversación que tenga los mismos campos de siempre más "id", el número de la conversación. Por ejemplo:
+[{"id": 1, "action": 1, "confidence": 0.95, "pages": null, "target_format": null, "quality": null, "message": null}, {"id": 2, "action": null, "confidence": 0.4, "pages": null, "target_format": null, "quality": null, "message": "Podrías mencionar qué archivo quieres convertir"}]
+</BATCH>"""
+
+# Users must not be able to close their conversation and write into someone else's
+_CONVERSATION_TAG = re.compile(r"</?\s*CONVERSATION[^>]*>", re.IGNORECASE)
+
+def build_batch_prompt(system_prompt: str, conversations: list) -> str:
+    """Prompt with the system instructions and several conversations, numbered from 1"""
+    blocks = []
+    for number, conversation in enumerate(conversations, 1):
+        turns = "".join(f"<{msg['role']}>\n{_CONVERSATION_TAG.sub('', msg['message'])}\n\n" for msg in conversation)
+        blocks.append(f'<CONVERSATION id="{number}">\n{turns}</CONVERSATION>')
+    return f"{system_prompt}\n\n{BATCH_INSTRUCTIONS}\n\n" + "\n\n".join(blocks) + "\n\n<ASSISTANT>"
+
+def _accepts(intent, min_confidence: float, proposals: list) -> bool:
+    """
+    Whether an intermediate tier's answer is good enough: a parsable, self-consistent
+    choice (an action, or 0 for "not available") that is confident and agrees with what
+    the previous tiers proposed. Clarification questions are left to the last tier.
+    """
+    if intent is None or intent['action'] is None:
+        return False
+    if intent['confidence'] < min_confidence or not is_consistent(intent):
+        return False
+    return all(action == intent['action'] for _, action in proposals)
+
+def _record_agreement(proposals: list, final_action):
+    """Count how often escalated tiers had proposed the action finally chosen (their accuracy proxy)"""
+    for model, action in proposals:
+        increment(f'intent_router.{model}.agreed' if action == final_action else f'intent_router.{model}.overruled')
+
+async def classify_with_models(prompt: str, tiers: list = None) -> tuple[dict, str]:
+    """
+    Classify a prompt with the model cascade and return the intent and the model that
+    decided it. Each tier escalates to the next one when it fails or its answer is
+    unparsable, unsure, inconsistent or disagrees with an earlier tier. Models whose
+    circuit breaker is open are skipped; LLMUnavailableError is raised when none is left.
+    """
+    tiers = [(model, threshold) for model, threshold in tiers or MODEL_TIERS if model_available(model)]
+    if not tiers:
+        increment('intent_router.unavailable')
+        raise LLMUnavailableError("No intent model is available")
+
+    # (model, action) proposed by the tiers that escalated
+    proposals = []
+    for index, (model, min_confidence) in enumerate(tiers):
+        is_last = index == len(tiers) - 1
+        started = time.perf_counter()
+        increment(f'intent_router.{model}.calls')
+        try:
+            response = await complete(prompt, model=model, max_output_tokens=INTENT_MAX_OUTPUT_TOKENS)
+        except Exception as e:
+            increment(f'intent_router.{model}.failed')
+            if is_last:
+                raise
+            print(f"Intent model {model} failed ({type(e).__name__}: {e}), escalating")
+            increment(f'intent_router.{model}.escalated')
+            continue
+        finally:
+            observe(f'intent_router.{model}.latency_ms', (time.perf_counter() - started) * 1000)
+
+        intent = parse_intent_response(response, strict=not is_last)
+        if intent is None:
+            increment(f'intent_router.{model}.unparsable')
+        if is_last or _accepts(intent, min_confidence, proposals):
+            increment(f'intent_router.{model}.decided')
+            _record_agreement(proposals, intent['action'])
+            return intent, model
+
+        increment(f'intent_router.{model}.escalated')
+        if intent is not None and intent['action'] is not None:
+            proposals.append((model, intent['action']))
+
+async def classify_batch_with_models(system_prompt: str, conversations: list, tiers: list = None) -> list:
+    """
+    Classify several conversations with the model cascade, one request per tier for all
+    of them. Conversations accepted by a tier are settled; the rest go together to the next
+    tier. Returns (intent, model) for every conversation in order, or None for those the
+    last tier left out of its answer. LLMUnavailableError or the error of the last tier is
+    raised for the whole batch.
+    """
+    tiers = [(model, threshold) for model, threshold in tiers or MODEL_TIERS if model_available(model)]
+    if not tiers:
+        increment('intent_router.unavailable')
+        raise LLMUnavailableError("No intent model is available")
+
+    results = [None] * len(conversations)
+    # (model, action) proposed for each conversation by the tiers that escalated it
+    proposals = [[] for _ in conversations]
+    pending = list(range(len(conversations)))
+    for index, (model, min_confidence) in enumerate(tiers):
+        is_last = index == len(tiers) - 1
+        prompt = build_batch_prompt(system_prompt, [conversations[position] for position in pending])
+        started = time.perf_counter()
+        increment(f'intent_router.{model}.calls')
+        try:
+            response = await complete(prompt, model=model, max_output_tokens=INTENT_MAX_OUTPUT_TOKENS * len(pending))
+        except Exception as e:
+            increment(f'intent_router.{model}.failed')
+            if is_last:
+                raise
+            print(f"Intent model {model} failed on a batch of {len(pending)} ({type(e).__name__}: {e}), escalating")
+            increment(f'intent_router.{model}.escalated', len(pending))
+            continue
+        finally:
+            observe(f'intent_router.{model}.latency_ms', (time.perf_counter() - started) * 1000)
+
+        escalated = []
+        for position, intent in zip(pending, parse_batch_response(response, len(pending))):
+            if intent is None:
+                increment(f'intent_router.{model}.unparsable')
+            if (is_last and intent is not None) or _accepts(intent, min_confidence, proposals[position]):
+                increment(f'intent_router.{model}.decided')
+                _record_agreement(proposals[position], intent['action'])
+                results[position] = (intent, model)
+                continue
+            if not is_last:
+                increment(f'intent_router.{model}.escalated')
+                if intent is not None and intent['action'] is not None:
+                    proposals[position].append((model, intent['action']))
+                escalated.append(position)
+        pending = escalated
+        if not pending:
+            break
+    return results
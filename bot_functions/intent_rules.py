@@ -0,0 +1,204 @@
+import os
+import re
+import unicodedata
+
+# Local intent classifier for the common, unambiguous requests ("unir pdfs", "png a jpg").
+# It only answers when exactly one action matches; anything else goes to the LLM.
+
+# Longer messages usually carry conditions or several requests: leave them to the LLM
+MAX_RULE_WORDS = 25
+
+# Labeled messages used to measure the rules and the local intent model, relative to the project
+INTENT_CORPUS_FILE = "prompts/intent_corpus.tsv"
+
+# Multi-word names replaced by a single format token before matching
+_PHRASES = [
+    (r"\bhojas? de calculo\b", "excel"),
+    (r"\bpower ?points?\b", "pptx"),
+    (r"\bdocumentos? de word\b", "word"),
+    (r"\barchivos? comprimidos?\b", "zip"),
+    (r"\bcarpetas? comprimidas?\b", "zip"),
+]
+
+# Format token -> format name
+_FORMATS = {
+    'pdf': 'pdf', 'pdfs': 'pdf',
+    'word': 'word', 'docx': 'word', 'doc': 'word',
+    'excel': 'excel', 'xlsx': 'excel', 'xls': 'excel',
+    'csv': 'csv',
+    'pptx': 'pptx', 'ppt': 'pptx', 'presentacion': 'pptx', 'presentaciones': 'pptx', 'diapositivas': 'pptx',
+    'png': 'png', 'pngs': 'png',
+    'jpg': 'jpg', 'jpeg': 'jpg', 'jpgs': 'jpg', 'jpegs': 'jpg',
+    'svg': 'svg', 'svgs': 'svg',
+    'imagen': 'image', 'imagenes': 'image', 'foto': 'image', 'fotos': 'image',
+    'zip': 'zip', 'zips': 'zip', 'comprimido': 'zip',
+}
+_FORMAT_WORDS = "|".join(sorted(_FORMATS, key=len, reverse=True))
+# "a PNG", "en formato jpg", "to pdf": the format after the connector is the target
+_TARGET = re.compile(rf"\b(?:a|al|en|to|hacia|para)\s+(?:(?:un|una|el|la|formato|archivo|documento|tipo)\s+)*({_FORMAT_WORDS})\b")
+_FORMAT = re.compile(rf"\b({_FORMAT_WORDS})\b")
+
+_MERGE = re.compile(r"\b(?:un(?:ir|e|an|irlos|irlas)|junt\w*|combin\w*|concaten\w*|fusion\w*|merge|mezcl\w*)\b")
+_DELETE = re.compile(r"\b(?:elimin\w*|borr\w*|quit\w*|remov\w*|suprim\w*)\b")
+_EXTRACT = re.compile(r"\b(?:extra\w*|sac\w*|separ\w*|obten\w*)\b")
+_REORDER = re.compile(r"\b(?:reorden\w*|orden\w*|reorganiz\w*)\b|\bcambi\w* (?:el )?orden\b")
+_PAGES = re.compile(r"\b(?:paginas?|pags?|hojas?)\b")
+_COMPRESS = re.compile(r"\b(?:comprim\w*|empaquet\w*)\b|\b(?:cre\w*|hac\w*|gener\w*|arm\w*)\s+(?:(?:un|una|el|archivo|nuevo)\s+)*zip\b")
+_DECOMPRESS = re.compile(r"\b(?:descomprim\w*|unzip|abr\w*|desempaquet\w*)\b")
+_LIST = re.compile(r"\b(?:list\w*|ver|mostr\w*|muestr\w*|contenido|contiene|revis\w*)\b|\bque (?:hay|tiene)\b")
+_ADD = re.compile(r"\b(?:agreg\w*|anad\w*|met\w*|inclu\w*|insert\w*|adjunt\w*)\b")
+_TWO = re.compile(r"\b(?:dos|2|ambos|un par de)\b|\bcon otro\b")
+_NEGATION = re.compile(r"\b(?:no|nunca|tampoco|sin)\b")
+# Several steps in one message ("unir y luego comprimir") are left to the LLM
+_SEQUENCE = re.compile(r"\b(?:luego|despues|entonces|ademas|tambien|primero)\b")
+
+# Source formats accepted by each image conversion
+_TO_PNG_SOURCES = {'jpg', 'svg', 'pdf', 'image'}
+_TO_JPG_SOURCES = {'png', 'svg', 'pdf', 'image'}
+
+# Page selections like "paginas 2-5", "pagina 3", "hojas 1, 4 y 7 a 9", "todas las paginas"
+_PAGE_LIST = re.compile(r"\b(?:paginas?|pags?|hojas?)\s+((?:\d+(?:\s*(?:-|a|al|hasta)\s*\d+)?(?:\s*(?:,|y|e)\s*)?)+)")
+_PAGE_ITEM = re.compile(r"(\d+)(?:\s*(?:-|a|al|hasta)\s*(\d+))?")
+_ALL_PAGES = re.compile(r"\btodas las (?:paginas|hojas)\b")
+_QUALITY = re.compile(r"\bcalidad\s+(baja|media|alta|maxima)\b|\b(baja|media|alta|maxima)\s+calidad\b")
+# Format name -> target_format of the intent schema
+_TARGET_FORMATS = {'pdf': 'pdf', 'word': 'docx', 'excel': 'xlsx', 'csv': 'csv', 'png': 'png', 'jpg': 'jpeg'}
+
+def strip_accents(text: str) -> str:
+    """Lowercase text without accents"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation so rules match regardless of spelling details"""
+    text = text.replace('→', ' a ').replace('->', ' a ')
+    text = re.sub(r"[^a-z0-9]+", " ", strip_accents(text)).strip()
+    for pattern, replacement in _PHRASES:
+        text = re.sub(pattern, replacement, text)
+    return text
+
+def _conversion(text: str, in_zip: bool) -> set:
+    """Conversion actions implied by 'X a Y' style requests"""
+    targets = list(_TARGET.finditer(text))
+    if not targets:
+        return set()
+    target_match = targets[-1]
+    target = _FORMATS[target_match.group(1)]
+    sources = {
+        _FORMATS[m.group(1)] for m in _FORMAT.finditer(text)
+        if m.start() != target_match.start(1)
+    } - {'zip'}
+
+    # Converting to the format the file already has needs a clarification
+    if target in sources:
+        return set()
+
+    if target == 'png' and sources <= _TO_PNG_SOURCES:
+        return {11 if in_zip else 14}
+    if target == 'jpg' and sources <= _TO_JPG_SOURCES:
+        return {12 if in_zip else 15}
+    if in_zip:
+        return set()
+    if target == 'pdf' and sources == {'word'}:
+        return {16}
+    if target == 'pdf' and sources == {'pptx'}:
+        return {20}
+    if target == 'word' and sources == {'pdf'}:
+        return {17}
+    if target == 'excel' and sources == {'csv'}:
+        return {18}
+    if target == 'csv' and sources == {'excel'}:
+        return {19}
+    return set()
+
+def _candidates(text: str) -> set:
+    """Every action whose rule matches the normalized text"""
+    formats = {_FORMATS[m.group(1)] for m in _FORMAT.finditer(text)}
+    in_zip = 'zip' in formats
+    candidates = _conversion(text, in_zip)
+
+    if in_zip:
+        # Operations on a ZIP (or on the files inside it)
+        if _MERGE.search(text) and 'pdf' in formats:
+            candidates.add(13)
+        elif _DELETE.search(text):
+            candidates.add(10)
+        elif _ADD.search(text) and not _COMPRESS.search(text):
+            candidates.add(9)
+        if (_DECOMPRESS.search(text) or _EXTRACT.search(text)) and not candidates:
+            candidates.add(7)
+        if _LIST.search(text) and not candidates:
+            candidates.add(8)
+        if _COMPRESS.search(text) and not candidates:
+            candidates.add(6)
+        return candidates
+
+    if _COMPRESS.search(text):
+        candidates.add(6)
+
+    if _PAGES.search(text) and formats <= {'pdf'}:
+        if _DELETE.search(text):
+            candidates.add(3)
+        if _EXTRACT.search(text):
+            candidates.add(4)
+        if _REORDER.search(text):
+            candidates.add(5)
+    elif _MERGE.search(text) and formats == {'pdf'}:
+        candidates.add(1 if _TWO.search(text) else 2)
+
+    return candidates
+
+def classify_intent(message: str):
+    """
+    Return the action number (1-20) when the message matches exactly one rule, or None
+    when it is ambiguous, negated, too long or not covered and the LLM should decide.
+    """
+    if not message:
+        return None
+    text = normalize(message)
+    if not text or len(text.split()) > MAX_RULE_WORDS:
+        return None
+    if _NEGATION.search(text) or _SEQUENCE.search(text):
+        return None
+    candidates = _candidates(text)
+    return candidates.pop() if len(candidates) == 1 else None
+
+def extract_parameters(message: str) -> dict:
+    """
+    Details already stated in the message, with the keys of the intent schema: pages
+    ("2-5,7" or "todas"), target_format and quality. Unknown details are left out.
+    """
+    params = {}
+    text = strip_accents(message or "")
+
+    page_list = _PAGE_LIST.search(text)
+    if page_list:
+        params['pages'] = ",".join(
+            f"{start}-{end}" if end else start for start, end in _PAGE_ITEM.findall(page_list.group(1))
+        )
+    elif _ALL_PAGES.search(text):
+        params['pages'] = "todas"
+
+    quality = _QUALITY.search(text)
+    if quality:
+        params['quality'] = quality.group(1) or quality.group(2)
+
+    targets = list(_TARGET.finditer(normalize(message or "")))
+    if targets:
+        target_format = _TARGET_FORMATS.get(_FORMATS[targets[-1].group(1)])
+        if target_format:
+            params['target_format'] = target_format
+    return params
+
+def load_intent_corpus(path: str = INTENT_CORPUS_FILE) -> list:
+    """Read (expected_action, message) pairs; 0 means the message must go to the LLM"""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    with open(os.path.join(project_dir, path), 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            label, message = line.split('\t', 1)
+            samples.append((int(label), message))
+    return samples
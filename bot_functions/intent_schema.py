@@ -0,0 +1,146 @@
+import os
+import re
+import json
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Structured answer of the intent classifier:
+#   action         1-20, 0 when the request is not supported, None when details are missing
+#   confidence     0-1, how sure the classifier is about the action
+#   pages          page selection already given by the user, like "2-5" or "1,3,7-9" or "todas"
+#   target_format  format the user wants to obtain (png, jpeg, pdf, docx, xlsx, csv)
+#   quality        render preset for PDF pages (baja, media, alta, maxima)
+#   message        text for the user: a clarification question or why the action is not available
+INTENT_FIELDS = ('action', 'confidence', 'pages', 'target_format', 'quality', 'message')
+
+TARGET_FORMATS = {'png', 'jpeg', 'pdf', 'docx', 'xlsx', 'csv'}
+QUALITY_PRESETS = {'baja', 'media', 'alta', 'maxima'}
+# Actions chosen by the LLM with a lower confidence are confirmed with the user first, never cached
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", 0.6))
+# Longest message accepted from the classifier
+MAX_MESSAGE_LENGTH = 500
+
+# Format produced by each conversion action, to catch answers that contradict themselves
+ACTION_TARGET_FORMATS = {11: 'png', 12: 'jpeg', 14: 'png', 15: 'jpeg', 16: 'pdf', 17: 'docx', 18: 'xlsx', 19: 'csv', 20: 'pdf'}
+
+_FORMAT_ALIASES = {'jpg': 'jpeg', 'word': 'docx', 'doc': 'docx', 'excel': 'xlsx', 'xls': 'xlsx'}
+_PAGE_SPEC = re.compile(r"^(?:todas|\d+(?:-\d+)?(?:,\d+(?:-\d+)?)*)$")
+_LEGACY_ACTION = re.compile(r"Acción:\s*(\d+)")
+
+def empty_intent() -> dict:
+    """An intent with every field unknown"""
+    return dict.fromkeys(INTENT_FIELDS)
+
+def _json_object(text: str):
+    """The first JSON object in text, tolerating code fences and surrounding prose"""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def validate_intent(raw: dict) -> dict:
+    """Keep the fields of raw that have a valid type and value; the rest are left unknown"""
+    intent = empty_intent()
+
+    action = raw.get('action')
+    if isinstance(action, str) and action.strip().isdigit():
+        action = int(action)
+    if isinstance(action, int) and not isinstance(action, bool) and 0 <= action <= 20:
+        intent['action'] = action
+
+    confidence = raw.get('confidence')
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool):
+        intent['confidence'] = min(max(float(confidence), 0.0), 1.0)
+    elif intent['action'] is not None:
+        intent['confidence'] = 1.0
+
+    pages = raw.get('pages')
+    if isinstance(pages, (str, int)) and not isinstance(pages, bool):
+        pages = str(pages).lower().strip()
+        pages = re.sub(r"\s+(?:a|al|hasta)\s+", "-", re.sub(r"\s+(?:y|e)\s+", ",", pages)).replace(' ', '')
+        if _PAGE_SPEC.match(pages):
+            intent['pages'] = pages
+
+    target_format = raw.get('target_format')
+    if isinstance(target_format, str):
+        target_format = target_format.lower().strip().lstrip('.')
+        target_format = _FORMAT_ALIASES.get(target_format, target_format)
+        if target_format in TARGET_FORMATS:
+            intent['target_format'] = target_format
+
+    quality = raw.get('quality')
+    if isinstance(quality, str):
+        quality = quality.lower().strip().replace('á', 'a')
+        if quality in QUALITY_PRESETS:
+            intent['quality'] = quality
+
+    message = raw.get('message')
+    if isinstance(message, str) and message.strip():
+        intent['message'] = message.strip()[:MAX_MESSAGE_LENGTH]
+
+    return intent
+
+def parse_intent_response(text: str, strict: bool = False):
+    """
+    Parse the classifier answer into an intent. Answers in the previous plain-text format
+    ("Acción: N") are still understood; any other text becomes the message for the user.
+    With strict, anything but a JSON object returns None.
+    """
+    text = (text or "").strip()
+    raw = _json_object(text)
+    if raw is not None:
+        return validate_intent(raw)
+    if strict:
+        return None
+
+    intent = empty_intent()
+    match = _LEGACY_ACTION.search(text)
+    if match and 1 <= int(match.group(1)) <= 20:
+        intent['action'] = int(match.group(1))
+        intent['confidence'] = 1.0
+    elif text:
+        intent['message'] = text[:MAX_MESSAGE_LENGTH]
+    return intent
+
+def parse_batch_response(text: str, count: int) -> list:
+    """
+    Parse the answer to a batch of conversations: a JSON array with one intent object per
+    conversation, each carrying its "id" (1 to count). Returns a list with the intent of
+    every conversation in order, None for those missing or malformed in the answer.
+    """
+    intents = [None] * count
+    text = (text or "").strip()
+    start = text.find('[')
+    end = text.rfind(']')
+    if start == -1 or end <= start:
+        return intents
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return intents
+    if not isinstance(items, list):
+        return intents
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = item.get('id')
+        if isinstance(item_id, str) and item_id.strip().isdigit():
+            item_id = int(item_id)
+        if isinstance(item_id, int) and not isinstance(item_id, bool) and 1 <= item_id <= count and intents[item_id - 1] is None:
+            intents[item_id - 1] = validate_intent(item)
+    return intents
+
+def is_consistent(intent: dict) -> bool:
+    """False when the target format contradicts the format the chosen action produces"""
+    expected = ACTION_TARGET_FORMATS.get(intent['action'])
+    return not (expected and intent['target_format'] and intent['target_format'] != expected)
+
+def intent_to_json(intent: dict) -> str:
+    """Compact JSON of an intent, as kept in the conversation history"""
+    return json.dumps({field: intent[field] for field in INTENT_FIELDS}, ensure_ascii=False, separators=(',', ':'))
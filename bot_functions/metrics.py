@@ -0,0 +1,63 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Chats allowed to read the metrics with /metrics (comma-separated chat ids)
+ADMIN_CHAT_IDS = {int(chat_id) for chat_id in os.getenv("ADMIN_CHAT_IDS", "").replace(' ', '').split(',') if chat_id}
+
+# name -> count, since the process started
+_counters = {}
+# name -> callable returning a value computed when the metrics are read (sizes, states)
+_gauges = {}
+# name -> [count, total, max] of observed values such as latencies
+_summaries = {}
+
+def increment(name: str, amount: int = 1):
+    """Add amount to a counter"""
+    _counters[name] = _counters.get(name, 0) + amount
+
+def get_counter(name: str) -> int:
+    """Current value of a counter"""
+    return _counters.get(name, 0)
+
+def observe(name: str, value: float):
+    """Record one sample of a distribution, reported as its count, average and maximum"""
+    summary = _summaries.get(name)
+    if summary is None:
+        summary = _summaries[name] = [0, 0.0, value]
+    summary[0] += 1
+    summary[1] += value
+    summary[2] = max(summary[2], value)
+
+def register_gauge(name: str, read):
+    """Report the value returned by read() under name every time the metrics are read"""
+    _gauges[name] = read
+
+def hit_rate(hits: int, misses: int) -> float:
+    """Share of lookups answered from a cache"""
+    total = hits + misses
+    return hits / total if total else 0.0
+
+def snapshot() -> dict:
+    """All counters and gauges, sorted by name"""
+    values = dict(_counters)
+    for name, (count, total, maximum) in _summaries.items():
+        values[f"{name}.count"] = count
+        values[f"{name}.avg"] = total / count
+        values[f"{name}.max"] = maximum
+    for name, read in _gauges.items():
+        try:
+            values[name] = read()
+        except Exception as e:
+            values[name] = f"error: {e}"
+    return dict(sorted(values.items()))
+
+def format_metrics() -> str:
+    """Metrics as text lines for the /metrics command"""
+    lines = []
+    for name, value in snapshot().items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines) if lines else "Sin métricas todavía."
@@ -0,0 +1,182 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from telegram.error import BadRequest
+from .executor import run_io
+
+load_dotenv()
+
+# Results of previous conversions, keyed by input file and operation
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bot_result_cache"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+# key -> {'path', 'size', 'filename', 'caption', 'file_id', 'text'}, least recently used first
+_entries = OrderedDict()
+_total_size = 0
+# Results left on disk by a previous run are indexed on first use (or from post_init), not at import
+_loaded = False
+_load_lock = threading.Lock()
+
+def cache_key(file_unique_id: str, operation: str, **params) -> str:
+    """Build the cache key of an operation applied to a Telegram file with the given parameters"""
+    payload = json.dumps([file_unique_id, operation, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def load_result_cache():
+    """Index the results left on disk by a previous run once; blocking, so call it through run_io"""
+    global _loaded
+    with _load_lock:
+        if _loaded:
+            return
+        try:
+            _load_existing_entries()
+            _remove_files(_evict())
+        except Exception as e:
+            print(f"Error loading the result cache: {e}")
+        _loaded = True
+
+def _load_existing_entries():
+    """Index results left on disk by a previous run, oldest first"""
+    global _total_size
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    stored = []
+    for name in os.listdir(RESULT_CACHE_DIR):
+        path = os.path.join(RESULT_CACHE_DIR, name)
+        key, _, filename = name.partition('_')
+        if len(key) != 64 or not filename or not os.path.isfile(path):
+            continue
+        stored.append((os.path.getmtime(path), key, path, filename))
+
+    for _, key, path, filename in sorted(stored):
+        size = os.path.getsize(path)
+        _entries[key] = {'path': path, 'size': size, 'filename': filename, 'caption': None, 'file_id': None, 'text': None}
+        _total_size += size
+
+def _evict() -> list:
+    """Drop least recently used results until the cache fits its size budget; returns their files"""
+    global _total_size
+    paths = []
+    while _total_size > RESULT_CACHE_MAX_BYTES and _entries:
+        _, entry = _entries.popitem(last=False)
+        _total_size -= entry['size']
+        if entry['path']:
+            paths.append(entry['path'])
+    return paths
+
+def _forget(key: str) -> list:
+    """Drop a result from the index; returns its file, if any"""
+    global _total_size
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return []
+    _total_size -= entry['size']
+    return [entry['path']] if entry['path'] else []
+
+def _remove_files(paths: list):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _touch(path: str) -> bool:
+    """Mark a cached file as recently used; False when it is gone"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+async def get_cached_result(key: str):
+    """Get a cached result and mark it as recently used, or None"""
+    if not _loaded:
+        await run_io(load_result_cache)
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    if entry['path'] and not await run_io(_touch, entry['path']):
+        _forget(key)
+        return None
+    _entries.move_to_end(key)
+    return entry
+
+async def forget_result(key: str):
+    """Drop a result from the cache"""
+    paths = _forget(key)
+    if paths:
+        await run_io(_remove_files, paths)
+
+def _store_file(key: str, source, filename: str) -> tuple[str, int]:
+    """Copy an output file (path or bytes) into the cache directory"""
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(RESULT_CACHE_DIR, f"{key}_{os.path.basename(filename)}")
+    if isinstance(source, (bytes, bytearray)):
+        with open(path, 'wb') as f:
+            f.write(source)
+    else:
+        shutil.copyfile(source, path)
+    return path, os.path.getsize(path)
+
+async def cache_result(key: str, source, filename: str, caption: str = None, sent_message=None):
+    """
+    Store a conversion output (path or bytes) under key.
+    When sent_message is the reply that delivered it, its file_id is kept so a later
+    hit can be answered without uploading the file again.
+    """
+    global _total_size
+    try:
+        if not _loaded:
+            await run_io(load_result_cache)
+        await forget_result(key)
+        path, size = await run_io(_store_file, key, source, filename)
+        file_id = sent_message.document.file_id if sent_message and sent_message.document else None
+        _entries[key] = {'path': path, 'size': size, 'filename': filename, 'caption': caption, 'file_id': file_id, 'text': None}
+        _total_size += size
+        evicted = _evict()
+        if evicted:
+            await run_io(_remove_files, evicted)
+    except Exception as e:
+        print(f"Error storing result in cache: {e}")
+
+async def cache_text(key: str, text: str):
+    """Store a text result, such as a ZIP listing"""
+    global _total_size
+    if not _loaded:
+        await run_io(load_result_cache)
+    evicted = _forget(key)
+    size = len(text.encode('utf-8'))
+    _entries[key] = {'path': None, 'size': size, 'filename': None, 'caption': None, 'file_id': None, 'text': text}
+    _total_size += size
+    evicted += _evict()
+    if evicted:
+        await run_io(_remove_files, evicted)
+
+async def send_cached_result(message, key: str) -> bool:
+    """
+    Answer with a previously produced result, re-sending its Telegram file_id when known.
+    Returns False on a cache miss.
+    """
+    entry = await get_cached_result(key)
+    if entry is None:
+        return False
+
+    if entry['text'] is not None:
+        await message.reply_text(entry['text'])
+        return True
+
+    if entry['file_id']:
+        try:
+            await message.reply_document(document=entry['file_id'], caption=entry['caption'])
+            return True
+        except BadRequest:
+            # The file_id is no longer valid for this bot: upload the cached copy instead
+            entry['file_id'] = None
+
+    with open(entry['path'], 'rb') as cached_file:
+        sent = await message.reply_document(document=cached_file, filename=entry['filename'], caption=entry['caption'])
+    if sent and sent.document:
+        entry['file_id'] = sent.document.file_id
+    return True
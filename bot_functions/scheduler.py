@@ -0,0 +1,180 @@
+import os
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Concurrency limits, configurable from the environment (.env)
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", 4))
+MAX_JOBS_PER_CHAT = int(os.getenv("MAX_JOBS_PER_CHAT", 1))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", 50))
+# Minimum seconds between two queue position updates sent to the same waiting job
+QUEUE_UPDATE_INTERVAL = float(os.getenv("QUEUE_UPDATE_INTERVAL", 2))
+
+# Relative cost of each kind of job. Heavier jobs advance their chat's
+# virtual clock further, so a user sending many heavy jobs is served after
+# users with light ones (weighted fair queuing).
+JOB_COSTS = {
+    'pdf': 1,
+    'image': 1,
+    'zip': 2,
+    'spreadsheet': 2,
+    'document': 4,
+    'render': 4,
+    'bulk': 6,
+}
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is full and a new job is rejected"""
+    def __init__(self):
+        super().__init__("El bot está procesando demasiados archivos en este momento. Inténtalo de nuevo en unos minutos.")
+
+class _Job:
+    __slots__ = ('chat_id', 'start_tag', 'finish_tag', 'sequence', 'granted', 'moved')
+
+    def __init__(self, chat_id, start_tag, finish_tag, sequence):
+        self.chat_id = chat_id
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.sequence = sequence
+        self.granted = asyncio.get_running_loop().create_future()
+        # Set whenever the waiting queue changes, so the job's position may have too
+        self.moved = asyncio.Event()
+
+class JobScheduler:
+    """
+    Admission control for conversions: a global cap on running jobs, a cap per chat,
+    a bounded waiting queue and weighted fair ordering between chats.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_chat: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_chat = max_per_chat
+        self.max_queued = max_queued
+        self.running = 0
+        self.running_per_chat = {}
+        self.waiting = []
+        self.virtual_time = 0.0
+        self.last_finish_tag = {}
+        self._sequence = itertools.count()
+
+    def queue_position(self, job: _Job) -> int:
+        """1-based position of a waiting job in dispatch order"""
+        return sorted(self.waiting, key=self._order).index(job) + 1
+
+    @staticmethod
+    def _order(job: _Job):
+        return (job.finish_tag, job.sequence)
+
+    def _can_run(self, chat_id) -> bool:
+        return (self.running < self.max_concurrent
+                and self.running_per_chat.get(chat_id, 0) < self.max_per_chat)
+
+    def _grant(self, job: _Job):
+        self.running += 1
+        self.running_per_chat[job.chat_id] = self.running_per_chat.get(job.chat_id, 0) + 1
+        self.virtual_time = max(self.virtual_time, job.start_tag)
+        job.granted.set_result(True)
+
+    def _queue_changed(self):
+        """Wake the position reporters of the waiting jobs"""
+        for job in self.waiting:
+            job.moved.set()
+
+    def _dispatch(self):
+        """Start waiting jobs in finish-tag order while capacity is available"""
+        started = False
+        for job in sorted(self.waiting, key=self._order):
+            if self.running >= self.max_concurrent:
+                break
+            if self._can_run(job.chat_id):
+                self.waiting.remove(job)
+                self._grant(job)
+                started = True
+        if started:
+            self._queue_changed()
+
+    async def _report_position(self, job: _Job, on_queued):
+        """
+        Await on_queued(position) when the job starts waiting and again every time its
+        position changes, at most once per QUEUE_UPDATE_INTERVAL, until it is granted.
+        """
+        shown = None
+        while job in self.waiting:
+            job.moved.clear()
+            position = self.queue_position(job)
+            if position != shown:
+                shown = position
+                await on_queued(position)
+                await asyncio.sleep(QUEUE_UPDATE_INTERVAL)
+                # The job may have been granted while the update was sent
+                continue
+            await job.moved.wait()
+
+    def _release(self, chat_id):
+        self.running -= 1
+        remaining = self.running_per_chat.get(chat_id, 1) - 1
+        if remaining > 0:
+            self.running_per_chat[chat_id] = remaining
+        else:
+            self.running_per_chat.pop(chat_id, None)
+        self._dispatch()
+        self._forget_idle_chats()
+
+    def _forget_idle_chats(self):
+        """Drop fairness bookkeeping of chats that no longer have pending work"""
+        if not self.waiting and self.running == 0:
+            self.last_finish_tag.clear()
+            self.virtual_time = 0.0
+            return
+        active = {job.chat_id for job in self.waiting} | set(self.running_per_chat)
+        for chat_id, finish_tag in list(self.last_finish_tag.items()):
+            if chat_id not in active and finish_tag <= self.virtual_time:
+                del self.last_finish_tag[chat_id]
+
+    @asynccontextmanager
+    async def slot(self, chat_id, cost: float = 1, on_queued=None):
+        """
+        Hold a processing slot for the duration of the block.
+        on_queued(position) is awaited when the job has to wait for a free slot and again
+        whenever its place in the queue changes, until the slot is granted.
+        """
+        if len(self.waiting) >= self.max_queued:
+            raise QueueFullError()
+
+        start_tag = max(self.virtual_time, self.last_finish_tag.get(chat_id, 0))
+        job = _Job(chat_id, start_tag, start_tag + cost, next(self._sequence))
+        self.last_finish_tag[chat_id] = job.finish_tag
+        self.waiting.append(job)
+        # A job of a lighter chat may sort ahead of the ones already waiting
+        self._queue_changed()
+        self._dispatch()
+
+        reporter = None
+        try:
+            if not job.granted.done():
+                if on_queued:
+                    reporter = asyncio.create_task(self._report_position(job, on_queued))
+                await job.granted
+        except BaseException:
+            if job in self.waiting:
+                self.waiting.remove(job)
+                self._queue_changed()
+            elif job.granted.done():
+                self._release(chat_id)
+            raise
+        finally:
+            if reporter is not None:
+                # Stop the position updates before the caller replaces the status message
+                reporter.cancel()
+                await asyncio.gather(reporter, return_exceptions=True)
+
+        try:
+            yield
+        finally:
+            self._release(chat_id)
+
+# Global scheduler shared by all handlers
+job_scheduler = JobScheduler(MAX_CONCURRENT_JOBS, MAX_JOBS_PER_CHAT, MAX_QUEUED_JOBS)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from .executor import run_io
+
+class MemoryBackend:
+    """Keeps nothing outside the process: sessions live only in the in-memory session store"""
+    durable = False
+
+    async def load(self, chat_id):
+        return None
+
+    async def save_many(self, records: dict):
+        pass
+
+    async def purge_expired(self, ttl: float) -> list:
+        return []
+
+    async def close(self):
+        pass
+
+class SQLiteBackend:
+    """
+    Sessions stored as JSON rows in a SQLite database in WAL mode, so several bot
+    processes on the same host can read while one of them writes.
+    """
+    durable = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id INTEGER PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._connection.commit()
+
+    def _load(self, chat_id):
+        with self._lock:
+            row = self._connection.execute("SELECT record FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save_many(self, records: dict):
+        now = time.time()
+        saved = [(chat_id, json.dumps(record), now) for chat_id, record in records.items() if record is not None]
+        deleted = [(chat_id,) for chat_id, record in records.items() if record is None]
+        with self._lock, self._connection:
+            if saved:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO sessions (chat_id, record, updated_at) VALUES (?, ?, ?)", saved
+                )
+            if deleted:
+                self._connection.executemany("DELETE FROM sessions WHERE chat_id = ?", deleted)
+
+    def _purge_expired(self, ttl: float) -> list:
+        deadline = time.time() - ttl
+        with self._lock, self._connection:
+            rows = self._connection.execute("SELECT record FROM sessions WHERE updated_at < ?", (deadline,)).fetchall()
+            self._connection.execute("DELETE FROM sessions WHERE updated_at < ?", (deadline,))
+        return [json.loads(row[0]) for row in rows]
+
+    async def load(self, chat_id):
+        """Read the stored record of a chat, or None"""
+        return await run_io(self._load, chat_id)
+
+    async def save_many(self, records: dict):
+        """Write a batch of records in one transaction; None deletes the record"""
+        await run_io(self._save_many, records)
+
+    async def purge_expired(self, ttl: float) -> list:
+        """Delete the records idle for longer than ttl and return them"""
+        return await run_io(self._purge_expired, ttl)
+
+    async def close(self):
+        with self._lock:
+            self._connection.close()
+
+class RedisBackend:
+    """
+    Sessions stored as JSON strings in any server speaking the Redis protocol
+    (Redis, Valkey, KeyDB, Dragonfly...), shared by bot processes on different hosts.
+    A sorted set indexes the last activity of every session for expiry.
+    """
+    durable = True
+
+    def __init__(self, url: str, prefix: str = "bot:session:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=redis requires the redis package: pip install redis")
+        self._client = redis.from_url(url)
+        self.prefix = prefix
+        self.index_key = f"{prefix}last_seen"
+
+    async def load(self, chat_id):
+        """Read the stored record of a chat, or None"""
+        record = await self._client.get(f"{self.prefix}{chat_id}")
+        return json.loads(record) if record else None
+
+    async def save_many(self, records: dict):
+        """Write a batch of records in one round trip; None deletes the record"""
+        now = time.time()
+        pipeline = self._client.pipeline(transaction=False)
+        for chat_id, record in records.items():
+            if record is None:
+                pipeline.delete(f"{self.prefix}{chat_id}")
+                pipeline.zrem(self.index_key, chat_id)
+            else:
+                pipeline.set(f"{self.prefix}{chat_id}", json.dumps(record))
+                pipeline.zadd(self.index_key, {chat_id: now})
+        await pipeline.execute()
+
+    async def purge_expired(self, ttl: float) -> list:
+        """Delete the records idle for longer than ttl and return them"""
+        expired = await self._client.zrangebyscore(self.index_key, '-inf', time.time() - ttl)
+        if not expired:
+            return []
+        chat_ids = [chat_id.decode() if isinstance(chat_id, bytes) else chat_id for chat_id in expired]
+        records = await self._client.mget([f"{self.prefix}{chat_id}" for chat_id in chat_ids])
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.delete(*[f"{self.prefix}{chat_id}" for chat_id in chat_ids])
+        pipeline.zrem(self.index_key, *chat_ids)
+        await pipeline.execute()
+        return [json.loads(record) for record in records if record]
+
+    async def close(self):
+        close = getattr(self._client, 'aclose', None) or self._client.close
+        await close()
+
+def create_backend(name: str, sqlite_path: str = None, redis_url: str = None):
+    """Build the state backend selected in the configuration"""
+    name = (name or 'memory').lower()
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path)
+    if name == 'redis':
+        return RedisBackend(redis_url)
+    raise ValueError(f"Unknown STATE_BACKEND: {name}")
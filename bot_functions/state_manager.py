@@ -1,7 +1,29 @@
 import os
+import time
+import shutil
+import asyncio
+from collections import OrderedDict
+from dotenv import load_dotenv
+from .state_backends import MemoryBackend, create_backend
 
-# Global instance to manage conversation states
-conversation_state = {}
+load_dotenv()
+
+# Sessions idle for longer than this are dropped together with their temporary files
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 24 * 60 * 60))
+# Upper bound on sessions kept in memory; the least recently active one is dropped first
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 100000))
+
+# Where sessions are persisted: memory (single process), sqlite or redis (shared by several processes)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Changes made within this window are written to the backend in a single batch
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", 0.2))
+STATE_PURGE_INTERVAL = float(os.getenv("STATE_PURGE_INTERVAL", 300))
+# Conversation history kept for the LLM, in estimated tokens: older turns are dropped first
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1000))
+# Rough characters per token for Spanish text; good enough to bound the prompt size
+CHARS_PER_TOKEN = 4
 
 # State constants
 IDLE = "IDLE"
@@ -20,6 +42,7 @@ AWAITING_PAGE_ORDER = "AWAITING_PAGE_ORDER"
 # Generic image transformation states
 AWAITING_IMAGE_TO_PNG = "AWAITING_IMAGE_TO_PNG"
 AWAITING_IMAGE_TO_JPEG = "AWAITING_IMAGE_TO_JPEG"
+AWAITING_PAGES_FOR_IMAGE_CONVERSION = "AWAITING_PAGES_FOR_IMAGE_CONVERSION"
 
 # Document transformation states
 AWAITING_DOCX_TO_PDF = "AWAITING_DOCX_TO_PDF"
@@ -47,55 +70,313 @@ AWAITING_PDF_CONCATENATION_ORDER = "AWAITING_PDF_CONCATENATION_ORDER"
 AWAITING_ZIP_FOR_BULK = "AWAITING_ZIP_FOR_BULK"
 AWAITING_BULK_OPERATION = "AWAITING_BULK_OPERATION"
 
+class Session:
+    """
+    Conversation record of one chat.
+    Step data and history stay None until used, so idle chats cost a few dozen bytes.
+    """
+    __slots__ = ('state', 'data', 'history', 'workspace_dir', 'last_seen')
+
+    def __init__(self):
+        self.state = IDLE
+        self.data = None
+        self.history = None
+        self.workspace_dir = None
+        self.last_seen = time.monotonic()
+
+    def to_record(self):
+        """Serializable form of the session, or None when there is nothing worth storing"""
+        if self.state == IDLE and not self.data and not self.history and not self.workspace_dir:
+            return None
+        return {'state': self.state, 'data': self.data, 'history': self.history, 'workspace_dir': self.workspace_dir}
+
+    @classmethod
+    def from_record(cls, record: dict):
+        session = cls()
+        session.state = record.get('state', IDLE)
+        session.data = record.get('data')
+        session.history = record.get('history')
+        session.workspace_dir = record.get('workspace_dir')
+        return session
+
+    def file_paths(self) -> list:
+        """Local paths of the files and workspace the session refers to"""
+        paths = [self.workspace_dir] if self.workspace_dir else []
+        for key, value in (self.data or {}).items():
+            if key.endswith('_path') and value:
+                paths.append(value)
+            elif key in ['pdf_paths', 'file_paths', 'files_to_add'] and isinstance(value, list):
+                paths.extend(path for path in value if path)
+        return paths
+
+    def remove_files(self):
+        """Delete the temporary files referenced by the session"""
+        if self.workspace_dir:
+            shutil.rmtree(self.workspace_dir, ignore_errors=True)
+            self.workspace_dir = None
+        for key, value in (self.data or {}).items():
+            if key.endswith('_path') and value and os.path.exists(value):
+                os.remove(value)
+            elif key in ['pdf_paths', 'file_paths', 'files_to_add'] and isinstance(value, list):
+                for path in value:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+
+class SessionStore:
+    """
+    Sessions ordered from least to most recently active.
+    Expired sessions are swept from the front on every access, and the oldest one is
+    dropped when max_sessions is exceeded. With an in-memory backend dropped sessions lose
+    their temporary files; with a durable one the store is only a cache and files are
+    removed when the backend expires the session.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.remove_files_on_drop = True
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, chat_id):
+        return chat_id in self._sessions
+
+    def _drop(self, chat_id):
+        session = self._sessions.pop(chat_id)
+        if not self.remove_files_on_drop:
+            return
+        try:
+            session.remove_files()
+        except Exception as e:
+            print(f"Error removing files of session {chat_id}: {e}")
+
+    def evict_expired(self):
+        """Drop the sessions idle for longer than the TTL"""
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > deadline:
+                break
+            self._drop(chat_id)
+
+    def get(self, chat_id, create: bool = False):
+        """Get the session of a chat and mark it as active; None when missing unless create is set"""
+        self.evict_expired()
+        session = self._sessions.get(chat_id)
+        if session is not None:
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(chat_id)
+        elif create:
+            session = self._sessions[chat_id] = Session()
+            self._enforce_limit()
+        return session
+
+    def _enforce_limit(self):
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+
+    def replace(self, chat_id, session):
+        """Put a session loaded from the backend in place of the cached one (None forgets it)"""
+        if session is None:
+            self._sessions.pop(chat_id, None)
+            return
+        self._sessions[chat_id] = session
+        self._sessions.move_to_end(chat_id)
+        self._enforce_limit()
+
+    def discard(self, chat_id):
+        """Drop a session and its temporary files"""
+        if chat_id in self._sessions:
+            self._drop(chat_id)
+
+# Global instance to manage conversation states
+conversation_state = SessionStore(SESSION_TTL_SECONDS, MAX_SESSIONS)
+
+# Backend selected by start_state_backend; sessions changed since the last flush, by chat
+state_backend = MemoryBackend()
+_dirty = {}
+_flusher_task = None
+
+def _mark_dirty(chat_id, session):
+    """Queue a changed session for the next batched write"""
+    if state_backend.durable:
+        _dirty[chat_id] = session
+
+async def load_user_session(chat_id) -> bool:
+    """
+    Refresh the cached session of a chat from the backend before handling one of its updates,
+    so a conversation can continue on another process or after a restart.
+    Sessions with unsaved local changes are kept as they are.
+    Uploaded files stay on the host that received them: when the stored session refers to
+    files missing here (it was started on another host), its pending step is dropped and
+    True is returned so the user can be asked to send them again.
+    """
+    if not state_backend.durable or chat_id in _dirty:
+        return False
+    try:
+        record = await state_backend.load(chat_id)
+    except Exception as e:
+        print(f"Error loading session {chat_id}: {e}")
+        return False
+    if chat_id in _dirty:
+        return False
+    session = Session.from_record(record) if record else None
+    files_missing = session is not None and any(not os.path.exists(path) for path in session.file_paths())
+    if files_missing:
+        # Keep the conversation with the LLM, forget the step that needed the files
+        session.state = IDLE
+        session.data = None
+        session.workspace_dir = None
+    conversation_state.replace(chat_id, session)
+    if files_missing:
+        _mark_dirty(chat_id, session)
+    return files_missing
+
+async def flush_state():
+    """Write every changed session to the backend in one batch"""
+    if not _dirty:
+        return
+    batch = dict(_dirty)
+    _dirty.clear()
+    try:
+        await state_backend.save_many({chat_id: session.to_record() for chat_id, session in batch.items()})
+    except Exception as e:
+        print(f"Error saving sessions: {e}")
+        # Keep the changes for the next attempt, unless the chat changed again meanwhile
+        for chat_id, session in batch.items():
+            _dirty.setdefault(chat_id, session)
+
+async def _purge_expired_sessions():
+    """Remove the sessions expired in the backend and their temporary files"""
+    for record in await state_backend.purge_expired(SESSION_TTL_SECONDS):
+        try:
+            Session.from_record(record).remove_files()
+        except Exception as e:
+            print(f"Error removing files of an expired session: {e}")
+
+async def _run_flusher():
+    """Write the changes of each STATE_FLUSH_INTERVAL window together and purge expired sessions"""
+    last_purge = time.monotonic()
+    while True:
+        await asyncio.sleep(STATE_FLUSH_INTERVAL)
+        await flush_state()
+        if time.monotonic() - last_purge >= STATE_PURGE_INTERVAL:
+            last_purge = time.monotonic()
+            try:
+                await _purge_expired_sessions()
+            except Exception as e:
+                print(f"Error purging expired sessions: {e}")
+
+async def start_state_backend():
+    """Open the configured backend and start the batched writer (call once the event loop runs)"""
+    global state_backend, _flusher_task
+    state_backend = create_backend(STATE_BACKEND, STATE_DB_PATH, REDIS_URL)
+    conversation_state.remove_files_on_drop = not state_backend.durable
+    if state_backend.durable:
+        _flusher_task = asyncio.create_task(_run_flusher())
+        print(f"Conversation state stored in {STATE_BACKEND}")
+
+async def stop_state_backend():
+    """Write pending changes and close the backend"""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+    await flush_state()
+    await state_backend.close()
+
 def get_user_state(chat_id):
     """Get the current state of a user"""
-    return conversation_state.get(chat_id, {}).get('state', IDLE)
+    session = conversation_state.get(chat_id)
+    return session.state if session else IDLE
 
 def set_user_state(chat_id, state, **kwargs):
     """Set the state of a user and store additional data"""
-    if chat_id not in conversation_state:
-        conversation_state[chat_id] = {}
-    conversation_state[chat_id]['state'] = state
-    for key, value in kwargs.items():
-        conversation_state[chat_id][key] = value
+    session = conversation_state.get(chat_id, create=True)
+    session.state = state
+    if kwargs:
+        if session.data is None:
+            session.data = {}
+        session.data.update(kwargs)
+    _mark_dirty(chat_id, session)
 
 def get_user_data(chat_id, key, default=None):
     """Get specific data for a user"""
-    return conversation_state.get(chat_id, {}).get(key, default)
+    session = conversation_state.get(chat_id)
+    if session is None or not session.data:
+        return default
+    return session.data.get(key, default)
+
+def get_workspace_dir(chat_id):
+    """Get the session workspace directory of a user, if any"""
+    session = conversation_state.get(chat_id)
+    return session.workspace_dir if session else None
+
+def set_workspace_dir(chat_id, workspace):
+    """Remember the session workspace directory of a user"""
+    session = conversation_state.get(chat_id, create=True)
+    session.workspace_dir = workspace
+    _mark_dirty(chat_id, session)
 
 def clear_user_data(chat_id):
     """Clear user data and temporary files"""
-    if chat_id in conversation_state:
+    session = conversation_state.get(chat_id)
+    if session:
         # Clean up temporary files
-        data = conversation_state[chat_id]
-        for key, value in data.items():
-            if key.endswith('_path') and value and os.path.exists(value):
-                os.remove(value)
-            elif key in ['pdf_paths', 'file_paths', 'files_to_add'] and isinstance(value, list):
-                for path in value:
-                    if path and os.path.exists(path):
-                        os.remove(path)
-        conversation_state[chat_id] = {}
+        session.remove_files()
+        session.state = IDLE
+        session.data = None
+        session.history = None
+        _mark_dirty(chat_id, session)
 
 def set_conversation_history(chat_id, messages):
     """Set the conversation history for a user"""
-    if chat_id not in conversation_state:
-        conversation_state[chat_id] = {}
-    conversation_state[chat_id]['conversation_history'] = messages
+    session = conversation_state.get(chat_id, create=True)
+    session.history = messages or None
+    _mark_dirty(chat_id, session)
 
 def get_conversation_history(chat_id):
     """Get the conversation history for a user"""
-    return conversation_state.get(chat_id, {}).get('conversation_history', [])
+    session = conversation_state.get(chat_id)
+    return (session.history or []) if session else []
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of LLM tokens in text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _trim_history(history: list) -> list:
+    """Keep the most recent turns that fit in HISTORY_TOKEN_BUDGET (at least the last one)"""
+    kept = []
+    total = 0
+    for msg in reversed(history):
+        cost = estimate_tokens(msg['message'])
+        if kept and total + cost > HISTORY_TOKEN_BUDGET:
+            break
+        kept.append(msg)
+        total += cost
+    kept.reverse()
+    return kept
 
 def add_to_conversation_history(chat_id, role, message):
-    """Add a message to the conversation history"""
-    if chat_id not in conversation_state:
-        conversation_state[chat_id] = {}
-    if 'conversation_history' not in conversation_state[chat_id]:
-        conversation_state[chat_id]['conversation_history'] = []
-    conversation_state[chat_id]['conversation_history'].append({'role': role, 'message': message})
+    """Add a message to the conversation history, dropping the oldest turns over the token budget"""
+    session = conversation_state.get(chat_id, create=True)
+    if session.history is None:
+        session.history = []
+    # A single pasted wall of text must not take the whole prompt either
+    message = message[:HISTORY_TOKEN_BUDGET * CHARS_PER_TOKEN]
+    session.history.append({'role': role, 'message': message})
+    session.history = _trim_history(session.history)
+    _mark_dirty(chat_id, session)
 
 def clear_conversation_history(chat_id):
     """Clear the conversation history for a user"""
-    if chat_id in conversation_state and 'conversation_history' in conversation_state[chat_id]:
-        conversation_state[chat_id]['conversation_history'] = []
+    session = conversation_state.get(chat_id)
+    if session:
+        session.history = None
+        _mark_dirty(chat_id, session)
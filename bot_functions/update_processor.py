@@ -0,0 +1,61 @@
+import os
+import sys
+import asyncio
+from dotenv import load_dotenv
+from telegram.ext import BaseUpdateProcessor
+
+load_dotenv()
+
+# Updates handled at the same time across all chats. Conversions are still limited by the
+# job scheduler, so this mostly bounds chats waiting on replies, downloads and uploads.
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", 256))
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates of different chats concurrently while updates of the same chat run
+    one at a time, in arrival order, so the conversation state machine never sees two
+    messages of a chat interleaved.
+
+    The base class takes its global slot before do_process_update, so a busy chat's queued
+    updates would hold slots while waiting for their turn and stall every other chat. It is
+    given no real limit; an update takes one of the max_concurrent_updates slots here, once
+    it is its chat's turn.
+    """
+    __slots__ = ('_slots', '_locks', '_pending')
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> lock, and number of updates of that chat running or waiting for it
+        self._locks = {}
+        self._pending = {}
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        chat_id = chat.id
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        try:
+            async with lock, self._slots:
+                await coroutine
+        finally:
+            # Forget the lock once the chat has nothing queued, so idle chats cost nothing
+            self._pending[chat_id] -= 1
+            if self._pending[chat_id] == 0:
+                del self._pending[chat_id]
+                del self._locks[chat_id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
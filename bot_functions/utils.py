@@ -1,10 +1,24 @@
 from telegram import Update
+import os
 import asyncio
 import random
+import time
+from io import BytesIO
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
 from .ad_messages import mensajes_promocionales
+from .scheduler import job_scheduler
+
+load_dotenv()
 
 MAX_FILE_SIZE = 20 * 1024 * 1024
 
+# Files up to this size are converted in memory instead of going through temp files
+IN_MEMORY_THRESHOLD = int(os.getenv("IN_MEMORY_THRESHOLD", 1024 * 1024))
+
+# Minimum seconds between two edits of a progress message
+PROGRESS_UPDATE_INTERVAL = 2.0
+
 # Exit keywords in English and Spanish
 EXIT_KEYWORDS = [
     # English
@@ -48,6 +62,17 @@ async def validate_file(update: Update, file_types: list, max_size: int = MAX_FI
 
     return True, "Archivo válido"
 
+async def download_small_document(update: Update, max_size: int = IN_MEMORY_THRESHOLD):
+    """Download the message document into memory if it is small enough, otherwise return None"""
+    document = update.message.document
+    if not document.file_size or document.file_size > max_size:
+        return None
+
+    file = await document.get_file()
+    buffer = BytesIO()
+    await file.download_to_memory(buffer)
+    return buffer.getvalue()
+
 def parse_page_numbers(page_string: str, max_pages: int):
     """Parse page numbers from string like '1,3-5,8' into a list of page numbers"""
     pages = set()
@@ -67,6 +92,21 @@ def parse_page_numbers(page_string: str, max_pages: int):
 
     return sorted(list(pages))
 
+def parse_render_options(user_input: str, max_pages: int, presets) -> tuple[list, str]:
+    """Parse a page selection with an optional quality preset, like '3-5 alta' or 'todas media'"""
+    page_parts = []
+    preset = None
+    for word in user_input.lower().replace('á', 'a').split():
+        if word in presets:
+            preset = word
+        else:
+            page_parts.append(word)
+
+    page_string = ''.join(page_parts)
+    if page_string in ('', 'todas', 'todo', 'all'):
+        return list(range(1, max_pages + 1)), preset
+    return parse_page_numbers(page_string, max_pages), preset
+
 def filter_valid_files(file_list):
     """Filter out macOS metadata files and other invalid files"""
     valid_files = []
@@ -85,14 +125,78 @@ def filter_valid_files(file_list):
             valid_files.append(file_name)
     return valid_files
 
-async def send_processing_and_ad_message(update: Update, processing_message: str, delay_seconds: float = 2.0):
-    """Send processing message, then advertising message after a delay"""
-    # Send initial processing message
-    await update.message.reply_text(processing_message)
-
-    # Wait a bit to simulate processing time
-    await asyncio.sleep(delay_seconds)
-
-    # Send random advertising message
-    ad_message = random.choice(mensajes_promocionales)
-    await update.message.reply_text(ad_message)
+def format_progress(done: int, total: int, width: int = 10) -> str:
+    """Build a text progress bar like '▓▓▓░░░░░░░ 3/10 (30%)'"""
+    ratio = done / total if total else 1
+    filled = round(ratio * width)
+    return f"{'▓' * filled}{'░' * (width - filled)} {done}/{total} ({ratio:.0%})"
+
+def make_progress_callback(status_message, base_text: str, interval: float = PROGRESS_UPDATE_INTERVAL):
+    """
+    Create a progress(done, total) callback that edits the status message in place.
+    Updates are throttled to one every `interval` seconds, except for the last one.
+    """
+    last_update = 0.0
+
+    async def report(done: int, total: int):
+        nonlocal last_update
+        now = time.monotonic()
+        if done < total and now - last_update < interval:
+            return
+        last_update = now
+        try:
+            await status_message.edit_text(f"{base_text}\n\n{format_progress(done, total)}")
+        except Exception as e:
+            print(f"Could not update progress message: {e}")
+
+    return report
+
+@asynccontextmanager
+async def processing_job(update: Update, processing_message: str, cost: float = 1):
+    """
+    Send a status message and hold a scheduler slot while the block runs.
+    The advertising message is sent while the job waits for its slot and is in the chat
+    before the block starts, so results always arrive after it. Queue position and
+    progress are shown by editing the status message in place.
+    Yields a progress(done, total) callback for the processors.
+    """
+    status_message = await update.message.reply_text(processing_message)
+    ad_task = asyncio.create_task(update.message.reply_text(random.choice(mensajes_promocionales)))
+    ad_sent = False
+
+    async def wait_for_ad():
+        nonlocal ad_sent
+        if ad_sent:
+            return
+        ad_sent = True
+        try:
+            await ad_task
+        except Exception as e:
+            print(f"Could not send advertising message: {e}")
+
+    queued = False
+
+    async def notify_queue_position(position: int):
+        nonlocal queued
+        queued = True
+        try:
+            await status_message.edit_text(
+                f"{processing_message}\n\n⏳ Hay varios archivos procesándose ahora mismo. "
+                f"Estás en la posición {position} de la cola."
+            )
+        except Exception as e:
+            print(f"Could not update queue position message: {e}")
+
+    try:
+        async with job_scheduler.slot(update.message.chat_id, cost, notify_queue_position):
+            if queued:
+                try:
+                    await status_message.edit_text(processing_message)
+                except Exception as e:
+                    print(f"Could not update status message: {e}")
+            # Results are sent inside the block or right after it: keep the ad before them
+            await wait_for_ad()
+            yield make_progress_callback(status_message, processing_message)
+    finally:
+        # Also when the job never got a slot (queue full, cancelled)
+        await wait_for_ad()
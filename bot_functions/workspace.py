@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from .executor import run_io
+from .state_manager import get_workspace_dir, set_workspace_dir
+
+load_dotenv()
+
+# Parent directory of every workspace; point it to a tmpfs mount (e.g. /dev/shm) to keep job files in RAM
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT") or tempfile.gettempdir()
+
+def create_workspace(prefix: str = "job") -> str:
+    """Create a new, uniquely named directory for the files of one job"""
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{prefix}_", dir=WORKSPACE_ROOT)
+
+def remove_workspace(workspace: str):
+    """Delete a workspace and everything inside it"""
+    if workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+@asynccontextmanager
+async def job_workspace(prefix: str = "job"):
+    """Private directory for one job, removed when the block exits, even after an error"""
+    workspace = await run_io(create_workspace, prefix)
+    try:
+        yield workspace
+    finally:
+        await run_io(remove_workspace, workspace)
+
+def session_workspace(chat_id: int) -> str:
+    """
+    Directory for files uploaded during a multi-step action (e.g. PDFs waiting for page numbers).
+    It is stored in the session and removed by clear_user_data or when the session expires.
+    """
+    workspace = get_workspace_dir(chat_id)
+    if not workspace or not os.path.isdir(workspace):
+        workspace = create_workspace(f"session_{chat_id}")
+        set_workspace_dir(chat_id, workspace)
+    return workspace
+
+async def download_document(update, workspace: str, file_name: str = None) -> str:
+    """Download the message document into a workspace and return its path"""
+    document = update.message.document
+    file = await document.get_file()
+    file_path = os.path.join(workspace, os.path.basename(file_name or document.file_name))
+    await file.download_to_drive(file_path)
+    return file_path
@@ -1,22 +1,112 @@
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, TypeHandler, ContextTypes, filters
 from dotenv import load_dotenv
 import os
+import sys
+import secrets
 
-from bot_functions.handlers.command_handlers import start, about, help, manual
-from bot_functions.conversation_manager import conversation_manager
+from bot_functions.handlers.command_handlers import start, about, help, manual, metrics
+from bot_functions.conversation_manager import conversation_manager, load_session
+from bot_functions.state_manager import start_state_backend, stop_state_backend
+from bot_functions.update_processor import ChatOrderedUpdateProcessor
+from bot_functions.executor import shutdown_executors, run_io
+from bot_functions.result_cache import load_result_cache
+from bot_functions.gemini_client import warm_up_client, close_client
+from bot_functions.intent_model import load_intent_model
+from bot_functions.file_processing.office_pool import office_pool
 
 load_dotenv()
-app = ApplicationBuilder().token(os.getenv("TELEGRAM_BOT_TOKEN")).build()
+
+# python main.py --startup-report: print the import-time breakdown and exit
+if "--startup-report" in sys.argv:
+    from bot_functions.diagnostics import startup_report
+    sys.exit(startup_report())
+
+# python main.py --load-report: throughput of the update processors with many chats at once
+if "--load-report" in sys.argv:
+    from bot_functions.diagnostics import load_report
+    sys.exit(load_report())
+
+# python main.py --intent-report: measure the local intent rules on the labeled corpus and exit
+if "--intent-report" in sys.argv:
+    from bot_functions.diagnostics import intent_report
+    sys.exit(intent_report())
+
+# python main.py --router-report: accuracy and latency of every model of the intent cascade
+if "--router-report" in sys.argv:
+    from bot_functions.diagnostics import router_report
+    sys.exit(router_report())
+
+# python main.py --train-intent-model: train the local intent model from the logged LLM answers
+if "--train-intent-model" in sys.argv:
+    from bot_functions.intent_model import train_intent_model
+    sys.exit(train_intent_model())
+
+# polling (default) or webhook: an embedded HTTP server that Telegram pushes updates to,
+# so several instances can sit behind a reverse proxy
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public HTTPS base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+# Telegram sends it in every request; instances behind the same URL must share it
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
+async def post_init(application):
+    await start_state_backend()
+    await load_intent_model()
+    application.create_task(warm_up_client())
+    # Index the results kept on disk off the event loop, before the first request needs them
+    application.create_task(run_io(load_result_cache))
+
+async def post_shutdown(application):
+    await stop_state_backend()
+    await close_client()
+
+app = (
+    ApplicationBuilder()
+    .token(os.getenv("TELEGRAM_BOT_TOKEN"))
+    # Different chats are served in parallel; updates of one chat stay in order
+    .concurrent_updates(ChatOrderedUpdateProcessor())
+    .post_init(post_init)
+    .post_shutdown(post_shutdown)
+    .build()
+)
+
+# Load the chat's conversation state before the handlers below see the update
+app.add_handler(TypeHandler(Update, load_session), group=-1)
 
 # Register command handlers
 app.add_handler(CommandHandler("start", start))
 app.add_handler(CommandHandler("help", help))
 app.add_handler(CommandHandler("about", about))
 app.add_handler(CommandHandler("manual", manual))
+app.add_handler(CommandHandler("metrics", metrics))
 
 # Handle both text messages and document uploads
 app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, conversation_manager))
 app.add_handler(MessageHandler(filters.ATTACHMENT, conversation_manager))
 
-app.run_polling()
+if BOT_MODE == "webhook":
+    if not WEBHOOK_URL:
+        raise RuntimeError("BOT_MODE=webhook requires WEBHOOK_URL")
+    secret_token = WEBHOOK_SECRET_TOKEN
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        print("WEBHOOK_SECRET_TOKEN not set, using a random token for this run (set it when running several instances)")
+    # Requests without the matching X-Telegram-Bot-Api-Secret-Token header are rejected
+    app.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+        secret_token=secret_token,
+        max_connections=WEBHOOK_MAX_CONNECTIONS
+    )
+else:
+    app.run_polling()
+
+# Stop the worker pools and office instances once the bot stops
+shutdown_executors()
+office_pool.shutdown()
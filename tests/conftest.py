@@ -0,0 +1,36 @@
+import os
+import sys
+
+# The bot runs from the project directory: modules import as bot_functions.* and read prompts/ relative to it
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+
+import asyncio
+import pytest
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """
+    Fresh Gemini client state with fast retries. Returns run(server, scenario): starts the
+    FakeGemini server, points the client at it and runs `await scenario(server)`.
+    """
+    from bot_functions import gemini_client, circuit_breaker
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_client, "_client", None)
+    monkeypatch.setattr(gemini_client, "_http_client", None)
+    monkeypatch.setattr(gemini_client, "_semaphore", None)
+    monkeypatch.setattr(gemini_client, "GEMINI_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+    def run(server, scenario):
+        async def main():
+            async with server:
+                monkeypatch.setattr(gemini_client, "GEMINI_BASE_URL", server.base_url)
+                try:
+                    return await scenario(server)
+                finally:
+                    await gemini_client.close_client()
+        return asyncio.run(main())
+    return run
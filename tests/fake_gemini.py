@@ -0,0 +1,149 @@
+"""
+Local stand-in for the Gemini REST API (POST .../models/{model}:generateContent) used by the
+tests, and by `python main.py --router-report` or load tests when run as a script:
+
+    python tests/fake_gemini.py --port 8765 --latency 0.2 --error-rate 0.1
+    GEMINI_API_KEY=x GEMINI_BASE_URL=http://127.0.0.1:8765 python main.py --router-report
+
+The bot reaches it through GEMINI_BASE_URL. It can delay answers, fail requests with any
+HTTP status and records what it received, the connections opened and the requests it was
+serving at once.
+"""
+import os
+import re
+import sys
+import json
+import random
+import asyncio
+
+_MODEL_PATH = re.compile(r"/models/([^/:]+):generateContent")
+
+_STATUS_NAMES = {400: "INVALID_ARGUMENT", 408: "DEADLINE_EXCEEDED", 429: "RESOURCE_EXHAUSTED",
+                 500: "INTERNAL", 502: "UNAVAILABLE", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+class FakeGemini:
+    """
+    answer(model, prompt) returns the text of the reply (a dict is sent as JSON text).
+    latency is the seconds each request takes, or a function (model, prompt) -> seconds.
+    failures holds HTTP statuses returned, in order, by the next requests before answering normally;
+    fail(model, prompt) may also return a status (or None) for every request.
+    """
+
+    def __init__(self, answer=None, latency=0.0, failures=(), fail=None):
+        self.answer = answer or (lambda model, prompt: "ok")
+        self.latency = latency
+        self.failures = list(failures)
+        self.fail = fail
+        # (model, prompt) of every request received
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def prompts(self, model: str = None) -> list:
+        """Prompts received, optionally only those for model"""
+        return [prompt for name, prompt in self.requests if model is None or name == model]
+
+    async def start(self, port: int = 0):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            # Keep-alive: serve requests on the connection until the client closes it
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                path = request_line.decode().split()[1]
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, value = line.decode().split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers.get('content-length', 0))) or b'{}')
+                match = _MODEL_PATH.search(path)
+                model = match.group(1) if match else ""
+                prompt = "".join(part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', []))
+                status, payload = await self._respond(model, prompt)
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} X\r\ncontent-type: application/json\r\ncontent-length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, model: str, prompt: str) -> tuple:
+        self.requests.append((model, prompt))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            latency = self.latency(model, prompt) if callable(self.latency) else self.latency
+            if latency:
+                await asyncio.sleep(latency)
+        finally:
+            self.in_flight -= 1
+
+        status = self.failures.pop(0) if self.failures else (self.fail(model, prompt) if self.fail else None)
+        if status:
+            return status, {'error': {'code': status, 'message': "fake failure", 'status': _STATUS_NAMES.get(status, "UNKNOWN")}}
+
+        text = self.answer(model, prompt)
+        if not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False)
+        return 200, {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP'}]}
+
+def rules_answer(model: str, prompt: str) -> dict:
+    """Answer intent prompts with the local rules, as a model that is always sure"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from bot_functions.intent_rules import classify_intent, extract_parameters
+
+    message = prompt.rsplit('<USER>\n', 1)[-1].split('\n\n<ASSISTANT>')[0]
+    action = classify_intent(message)
+    intent = {'action': action, 'confidence': 0.95 if action else 0.3}
+    intent.update(extract_parameters(message))
+    if not action:
+        intent['message'] = "Podrías mencionar qué quieres hacer con tu archivo"
+    return intent
+
+async def _serve(port: int, latency: float, error_rate: float):
+    server = FakeGemini(
+        answer=rules_answer,
+        latency=lambda model, prompt: random.uniform(0, 2 * latency),
+        fail=lambda model, prompt: 503 if random.random() < error_rate else None
+    )
+    await server.start(port)
+    print(f"Fake Gemini listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local fake Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.1, help="average seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+    asyncio.run(_serve(args.port, args.latency, args.error_rate))
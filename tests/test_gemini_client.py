@@ -0,0 +1,106 @@
+import time
+import asyncio
+import pytest
+from fake_gemini import FakeGemini
+from bot_functions import gemini_client
+from bot_functions.gemini_client import complete, _retry_delay
+from bot_functions.metrics import get_counter
+
+def test_answer_goes_through_the_fake_server(gemini):
+    async def scenario(server):
+        return await complete("hola", model="fake-model")
+
+    server = FakeGemini(answer=lambda model, prompt: f"{model}: {prompt}")
+    assert gemini(server, scenario) == "fake-model: hola"
+    assert server.requests == [("fake-model", "hola")]
+
+def test_slow_request_times_out(gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(gemini_client, "GEMINI_MAX_ATTEMPTS", 1)
+
+    async def scenario(server):
+        # Importing the SDK on first use is not part of the request
+        gemini_client.get_client()
+        started = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await complete("hola")
+        return time.perf_counter() - started
+
+    elapsed = gemini(FakeGemini(latency=2), scenario)
+    assert elapsed < 1
+
+def test_timeouts_are_retried(gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_TIMEOUT_SECONDS", 0.2)
+
+    async def scenario(server):
+        return await complete("hola")
+
+    # Only the first request hangs
+    server = FakeGemini(latency=lambda model, prompt: 2 if len(server.requests) == 1 else 0)
+    assert gemini(server, scenario) == "ok"
+    assert len(server.requests) == 2
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_rate_limits_and_server_errors_are_retried_with_full_jitter(gemini, monkeypatch, status):
+    delays = []
+    monkeypatch.setattr(gemini_client.random, "uniform", lambda low, high: delays.append((low, high)) or 0)
+    retries = get_counter('gemini.retries')
+
+    async def scenario(server):
+        return await complete("hola")
+
+    server = FakeGemini(failures=[status, status])
+    assert gemini(server, scenario) == "ok"
+    assert len(server.requests) == 3
+    # Full jitter: uniform between 0 and the exponential backoff of each attempt
+    assert delays == [(0, 0.01), (0, 0.02)]
+    assert get_counter('gemini.retries') == retries + 2
+
+def test_client_errors_are_not_retried(gemini):
+    async def scenario(server):
+        with pytest.raises(Exception) as error:
+            await complete("hola")
+        return error.value
+
+    server = FakeGemini(failures=[400])
+    assert getattr(gemini(server, scenario), 'code', None) == 400
+    assert len(server.requests) == 1
+
+def test_gives_up_after_max_attempts(gemini):
+    async def scenario(server):
+        with pytest.raises(Exception):
+            await complete("hola")
+
+    server = FakeGemini(failures=[503] * 5)
+    gemini(server, scenario)
+    assert len(server.requests) == gemini_client.GEMINI_MAX_ATTEMPTS
+
+def test_retry_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_RETRY_BASE_DELAY", 1)
+    monkeypatch.setattr(gemini_client, "GEMINI_RETRY_MAX_DELAY", 4)
+    assert all(0 <= _retry_delay(10) <= 4 for _ in range(100))
+
+def test_semaphore_limits_requests_in_flight(gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_MAX_CONCURRENT", 4)
+
+    async def scenario(server):
+        return await asyncio.gather(*(complete(f"p{i}") for i in range(20)))
+
+    server = FakeGemini(latency=0.05)
+    assert gemini(server, scenario) == ["ok"] * 20
+    assert server.max_in_flight == 4
+    # Keep-alive pool: connections are reused instead of one per request
+    assert server.connections <= 4
+
+def test_connection_pool_limits_requests_in_flight(gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_MAX_CONCURRENT", 4)
+
+    async def scenario(server):
+        # A semaphore larger than the pool: the pool alone must hold the requests back
+        gemini_client._semaphore = asyncio.Semaphore(100)
+        return await asyncio.gather(*(complete(f"p{i}") for i in range(20)))
+
+    server = FakeGemini(latency=0.05)
+    assert gemini(server, scenario) == ["ok"] * 20
+    assert server.max_in_flight <= 4
+    assert server.connections <= 4
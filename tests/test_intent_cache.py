@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from collections import OrderedDict
+from bot_functions import intent_cache
+from bot_functions.intent_schema import empty_intent
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Intents returned by the model cascade, in order, and how many times it was asked"""
+    queue = []
+    calls = []
+
+    async def classify_conversation(system_prompt, conversation):
+        calls.append(conversation)
+        return dict(queue.pop(0))
+
+    monkeypatch.setattr(intent_cache, "_entries", OrderedDict())
+    monkeypatch.setattr(intent_cache, "classify_conversation", classify_conversation)
+    return queue, calls
+
+def intent(action, confidence):
+    result = empty_intent()
+    result.update(action=action, confidence=confidence)
+    return result
+
+def classify_twice(key):
+    async def scenario():
+        first = await intent_cache.cached_classify(key, "prompt", [{'role': 'user', 'message': "a png"}])
+        second = await intent_cache.cached_classify(key, "prompt", [{'role': 'user', 'message': "a png"}])
+        return first, second
+    return asyncio.run(scenario())
+
+def test_confident_action_is_cached(answers):
+    queue, calls = answers
+    queue.append(intent(11, 0.9))
+    first, second = classify_twice("confident")
+    assert first == second and len(calls) == 1
+
+def test_low_confidence_action_is_not_cached(answers):
+    queue, calls = answers
+    queue.extend([intent(11, 0.3), intent(11, 0.9)])
+    first, second = classify_twice("unsure")
+    assert first['confidence'] == 0.3 and second['confidence'] == 0.9
+    assert len(calls) == 2
@@ -0,0 +1,111 @@
+from fake_gemini import FakeGemini
+from bot_functions.intent_router import classify_with_models, build_intent_prompt, parse_model_tiers
+from bot_functions.metrics import get_counter
+from bot_functions.diagnostics import _router_report
+
+TIERS = [("small", 0.8), ("medium", 0.8), ("large", 0.85)]
+PROMPT = build_intent_prompt("SYSTEM", [{'role': "USER", 'message': "une estos dos pdf"}])
+
+def answers(**by_model):
+    """Fake server answering each model with a fixed intent"""
+    return FakeGemini(answer=lambda model, prompt: by_model[model])
+
+def counters(model: str) -> dict:
+    names = ('calls', 'decided', 'escalated', 'failed', 'unparsable', 'agreed', 'overruled')
+    return {name: get_counter(f'intent_router.{model}.{name}') for name in names}
+
+def delta(before: dict, model: str) -> dict:
+    after = counters(model)
+    return {name: after[name] - before[name] for name in after if after[name] != before[name]}
+
+def classify(gemini, server, tiers=TIERS):
+    before = {model: counters(model) for model, _ in tiers}
+
+    async def scenario(server):
+        return await classify_with_models(PROMPT, tiers)
+
+    intent, model = gemini(server, scenario)
+    return intent, model, {name: delta(before[name], name) for name, _ in tiers}
+
+def test_cheap_tier_answers_when_confident(gemini):
+    server = answers(small={'action': 1, 'confidence': 0.95})
+    intent, model, counts = classify(gemini, server)
+    assert (intent['action'], model) == (1, "small")
+    assert [name for name, _ in server.requests] == ["small"]
+    assert counts == {'small': {'calls': 1, 'decided': 1}, 'medium': {}, 'large': {}}
+
+def test_low_confidence_escalates(gemini):
+    server = answers(small={'action': 1, 'confidence': 0.5}, medium={'action': 1, 'confidence': 0.9})
+    intent, model, counts = classify(gemini, server)
+    assert (intent['action'], model) == (1, "medium")
+    assert counts['small'] == {'calls': 1, 'escalated': 1, 'agreed': 1}
+    assert counts['medium'] == {'calls': 1, 'decided': 1}
+
+def test_disagreement_escalates_and_last_tier_decides(gemini):
+    server = answers(
+        small={'action': 3, 'confidence': 0.6},
+        medium={'action': 4, 'confidence': 0.95},
+        large={'action': 4, 'confidence': 0.9},
+    )
+    intent, model, counts = classify(gemini, server)
+    assert (intent['action'], model) == (4, "large")
+    assert [name for name, _ in server.requests] == ["small", "medium", "large"]
+    # medium was confident but contradicted small, so it could not decide alone
+    assert counts['small'] == {'calls': 1, 'escalated': 1, 'overruled': 1}
+    assert counts['medium'] == {'calls': 1, 'escalated': 1, 'agreed': 1}
+    assert counts['large'] == {'calls': 1, 'decided': 1}
+
+def test_unparsable_and_failing_tiers_escalate(gemini):
+    server = FakeGemini(
+        answer=lambda model, prompt: "creo que la 1" if model == "small" else {'action': 1, 'confidence': 0.9},
+        fail=lambda model, prompt: 400 if model == "medium" else None
+    )
+    intent, model, counts = classify(gemini, server)
+    assert (intent['action'], model) == (1, "large")
+    assert counts['small'] == {'calls': 1, 'unparsable': 1, 'escalated': 1}
+    assert counts['medium'] == {'calls': 1, 'failed': 1, 'escalated': 1}
+
+def test_last_tier_decides_even_when_unsure(gemini):
+    server = answers(
+        small={'action': None, 'confidence': 0.2, 'message': "¿Qué archivo?"},
+        medium={'action': None, 'confidence': 0.2, 'message': "¿Qué archivo?"},
+        large={'action': None, 'confidence': 0.3, 'message': "Podrías mencionar el archivo"},
+    )
+    intent, model, _ = classify(gemini, server)
+    assert model == "large" and intent['message'] == "Podrías mencionar el archivo"
+
+def test_inconsistent_answer_escalates(gemini):
+    # Word to PDF asked as PNG contradicts itself: not accepted however confident
+    server = answers(
+        small={'action': 16, 'confidence': 0.99, 'target_format': 'png'},
+        medium={'action': 14, 'confidence': 0.9},
+        large={'action': 14, 'confidence': 0.9},
+    )
+    intent, model, counts = classify(gemini, server)
+    assert (intent['action'], model) == (14, "large")
+    assert counts['small'] == {'calls': 1, 'escalated': 1, 'overruled': 1}
+
+def test_parse_model_tiers():
+    assert parse_model_tiers("a:0.9, b ,c:0.5") == [("a", 0.9), ("b", 0.85), ("c", 0.5)]
+    assert parse_model_tiers("")[0][1] == 0.85
+
+def test_router_report_rows(gemini, monkeypatch):
+    from bot_functions import intent_router
+
+    monkeypatch.setattr(intent_router, "MODEL_TIERS", [("small", 0.8), ("large", 0.85)])
+    samples = [(1, "une estos dos pdf"), (7, "descomprime este zip")]
+
+    def answer(model, prompt):
+        expected = 1 if "une estos dos pdf" in prompt.rsplit('<USER>', 1)[-1] else 7
+        # The small model only knows action 1
+        if model == "small":
+            return {'action': 1, 'confidence': 0.95 if expected == 1 else 0.4}
+        return {'action': expected, 'confidence': 0.9}
+
+    async def scenario(server):
+        return await _router_report(samples)
+
+    rows = {name: (accuracy, decided_by) for name, accuracy, _, _, decided_by in gemini(FakeGemini(answer=answer), scenario)}
+    assert rows["small"] == (0.5, {"small": 2})
+    assert rows["large"] == (1.0, {"large": 2})
+    assert rows["cascade"] == (1.0, {"small": 1, "large": 1})
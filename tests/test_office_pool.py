@@ -0,0 +1,118 @@
+import socket
+import asyncio
+from bot_functions.file_processing import office_pool as office_pool_module
+from bot_functions.file_processing.office_pool import OfficePool, _find_free_ports
+
+class FakeWorker:
+    """Stands in for an OfficeWorker: no LibreOffice process, scripted outcomes"""
+
+    def __init__(self, port, convert_error=None, restart_error=None, healthy=True):
+        self.port = port
+        self.conversions = 0
+        self.convert_error = convert_error
+        self.restart_error = restart_error
+        self.healthy = healthy
+        self.restarts = 0
+        self.stopped = False
+
+    def is_healthy(self):
+        return self.healthy
+
+    def convert(self, input_path, output_path, convert_to='pdf'):
+        if self.convert_error:
+            raise self.convert_error
+        with open(output_path, 'wb') as f:
+            f.write(b"%PDF")
+        self.conversions += 1
+
+    def restart(self):
+        self.restarts += 1
+        if self.restart_error:
+            raise self.restart_error
+        self.healthy = True
+        self.conversions = 0
+
+    def stop(self):
+        self.stopped = True
+
+def make_pool(*workers) -> OfficePool:
+    pool = OfficePool(0, 0)
+    pool.workers = list(workers)
+    pool.available = True
+
+    async def start():
+        pool.idle = asyncio.Queue()
+        for worker in workers:
+            pool.idle.put_nowait(worker)
+    pool._start = start
+    return pool
+
+def test_worker_goes_back_after_a_conversion(tmp_path):
+    worker = FakeWorker(1)
+    pool = make_pool(worker)
+
+    async def scenario():
+        converted = await pool.convert("in.docx", str(tmp_path / "out.pdf"))
+        return converted, pool.idle.qsize()
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+def test_failed_restart_retires_the_worker(tmp_path):
+    broken = FakeWorker(1, convert_error=RuntimeError("crash"), restart_error=RuntimeError("no start"))
+    healthy = FakeWorker(2)
+    pool = make_pool(broken, healthy)
+
+    async def scenario():
+        first = await pool.convert("in.docx", str(tmp_path / "a.pdf"))
+        second = await pool.convert("in.docx", str(tmp_path / "b.pdf"))
+        return first, second
+
+    assert asyncio.run(scenario()) == (False, True)
+    assert pool.workers == [healthy] and broken.stopped
+    assert broken.restarts == 1
+    assert pool.available
+
+def test_pool_becomes_unavailable_without_workers(tmp_path):
+    broken = FakeWorker(1, healthy=False, restart_error=RuntimeError("no start"))
+    pool = make_pool(broken)
+
+    async def scenario():
+        # Three conversions waiting on the only worker: none may hang once it is retired
+        results = await asyncio.wait_for(asyncio.gather(*(
+            pool.convert("in.docx", str(tmp_path / f"{i}.pdf")) for i in range(3)
+        )), 5)
+        return results, await pool.convert("in.docx", str(tmp_path / "late.pdf"))
+
+    results, late = asyncio.run(scenario())
+    assert results == [False, False, False] and late is False
+    assert not pool.available and pool.workers == []
+    assert broken.restarts == 1
+
+def test_failed_recycle_keeps_the_finished_conversion(tmp_path, monkeypatch):
+    monkeypatch.setattr(office_pool_module, "OFFICE_MAX_CONVERSIONS", 1)
+    worker = FakeWorker(1, restart_error=RuntimeError("no start"))
+    pool = make_pool(worker)
+
+    converted = asyncio.run(pool.convert("in.docx", str(tmp_path / "out.pdf")))
+    assert converted is True
+    assert worker.restarts == 1 and pool.workers == []
+
+def test_recycle_after_max_conversions(tmp_path, monkeypatch):
+    monkeypatch.setattr(office_pool_module, "OFFICE_MAX_CONVERSIONS", 2)
+    worker = FakeWorker(1)
+    pool = make_pool(worker)
+
+    async def scenario():
+        return [await pool.convert("in.docx", str(tmp_path / f"{i}.pdf")) for i in range(4)]
+
+    assert asyncio.run(scenario()) == [True] * 4
+    assert worker.restarts == 2 and pool.workers == [worker]
+
+def test_ports_in_use_are_skipped():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        taken = probe.getsockname()[1]
+        probe.listen()
+        port, uno_port = _find_free_ports(taken)
+    assert port != taken and uno_port == port + 1
+    assert (port - taken) % 2 == 0
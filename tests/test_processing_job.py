@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from bot_functions import utils
+from bot_functions.scheduler import JobScheduler, QueueFullError
+from bot_functions.utils import processing_job
+
+class FakeMessage:
+    """Records the order in which replies reach the chat; the ad is slow to send"""
+
+    def __init__(self, chat_log, ad_delay=0.1):
+        self.chat_id = 1
+        self.chat_log = chat_log
+        self.ad_delay = ad_delay
+
+    async def reply_text(self, text):
+        if text in utils.mensajes_promocionales:
+            await asyncio.sleep(self.ad_delay)
+            self.chat_log.append("ad")
+        else:
+            self.chat_log.append("status")
+        return self
+
+    async def reply_document(self, document=None, **kwargs):
+        self.chat_log.append("result")
+
+    async def edit_text(self, text):
+        pass
+
+class FakeUpdate:
+    def __init__(self, message):
+        self.message = message
+
+def test_result_sent_inside_the_block_comes_after_the_ad(monkeypatch):
+    monkeypatch.setattr(utils, "job_scheduler", JobScheduler(4, 1, 10))
+    chat_log = []
+    message = FakeMessage(chat_log)
+
+    async def scenario():
+        async with processing_job(FakeUpdate(message), "Procesando..."):
+            await message.reply_document(b"pdf")
+
+    asyncio.run(scenario())
+    assert chat_log == ["status", "ad", "result"]
+
+def test_result_sent_right_after_the_block_comes_after_the_ad(monkeypatch):
+    monkeypatch.setattr(utils, "job_scheduler", JobScheduler(4, 1, 10))
+    chat_log = []
+    message = FakeMessage(chat_log)
+
+    async def scenario():
+        async with processing_job(FakeUpdate(message), "Procesando..."):
+            pass
+        await message.reply_document(b"pdf")
+
+    asyncio.run(scenario())
+    assert chat_log == ["status", "ad", "result"]
+
+def test_ad_is_sent_while_waiting_for_a_slot(monkeypatch):
+    jobs = JobScheduler(1, 1, 10)
+    monkeypatch.setattr(utils, "job_scheduler", jobs)
+    chat_log = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def busy():
+            async with jobs.slot(2):
+                await release.wait()
+
+        blocker = asyncio.create_task(busy())
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        asyncio.get_running_loop().call_later(0.2, release.set)
+        async with processing_job(FakeUpdate(FakeMessage(chat_log)), "Procesando..."):
+            elapsed = loop.time() - started
+        await blocker
+        return elapsed
+
+    # The 0.1 s ad overlapped the 0.2 s wait instead of adding to it
+    assert asyncio.run(scenario()) < 0.28
+    assert chat_log == ["status", "ad"]
+
+def test_ad_is_still_sent_when_the_queue_is_full(monkeypatch):
+    jobs = JobScheduler(1, 1, 1)
+    monkeypatch.setattr(utils, "job_scheduler", jobs)
+    chat_log = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def busy(chat_id):
+            async with jobs.slot(chat_id):
+                await release.wait()
+
+        # One job running and one waiting fill the scheduler
+        others = [asyncio.create_task(busy(chat_id)) for chat_id in (2, 3)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            async with processing_job(FakeUpdate(FakeMessage(chat_log)), "Procesando..."):
+                pass
+        release.set()
+        await asyncio.gather(*others)
+
+    asyncio.run(scenario())
+    assert chat_log == ["status", "ad"]
@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+import subprocess
+from bot_functions import result_cache
+from bot_functions.file_processing.document_processor import is_fallback_output
+
+def test_import_does_not_touch_the_disk(tmp_path):
+    cache_dir = tmp_path / "cache"
+    result = subprocess.run(
+        [sys.executable, "-c", "import bot_functions.result_cache"],
+        env={**os.environ, "RESULT_CACHE_DIR": str(cache_dir)}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert not cache_dir.exists()
+
+def test_results_from_a_previous_run_are_indexed_on_first_use(tmp_path, monkeypatch):
+    key = "a" * 64
+    (tmp_path / f"{key}_result.pdf").write_bytes(b"%PDF-1.4")
+    (tmp_path / "unrelated.txt").write_text("x")
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(result_cache, "_entries", type(result_cache._entries)())
+    monkeypatch.setattr(result_cache, "_total_size", 0)
+    monkeypatch.setattr(result_cache, "_loaded", False)
+
+    entry = asyncio.run(result_cache.get_cached_result(key))
+    assert entry['filename'] == "result.pdf" and entry['size'] == 8
+    assert list(result_cache._entries) == [key]
+
+def test_cache_result_loads_the_index_first(tmp_path, monkeypatch):
+    old_key = "b" * 64
+    (tmp_path / f"{old_key}_old.pdf").write_bytes(b"x" * 10)
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(result_cache, "_entries", type(result_cache._entries)())
+    monkeypatch.setattr(result_cache, "_total_size", 0)
+    monkeypatch.setattr(result_cache, "_loaded", False)
+    # Budget for one file: the old result must be evicted, not forgotten about on disk
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_BYTES", 15)
+
+    asyncio.run(result_cache.cache_result("c" * 64, b"y" * 10, "new.pdf"))
+    assert list(result_cache._entries) == ["c" * 64]
+    assert not (tmp_path / f"{old_key}_old.pdf").exists()
+
+def test_results_deleted_from_disk_are_forgotten(tmp_path, monkeypatch):
+    key = "d" * 64
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(result_cache, "_entries", type(result_cache._entries)())
+    monkeypatch.setattr(result_cache, "_total_size", 0)
+    monkeypatch.setattr(result_cache, "_loaded", True)
+
+    async def scenario():
+        await result_cache.cache_result(key, b"z" * 5, "gone.pdf")
+        os.remove(result_cache._entries[key]['path'])
+        return await result_cache.get_cached_result(key)
+
+    assert asyncio.run(scenario()) is None
+    assert key not in result_cache._entries and result_cache._total_size == 0
+
+def test_fallback_outputs_are_recognised():
+    assert is_fallback_output("/tmp/job/docx_to_pdf_simple.pdf")
+    assert is_fallback_output("/tmp/job/pdf_to_docx_simple.docx")
+    assert is_fallback_output("/tmp/job/pptx_to_pdf_simple.pdf")
+    assert not is_fallback_output("/tmp/job/docx_to_pdf.pdf")
+    assert not is_fallback_output("/tmp/job/pdf_to_docx.docx")
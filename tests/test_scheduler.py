@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from bot_functions import scheduler
+from bot_functions.scheduler import JobScheduler, QueueFullError
+
+@pytest.fixture(autouse=True)
+def no_throttle(monkeypatch):
+    monkeypatch.setattr(scheduler, "QUEUE_UPDATE_INTERVAL", 0)
+
+async def job(jobs, chat_id, done, positions=None, cost=1):
+    async def on_queued(position):
+        positions.append(position)
+
+    async with jobs.slot(chat_id, cost, on_queued if positions is not None else None):
+        await done.wait()
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_queue_position_is_updated_as_jobs_ahead_finish():
+    async def scenario():
+        jobs = JobScheduler(1, 1, 10)
+        done = {chat_id: asyncio.Event() for chat_id in range(4)}
+        positions = []
+        tasks = [asyncio.create_task(job(jobs, chat_id, done[chat_id])) for chat_id in range(3)]
+        await settle()
+        tasks.append(asyncio.create_task(job(jobs, 3, done[3], positions)))
+        await settle()
+        for chat_id in range(3):
+            done[chat_id].set()
+            await settle()
+        done[3].set()
+        await asyncio.gather(*tasks)
+        return positions
+
+    assert asyncio.run(scenario()) == [3, 2, 1]
+
+def test_updates_are_throttled_but_the_latest_position_is_shown(monkeypatch):
+    monkeypatch.setattr(scheduler, "QUEUE_UPDATE_INTERVAL", 0.2)
+
+    async def scenario():
+        jobs = JobScheduler(1, 1, 10)
+        done = {chat_id: asyncio.Event() for chat_id in range(5)}
+        positions = []
+        tasks = [asyncio.create_task(job(jobs, chat_id, done[chat_id])) for chat_id in range(4)]
+        await settle()
+        tasks.append(asyncio.create_task(job(jobs, 4, done[4], positions)))
+        await settle()
+        # Three jobs finish within one interval: one update, to the final position
+        for chat_id in range(3):
+            done[chat_id].set()
+            await settle()
+        await asyncio.sleep(0.3)
+        shown = list(positions)
+        for chat_id in (3, 4):
+            done[chat_id].set()
+        await asyncio.gather(*tasks)
+        return shown
+
+    assert asyncio.run(scenario()) == [4, 1]
+
+def test_no_update_after_the_slot_is_granted():
+    async def scenario():
+        jobs = JobScheduler(1, 1, 10)
+        first, second = asyncio.Event(), asyncio.Event()
+        positions = []
+        running = asyncio.create_task(job(jobs, 1, first))
+        await settle()
+        waiting = asyncio.create_task(job(jobs, 2, second, positions))
+        await settle()
+        first.set()
+        await settle()
+        # A third chat arriving now must not send the granted job another position
+        third = asyncio.create_task(job(jobs, 3, asyncio.Event()))
+        await settle()
+        second.set()
+        await asyncio.gather(running, waiting)
+        third.cancel()
+        return positions
+
+    assert asyncio.run(scenario()) == [1]
+
+def test_cancelled_waiting_job_leaves_the_queue():
+    async def scenario():
+        jobs = JobScheduler(1, 1, 10)
+        done = asyncio.Event()
+        positions = []
+        running = asyncio.create_task(job(jobs, 1, done))
+        await settle()
+        cancelled = asyncio.create_task(job(jobs, 2, asyncio.Event()))
+        last = asyncio.create_task(job(jobs, 3, done, positions))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        done.set()
+        await asyncio.gather(running, last)
+        return positions, jobs.waiting, jobs.running
+
+    assert asyncio.run(scenario()) == ([2, 1], [], 0)
+
+def test_full_queue_rejects_new_jobs():
+    async def scenario():
+        jobs = JobScheduler(1, 1, 1)
+        done = asyncio.Event()
+        tasks = [asyncio.create_task(job(jobs, chat_id, done)) for chat_id in range(2)]
+        await settle()
+        with pytest.raises(QueueFullError):
+            await job(jobs, 3, done)
+        done.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+async def run_in_order(jobs, submissions):
+    """Submit (name, chat_id, cost) jobs while the first one runs and return the order they ran in"""
+    order = []
+    first_done = asyncio.Event()
+
+    async def run(name, chat_id, cost):
+        async with jobs.slot(chat_id, cost):
+            order.append(name)
+            if name == submissions[0][0]:
+                await first_done.wait()
+
+    tasks = []
+    for submission in submissions:
+        tasks.append(asyncio.create_task(run(*submission)))
+        await settle()
+    first_done.set()
+    await asyncio.gather(*tasks)
+    return order
+
+def test_light_chat_is_served_between_jobs_of_a_heavy_chat():
+    async def scenario():
+        heavy = [(f"A{index}", "A", 4) for index in range(5)]
+        light = [(f"B{index}", "B", 1) for index in range(5)]
+        return await run_in_order(JobScheduler(1, 1, 20), heavy + light)
+
+    assert asyncio.run(scenario()) == ["A0", "B0", "B1", "B2", "B3", "B4", "A1", "A2", "A3", "A4"]
+
+def test_large_job_does_not_starve_a_later_small_one():
+    async def scenario():
+        bulk, pdf = scheduler.JOB_COSTS['bulk'], scheduler.JOB_COSTS['pdf']
+        return await run_in_order(JobScheduler(1, 1, 20), [("bulk0", 1, bulk), ("bulk1", 1, bulk), ("pdf", 2, pdf)])
+
+    assert asyncio.run(scenario()) == ["bulk0", "pdf", "bulk1"]
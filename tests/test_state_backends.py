@@ -0,0 +1,135 @@
+import socket
+import asyncio
+import threading
+import pytest
+from bot_functions import state_backends, state_manager
+from bot_functions.state_backends import SQLiteBackend, RedisBackend
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """A local Redis stand-in speaking the real protocol over TCP"""
+    fakeredis = pytest.importorskip("fakeredis")
+    port = _free_port()
+    server = fakeredis.TcpFakeServer(('127.0.0.1', port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_backend(request, tmp_path):
+    """Build a fresh backend of each kind; Redis keys get a per-test prefix"""
+    if request.param == "sqlite":
+        return lambda: SQLiteBackend(str(tmp_path / "state.db"))
+    url = request.getfixturevalue("redis_url")
+    return lambda: RedisBackend(url, prefix=f"test:{request.node.name}:")
+
+RECORD = {'state': "AWAITING_PDF_FOR_PAGE_DELETE", 'data': {'selected_option': 3}, 'history': None, 'workspace_dir': None}
+
+def run(make_backend, scenario):
+    async def main():
+        backend = make_backend()
+        try:
+            return await scenario(backend)
+        finally:
+            await backend.close()
+    return asyncio.run(main())
+
+def test_save_and_load(make_backend):
+    async def scenario(backend):
+        await backend.save_many({1: RECORD, 2: {**RECORD, 'state': "IDLE"}})
+        return await backend.load(1), await backend.load(2), await backend.load(3)
+
+    first, second, missing = run(make_backend, scenario)
+    assert first == RECORD
+    assert second['state'] == "IDLE"
+    assert missing is None
+
+def test_records_survive_a_new_connection(make_backend):
+    run(make_backend, lambda backend: backend.save_many({1: RECORD}))
+    assert run(make_backend, lambda backend: backend.load(1)) == RECORD
+
+def test_none_deletes_the_record(make_backend):
+    async def scenario(backend):
+        await backend.save_many({1: RECORD, 2: RECORD})
+        await backend.save_many({1: None})
+        return await backend.load(1), await backend.load(2)
+
+    assert run(make_backend, scenario) == (None, RECORD)
+
+def test_purge_returns_and_deletes_only_expired_records(make_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_backends.time, "time", lambda: now[0])
+
+    async def scenario(backend):
+        await backend.save_many({1: {**RECORD, 'data': {'chat': 1}}})
+        now[0] += 100
+        await backend.save_many({2: {**RECORD, 'data': {'chat': 2}}})
+        now[0] += 50
+        purged = await backend.purge_expired(120)
+        return purged, await backend.load(1), await backend.load(2), await backend.purge_expired(120)
+
+    purged, first, second, again = run(make_backend, scenario)
+    assert [record['data'] for record in purged] == [{'chat': 1}]
+    assert first is None and second is not None
+    assert again == []
+
+def test_sqlite_indexes_last_activity(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    try:
+        indexes = [row[1] for row in backend._connection.execute("PRAGMA index_list(sessions)")]
+        plan = " ".join(str(row) for row in backend._connection.execute(
+            "EXPLAIN QUERY PLAN SELECT record FROM sessions WHERE updated_at < 0"
+        ))
+    finally:
+        asyncio.run(backend.close())
+    assert "sessions_updated_at" in indexes
+    assert "sessions_updated_at" in plan
+
+def test_redis_index_follows_saves_deletes_and_purges(redis_url, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_backends.time, "time", lambda: now[0])
+
+    async def scenario(backend):
+        await backend.save_many({1: RECORD, 2: RECORD, 3: RECORD})
+        now[0] += 10
+        await backend.save_many({2: RECORD, 3: None})
+        index = await backend._client.zrange(backend.index_key, 0, -1, withscores=True)
+        await backend.purge_expired(5)
+        return index, await backend._client.zrange(backend.index_key, 0, -1)
+
+    index, after_purge = run(lambda: RedisBackend(redis_url, prefix="test:index:"), scenario)
+    assert index == [(b"1", 1000.0), (b"2", 1010.0)]
+    assert after_purge == [b"2"]
+
+def test_session_with_files_from_another_host_is_reset(make_backend, monkeypatch, tmp_path):
+    present = tmp_path / "here.pdf"
+    present.write_bytes(b"%PDF")
+
+    async def scenario(backend):
+        monkeypatch.setattr(state_manager, "state_backend", backend)
+        monkeypatch.setattr(state_manager, "_dirty", {})
+        # Sessions of this test must not leak into the other tests
+        monkeypatch.setattr(state_manager, "conversation_state",
+                            state_manager.SessionStore(state_manager.SESSION_TTL_SECONDS, state_manager.MAX_SESSIONS))
+        await backend.save_many({
+            1: {**RECORD, 'data': {'pdf_path': str(present)}, 'history': [{'role': "USER", 'message': "hola"}]},
+            2: {**RECORD, 'data': {'pdf_path': "/nonexistent/other-host.pdf"}, 'history': [{'role': "USER", 'message': "hola"}]},
+        })
+        kept = await state_manager.load_user_session(1)
+        reset = await state_manager.load_user_session(2)
+        await state_manager.flush_state()
+        return kept, reset, await backend.load(2)
+
+    kept, reset, stored = run(make_backend, scenario)
+    assert (kept, reset) == (False, True)
+    assert state_manager.get_user_state(1) == "AWAITING_PDF_FOR_PAGE_DELETE"
+    assert state_manager.get_user_state(2) == state_manager.IDLE
+    assert state_manager.get_user_data(2, 'pdf_path') is None
+    assert stored['state'] == state_manager.IDLE and stored['history'] == [{'role': "USER", 'message': "hola"}]
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+from telegram.ext import SimpleUpdateProcessor
+from bot_functions.update_processor import ChatOrderedUpdateProcessor
+
+def update(chat_id, sequence=0):
+    chat = None if chat_id is None else SimpleNamespace(id=chat_id)
+    return SimpleNamespace(effective_chat=chat, sequence=sequence)
+
+async def run_updates(processor, chats, updates, work_ms=1):
+    """Send updates interleaved across chats; returns (handled order per chat, most updates of a chat at once)"""
+    handled = {chat_id: [] for chat_id in range(chats)}
+    running = {}
+    overlap = 0
+
+    async def handle(update):
+        nonlocal overlap
+        chat_id = update.effective_chat.id
+        running[chat_id] = running.get(chat_id, 0) + 1
+        overlap = max(overlap, running[chat_id])
+        await asyncio.sleep(work_ms / 1000)
+        handled[chat_id].append(update.sequence)
+        running[chat_id] -= 1
+
+    pending = [update(chat_id, sequence) for sequence in range(updates) for chat_id in range(chats)]
+    await asyncio.gather(*(processor.process_update(item, handle(item)) for item in pending))
+    return handled, overlap
+
+def test_updates_of_a_chat_keep_their_order():
+    handled, overlap = asyncio.run(run_updates(ChatOrderedUpdateProcessor(), 20, 5))
+    assert all(sequence == list(range(5)) for sequence in handled.values())
+    assert overlap == 1
+
+def test_unordered_processor_is_caught():
+    # A plain concurrent processor runs updates of one chat together: the check must notice
+    _, overlap = asyncio.run(run_updates(SimpleUpdateProcessor(256), 5, 5))
+    assert overlap > 1
+
+def test_chats_run_concurrently_up_to_the_limit():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(3)
+        running = 0
+        most = 0
+
+        async def handle():
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            await asyncio.sleep(0.005)
+            running -= 1
+
+        # Updates without a chat are limited as well
+        chats = list(range(8)) + [None, None]
+        await asyncio.gather(*(processor.process_update(update(chat_id), handle()) for chat_id in chats))
+        return most
+
+    assert asyncio.run(scenario()) == 3
+
+def test_busy_chat_does_not_hold_the_slots_of_other_chats():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(2)
+        release = asyncio.Event()
+        other_chat_done = asyncio.Event()
+
+        async def busy():
+            await release.wait()
+
+        async def quick():
+            other_chat_done.set()
+
+        # Chat 1 queues more updates than there are slots, all stuck behind its first one
+        tasks = [asyncio.create_task(processor.process_update(update(1, sequence), busy())) for sequence in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(processor.process_update(update(2), quick())))
+        await asyncio.wait_for(other_chat_done.wait(), 1)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+def test_idle_chats_release_their_lock():
+    processor = ChatOrderedUpdateProcessor()
+    asyncio.run(run_updates(processor, 10, 2))
+    assert processor._locks == {} and processor._pending == {}